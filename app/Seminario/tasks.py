@@ -3,19 +3,12 @@
 from datetime import date, timedelta, datetime # Added datetime for timestamping
 from typing import List, Dict, Any, Optional # Added Any
 
-try:  # pragma: no cover - optional dependency
-    from apscheduler.schedulers.background import BackgroundScheduler
-except ImportError:  # pragma: no cover - optional dependency
-    BackgroundScheduler = None
-
 import config
+from app import scheduler
 from app.utils import send_email
 from . import utils
 
 
-scheduler = BackgroundScheduler() if BackgroundScheduler else None
-
-
 def notify_pending_feedback() -> List[Dict[str, Any]]:
     """
     Sends reminder emails for seminars lacking feedback.
@@ -25,33 +18,24 @@ def notify_pending_feedback() -> List[Dict[str, Any]]:
     Returns a list of notification records.
     """
     today = date.today()
-    # utils.pending_feedback returns active 'kouza' seminars where seminar_end_date < today
-    relevant_seminars = utils.pending_feedback(today)
+    # Active 'kouza' seminars where seminar_end_date < today, with the users
+    # who already gave feedback
+    relevant_seminars = utils.open_feedback(today)
 
     admin_users = utils.get_admin_users()  # List of admin user dicts with emails
     notified_actions: List[Dict[str, Any]] = []
 
     for seminar in relevant_seminars:
-        seminar_id = seminar.get("id")
-        seminar_title = seminar.get("title", "N/A")
-        feedback_deadline_str = seminar.get("feedback_deadline")
-
-        if not seminar_id or not feedback_deadline_str:
-            # Log error: Missing critical seminar information
-            continue
-
-        try:
-            # seminar_end_date_obj = date.fromisoformat(seminar.get("seminar_end_date")) # Provided by pending_feedback
-            feedback_deadline_obj = date.fromisoformat(feedback_deadline_str)
-        except ValueError:
-            # Log error: Invalid date format in seminar data
-            continue
+        seminar_id = seminar["id"]
+        seminar_title = seminar["title"]
+        feedback_deadline_str = seminar["feedback_deadline"]
+        feedback_deadline_obj = seminar["deadline"]
 
         for username_key, user_config_data in config.USERS.items():
             if user_config_data.get('role') != 'admin' and user_config_data.get('email'):
                 user_email = user_config_data['email']
 
-                submitted = username_key in seminar.get("feedback_submissions", {})
+                submitted = username_key in seminar["submitted"]
 
                 if not submitted:
                     current_time_iso = datetime.now().isoformat()
@@ -81,8 +65,7 @@ def notify_pending_feedback() -> List[Dict[str, Any]]:
                         notified_actions.append({**common_notification_data, 'status': 'notified_overdue_user'})
 
                         # Admin Notification Logic for this overdue, un-submitted feedback
-                        overdue_admin_notified_list = seminar.get("overdue_admin_notified_users", [])
-                        if username_key not in overdue_admin_notified_list:
+                        if username_key not in seminar["admins_notified"]:
                             for admin_user_details in admin_users:
                                 admin_email = admin_user_details.get("email")
                                 if admin_email: # Should always be true due to get_admin_users logic
@@ -103,17 +86,5 @@ def notify_pending_feedback() -> List[Dict[str, Any]]:
     return notified_actions
 
 
-def start_scheduler() -> None:
-    """Start APScheduler job to send daily feedback reminders.
-    The job runs daily at 9 AM.
-    """
-    if scheduler is None:  # pragma: no cover
-        return
-
-    if not scheduler.get_jobs(): # Ensure only one job is scheduled
-        scheduler.add_job(
-            notify_pending_feedback,  # No lambda, no arguments
-            "cron",
-            hour=9,  # Runs daily at 9 AM
-        )
-        scheduler.start() # pragma: no cover
+# Daily feedback reminders at 9 AM, run by the central scheduler (see app.scheduler)
+scheduler.register("seminario.pending_feedback", notify_pending_feedback, hour=9)
@@ -1,26 +1,34 @@
 """Utility functions for Seminario schedules and feedback."""
 
-import json
 from datetime import datetime, date, timedelta
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 
 import config
+from app import reminders, search, storage, tiering
 
 
 SEMINARIO_PATH = Path(getattr(config, "SEMINARIO_FILE", "seminario.json"))
 
+# Completed seminars are moved to the cold archive, by creation month
+_archive = tiering.ColdArchive(
+    "seminario",
+    lambda: SEMINARIO_PATH,
+    lambda e: e.get("status") == "completed",
+    tiering.month_of("timestamp"),
+)
+
+# Keyword indexes for the global search
+search.SearchIndex.for_file("seminario", lambda: SEMINARIO_PATH, ("title",))
+search.SearchIndex.for_archive("seminario_archive", _archive, ("title",), group="seminario")
+
 
 def load_entries() -> List[Dict[str, Any]]:
-    if SEMINARIO_PATH.exists():
-        with open(SEMINARIO_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load_json(SEMINARIO_PATH, [])
 
 
 def save_entries(entries: List[Dict[str, Any]]) -> None:
-    with open(SEMINARIO_PATH, "w", encoding="utf-8") as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
+    storage.save_json(SEMINARIO_PATH, entries)
 
 
 def add_schedule(
@@ -30,40 +38,44 @@ def add_schedule(
     calendar_event_type: str,
     seminar_end_date: date,
 ) -> None:
-    entries = load_entries()
-    next_id = max((int(e.get("id", 0)) for e in entries), default=0) + 1
-    entries.append(
-        {
-            "id": next_id,
-            "author": author,
-            "lesson_date": lesson_date.isoformat(),  # Seminar start date
-            "title": title,
-            "calendar_event_type": calendar_event_type,
-            "seminar_end_date": seminar_end_date.isoformat(),
-            "feedback_deadline": (seminar_end_date + timedelta(days=7)).isoformat(),
-            "status": "active",
-            "feedback_submissions": {},
-            "overdue_admin_notified_users": [], # New field
-            "timestamp": datetime.now().isoformat(timespec="seconds"),  # Entry creation timestamp
-        }
-    )
-    save_entries(entries)
+    with storage.locked(SEMINARIO_PATH):
+        entries = load_entries()
+        next_id = _archive.next_id(entries)
+        entries.append(
+            {
+                "id": next_id,
+                "author": author,
+                "lesson_date": lesson_date.isoformat(),  # Seminar start date
+                "title": title,
+                "calendar_event_type": calendar_event_type,
+                "seminar_end_date": seminar_end_date.isoformat(),
+                "feedback_deadline": (seminar_end_date + timedelta(days=7)).isoformat(),
+                "status": "active",
+                "feedback_submissions": {},
+                "overdue_admin_notified_users": [], # New field
+                "timestamp": datetime.now().isoformat(timespec="seconds"),  # Entry creation timestamp
+            }
+        )
+        save_entries(entries)
 
 
 def add_feedback(entry_id: int, username: str, body: str) -> bool:
-    entries = load_entries()
-    for e in entries:
-        if e.get("id") == entry_id:
-            # Ensure feedback_submissions field exists
-            if "feedback_submissions" not in e:
-                e["feedback_submissions"] = {}
-            e["feedback_submissions"][username] = {
-                "text": body,
-                "timestamp": datetime.now().isoformat(timespec="seconds"),
-            }
-            save_entries(entries)
-            return True
-    return False
+    with storage.locked(SEMINARIO_PATH):
+        entries = load_entries()
+        before = _feedback.stamp()
+        for e in entries:
+            if e.get("id") == entry_id:
+                # Ensure feedback_submissions field exists
+                if "feedback_submissions" not in e:
+                    e["feedback_submissions"] = {}
+                e["feedback_submissions"][username] = {
+                    "text": body,
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                }
+                save_entries(entries)
+                _feedback.update(before, reminders.add_to("submitted", entry_id, username))
+                return True
+        return False
 
 
 def get_seminar_by_id(entry_id: int) -> Optional[Dict[str, Any]]:
@@ -71,7 +83,7 @@ def get_seminar_by_id(entry_id: int) -> Optional[Dict[str, Any]]:
     for e in entries:
         if e.get("id") == entry_id:
             return e
-    return None
+    return _archive.get(entry_id)
 
 
 def get_kouza_seminars() -> List[Dict[str, Any]]:
@@ -89,22 +101,25 @@ def get_active_seminars() -> List[Dict[str, Any]]:
 
 
 def get_completed_seminars() -> List[Dict[str, Any]]:
-    entries = load_entries()
+    entries = _archive.with_hot(load_entries())
     return [e for e in entries if e.get("status") == "completed"]
 
 
 def complete_seminar(entry_id: int) -> bool:
-    entries = load_entries()
-    found = False
-    for e in entries:
-        if e.get("id") == entry_id:
-            e["status"] = "completed"
-            found = True
-            break
-    if found:
-        save_entries(entries)
-        return True
-    return False
+    with storage.locked(SEMINARIO_PATH):
+        entries = load_entries()
+        before = _feedback.stamp()
+        found = False
+        for e in entries:
+            if e.get("id") == entry_id:
+                e["status"] = "completed"
+                found = True
+                break
+        if found:
+            save_entries(entries)
+            _feedback.update(before, reminders.drop(entry_id))
+            return True
+        return False
 
 
 def get_seminars_for_feedback_page(username: str) -> List[Dict[str, Any]]:
@@ -144,25 +159,62 @@ def pending_feedback(today: Optional[date] = None) -> List[Dict[str, Any]]:
     return results
 
 
+def _feedback_index(entries: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Active kouza seminars by ID with parsed dates and the users who gave feedback."""
+    index: Dict[int, Dict[str, Any]] = {}
+    for e in entries:
+        if e.get("calendar_event_type") != "kouza" or e.get("status") != "active":
+            continue
+        if not e.get("id") or not e.get("seminar_end_date") or not e.get("feedback_deadline"):
+            continue
+        try:
+            end_date = date.fromisoformat(e["seminar_end_date"])
+            deadline = date.fromisoformat(e["feedback_deadline"])
+        except ValueError:
+            continue
+        index[e["id"]] = {
+            "id": e["id"],
+            "title": e.get("title", "N/A"),
+            "feedback_deadline": e["feedback_deadline"],
+            "seminar_end_date": end_date,
+            "deadline": deadline,
+            "submitted": set(e.get("feedback_submissions", {})),
+            "admins_notified": set(e.get("overdue_admin_notified_users", [])),
+        }
+    return index
+
+
+_feedback = reminders.ReminderIndex(lambda: SEMINARIO_PATH, _feedback_index)
+
+
+def open_feedback(today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Like :func:`pending_feedback`, as index records of seminars with a valid deadline."""
+    today = today or date.today()
+    return [r for r in _feedback.get().values() if r["seminar_end_date"] < today]
+
+
 def add_user_to_admin_notified_list(entry_id: int, username: str) -> bool:
     """Adds a username to the list of admins notified about overdue feedback for a seminar."""
-    entries = load_entries()
-    seminar_found = False
-    user_added = False
-    for seminar in entries:
-        if seminar.get("id") == entry_id:
-            seminar_found = True
-            # Ensure the list exists, using setdefault to initialize if not present
-            notified_list = seminar.setdefault("overdue_admin_notified_users", [])
-            if username not in notified_list:
-                notified_list.append(username)
-                user_added = True
-            break  # Exit loop once seminar is found
-
-    if seminar_found and user_added:
-        save_entries(entries)
-        return True
-    return False
+    with storage.locked(SEMINARIO_PATH):
+        entries = load_entries()
+        before = _feedback.stamp()
+        seminar_found = False
+        user_added = False
+        for seminar in entries:
+            if seminar.get("id") == entry_id:
+                seminar_found = True
+                # Ensure the list exists, using setdefault to initialize if not present
+                notified_list = seminar.setdefault("overdue_admin_notified_users", [])
+                if username not in notified_list:
+                    notified_list.append(username)
+                    user_added = True
+                break  # Exit loop once seminar is found
+
+        if seminar_found and user_added:
+            save_entries(entries)
+            _feedback.update(before, reminders.add_to("admins_notified", entry_id, username))
+            return True
+        return False
 
 
 def get_admin_users() -> List[Dict[str, Any]]:
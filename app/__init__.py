@@ -52,6 +52,7 @@ def create_app() -> "Flask":
     from .calendario import bp as calendario_bp
     from .resoconto import bp as resoconto_bp
     from .Seminario import bp as seminario_bp
+    from .ricerca import bp as ricerca_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(punto_bp)
@@ -70,10 +71,19 @@ def create_app() -> "Flask":
     app.register_blueprint(calendario_bp)
     app.register_blueprint(resoconto_bp)
     app.register_blueprint(seminario_bp)
+    app.register_blueprint(ricerca_bp)
 
     if db is not None:
         from . import models  # noqa: F401
 
+        from . import backend
+
+        @app.teardown_request
+        def recheck_backend(exc):
+            """Probe the database again after a failed request."""
+            if exc is not None:
+                backend.invalidate()
+
     @app.route("/")
     def index():
         """Simple index page showing login state."""
@@ -0,0 +1,100 @@
+"""Storage backend selection shared by the database aware helpers.
+
+The helpers of :mod:`app.utils` use the database when one is reachable
+and the JSON files otherwise. Deciding used to cost a ``SELECT 1`` round
+trip on every call, several times per request. :func:`current` now
+probes the database once per application and remembers the answer for
+``TTL`` seconds (``config.BACKEND_CHECK_TTL``).
+
+A request that ends with an exception calls :func:`invalidate`, so a
+lost connection is noticed on the next call instead of after the TTL.
+:func:`status` reports the current choice for instrumentation.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+import weakref
+
+import config
+
+DATABASE = "database"
+JSON = "json"
+
+TTL = 60.0  # seconds a probe result is trusted
+
+_lock = threading.Lock()
+# Probe result per application: (backend, checked at, error)
+_state: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+
+
+def ttl() -> float:
+    return float(getattr(config, "BACKEND_CHECK_TTL", TTL))
+
+
+def _probe() -> Optional[str]:
+    """Return ``None`` if the database answers, else the error."""
+
+    from . import db
+
+    try:  # pragma: no cover - runtime check
+        db.session.execute("SELECT 1")
+    except Exception as exc:
+        return repr(exc)
+    return None
+
+
+def _app() -> Any:
+    """Return the current application, ``None`` outside an app context."""
+
+    try:
+        from flask import current_app, has_app_context
+    except Exception:  # pragma: no cover - optional dependency
+        return None
+    if not has_app_context():
+        return None
+    return current_app._get_current_object()
+
+
+def current() -> str:
+    """Return the backend to use, :data:`DATABASE` or :data:`JSON`."""
+
+    from . import db
+
+    app = _app()
+    if db is None or app is None:
+        return JSON
+    now = time.monotonic()
+    with _lock:
+        cached = _state.get(app)
+    if cached is not None and now - cached[1] < ttl():
+        return cached[0]
+    error = _probe()
+    backend = JSON if error else DATABASE
+    with _lock:
+        _state[app] = (backend, now, error)
+    return backend
+
+
+def invalidate() -> None:
+    """Forget every probe result; the next call to :func:`current` probes again."""
+
+    with _lock:
+        _state.clear()
+
+
+def status() -> Dict[str, Any]:
+    """Return the backend of the current application and when it was chosen.
+
+    ``checked_ago`` is ``None`` when no probe ran (no database support or
+    no application context); ``error`` holds the last probe failure.
+    """
+
+    backend = current()
+    app = _app()
+    with _lock:
+        cached = _state.get(app) if app is not None else None
+    if cached is None:
+        return {"backend": backend, "checked_ago": None, "error": None}
+    backend, checked_at, error = cached
+    return {"backend": backend, "checked_ago": time.monotonic() - checked_at, "error": error}
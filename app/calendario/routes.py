@@ -16,24 +16,13 @@ from flask import (
 
 from . import bp
 from .forms import EventForm, StatsForm, ShiftRulesForm, ShiftManagementForm
-from . import utils
+from . import solver, utils, violations
 import config
 from typing import Dict, List
-import re
 from collections import defaultdict
 
-# Regex for parsing time from event titles
-time_title_pattern = re.compile(r'^(\d{1,2}:\d{2})\s*(.*)$')
-
-EVENT_SORT_PRIORITY = {
-    "shucchou": 1,
-    "hug": 2,
-    "other_no_time": 3,
-    "shift": 4,
-    "other_with_time": 5,
-    "mummy": 5, # 追加
-    "tattoo": 5, # 追加
-}
+# Kept for templates that order events by category
+EVENT_SORT_PRIORITY = utils.EVENT_SORT_PRIORITY
 
 @bp.before_request
 def require_login():
@@ -61,83 +50,26 @@ def index():
     else: week_start = today - timedelta(days=today.weekday())
     week_start = week_start - timedelta(days=week_start.weekday()) # Ensure week_start is a Monday
 
-    events = utils.load_events()
-
-    # 1. Add display_time and cleaned_title
-    for event in events:
-        title_match = time_title_pattern.match(event.get('title', ''))
-        if title_match:
-            event['display_time'] = title_match.group(1)
-            event['cleaned_title'] = title_match.group(2).strip()
-        else:
-            event['display_time'] = None
-            event['cleaned_title'] = event.get('title', '')
-
-    # 2. Add sort_priority and sort_time
-    for event in events:
-        category = event.get('category', 'other')
-        has_time = event.get('display_time') is not None
-
-        if category == 'shucchou':
-            event['sort_priority'] = EVENT_SORT_PRIORITY['shucchou']
-            event['sort_time'] = "00:00"
-        elif category == 'hug':
-            event['sort_priority'] = EVENT_SORT_PRIORITY['hug']
-            event['sort_time'] = "00:00" # Changed from "00:01" to match revised plan
-        elif category == 'shift':
-            event['sort_priority'] = EVENT_SORT_PRIORITY['shift']
-            event['sort_time'] = "00:00"
-        elif category in ['lesson', 'kouza', 'other', 'mummy', 'tattoo']:
-            if has_time:
-                event['sort_priority'] = EVENT_SORT_PRIORITY['other_with_time']
-                event['sort_time'] = event['display_time']
-            else: # Time not specified
-                event['sort_priority'] = EVENT_SORT_PRIORITY['other_no_time']
-                event['sort_time'] = "00:00" # Changed from "00:02"
-        else: # Fallback
-            event['sort_priority'] = 99
-            event['sort_time'] = "23:59"
-
-    # 2b. Add css_category_class for styling
-    for event in events:
-        category = event.get('category') # Keep original case for logic if needed elsewhere
-        if category:
-            cat_lower = category.lower()
-            if cat_lower in ['出張', 'shucchou', 'trip']: # 'trip' was previously used for shucchou color
-                event['css_category_class'] = 'shucchou'
-            elif cat_lower in ['マミー系', 'mummy', 'mammy']: # mammy for older data, mummy for new
-                event['css_category_class'] = 'mummy'
-            # Add other specific mappings here if necessary
-            # e.g., elif cat_lower in ['some_other_jp_name', 'some_other_alias']:
-            # event['css_category_class'] = 'english_class_name'
-            else:
-                event['css_category_class'] = cat_lower.replace(' ', '_') # Default to lowercase, replace spaces
-        else:
-            event['css_category_class'] = 'other'
-
-
-    # 3. Sort all events by date, then by new sort keys
-    events.sort(key=lambda e: (e.get("date", ""), e.get('sort_priority', 99), e.get('sort_time', '23:59')))
+    # Only the events of the displayed period are loaded
+    if view == "week":
+        start_d = week_start; end_d = week_start + timedelta(days=6)
+    else:
+        cal = calendar.Calendar(firstweekday=0) # firstweekday=0 は月曜日始まり
+        weeks_data = [w for w in cal.monthdatescalendar(month.year, month.month)]
+        start_d = weeks_data[0][0]; end_d = weeks_data[-1][-1]
+    # Display fields and ordering are precomputed per version of the events file
+    events = utils.display_events_between(start_d, end_d)
 
     stats = {}
-    if events:
-        try: start_date_for_stats = date.fromisoformat(events[0].get("date"))
-        except Exception: start_date_for_stats = None
+    start_date_for_stats = utils.first_event_date()
+    if start_date_for_stats:
         stats = utils.compute_employee_stats(start_date_param=start_date_for_stats, end_date_param=date.today())
 
     if view == "week":
-        start_d = week_start; end_d = week_start + timedelta(days=6)
         week_days = [start_d + timedelta(days=i) for i in range(7)]; time_slots = []
         for hour in range(24): time_slots.append(f"{hour:02d}:00"); time_slots.append(f"{hour:02d}:30")
 
-        # Filter from the globally sorted and augmented 'events' list
-        raw_week_events = []
-        for e_raw in events:
-            try:
-                event_date_obj = date.fromisoformat(e_raw.get("date"))
-                if start_d <= event_date_obj <= end_d:
-                    raw_week_events.append(e_raw)
-            except (ValueError, TypeError): continue
+        raw_week_events = events
 
         structured_events = defaultdict(lambda: defaultdict(list))
         for event_struct in raw_week_events:
@@ -167,26 +99,8 @@ def index():
     else: # month view
         target_month_display = month
 
-        # カレンダー表示のための週データを取得 (既存のcalインスタンス作成をここに移動)
-        cal = calendar.Calendar(firstweekday=0) # firstweekday=0 は月曜日始まり
-        weeks_data = [w for w in cal.monthdatescalendar(target_month_display.year, target_month_display.month)]
-
-        display_start_date = None
-        display_end_date = None
-        if weeks_data:
-            display_start_date = weeks_data[0][0]
-            display_end_date = weeks_data[-1][-1]
-
-        # イベントのフィルタリング範囲を拡張
-        events_for_display_period = []
-        if display_start_date and display_end_date:
-            for e_event in events: # 'events' は既にソート済みの全イベントリスト
-                try:
-                    event_date_obj = date.fromisoformat(e_event.get("date", ""))
-                    if display_start_date <= event_date_obj <= display_end_date:
-                        events_for_display_period.append(e_event)
-                except ValueError:
-                    continue # 不正な日付フォーマットのイベントはスキップ
+        # 'events' は表示期間 (weeks_data の先頭から末尾まで) のソート済みイベント
+        events_for_display_period = events
 
         # flash(f"表示期間: {display_start_date} - {display_end_date}, イベント数: {len(events_for_display_period)}") # デバッグ用
 
@@ -335,17 +249,16 @@ def shift():
             current_day_iterator += timedelta(days=1)
         weeks_for_display.append(week_row)
 
-    # Adjust fetch_data_start_date_for_calc relative to the new actual_calendar_start_date
-    # This range is used for consecutive day calculations, so it needs to go back further.
-    # Let's keep it as 2 weeks before the calendar view starts for safety.
-    fetch_data_start_date_for_calc = actual_calendar_start_date - timedelta(days=14)
-    # fetch_data_end_date_for_calc should cover the displayed calendar period.
-    fetch_data_end_date_for_calc = actual_calendar_end_date
-
     if request.method == "POST":
         if not user or user.get("role") != "admin":
             flash("権限がありません (POST Auth)"); return redirect(url_for("calendario.index", month=target_month_display.strftime('%Y-%m')))
         action = request.form.get("action"); schedule: Dict[str, List[str]] = {}
+        if action == "generate":
+            try: result = solver.generate_and_save(target_month_display)
+            except Exception as e: flash(f"シフトの自動作成中にエラーが発生しました: {e}", "error"); return redirect(url_for("calendario.shift", month=target_month_display.strftime('%Y-%m')))
+            if result["violations"]: flash(f"シフトを自動作成しました (未解決のルール違反 {len(result['violations'])} 件)", "warning")
+            else: flash("シフトを自動作成しました")
+            return redirect(url_for("calendario.shift", month=target_month_display.strftime('%Y-%m')))
         for key, val in request.form.items():
             if key.startswith("d-"): schedule[key[2:]] = [e for e in val.split(',') if e]
         try: utils.set_shift_schedule(target_month_display, schedule)
@@ -356,53 +269,8 @@ def shift():
         elif action == "complete": flash("保存しました")
         else: flash("変更が保存されました")
         return redirect(url_for("calendario.shift", month=target_month_display.strftime('%Y-%m')))
-    all_events_raw = utils.load_events()
-
-    # Process all events (similar to index() route)
-    for event in all_events_raw:
-        title_match = time_title_pattern.match(event.get('title', ''))
-        if title_match:
-            event['display_time'] = title_match.group(1)
-            event['cleaned_title'] = title_match.group(2).strip()
-        else:
-            event['display_time'] = None
-            event['cleaned_title'] = event.get('title', '')
-
-        category = event.get('category', 'other')
-        has_time = event.get('display_time') is not None
-        if category == 'shucchou':
-            event['sort_priority'] = EVENT_SORT_PRIORITY['shucchou']
-            event['sort_time'] = "00:00"
-        elif category == 'hug':
-            event['sort_priority'] = EVENT_SORT_PRIORITY['hug']
-            event['sort_time'] = "00:00"
-        elif category == 'shift':
-            event['sort_priority'] = EVENT_SORT_PRIORITY['shift']
-            event['sort_time'] = "00:00" # Shifts are typically all-day in display sense or handled by specific UI
-        elif category in ['lesson', 'kouza', 'other', 'mummy', 'tattoo']:
-            if has_time:
-                event['sort_priority'] = EVENT_SORT_PRIORITY['other_with_time']
-                event['sort_time'] = event['display_time']
-            else:
-                event['sort_priority'] = EVENT_SORT_PRIORITY['other_no_time']
-                event['sort_time'] = "00:00"
-        else: # Fallback
-            event['sort_priority'] = 99
-            event['sort_time'] = "23:59"
-
-    # Filter events for the date range of the shift manager view (actual_calendar_start_date to actual_calendar_end_date)
-    # And also for the extended range needed for consecutive calculation (fetch_data_start_date_for_calc to fetch_data_end_date_for_calc)
-
-    relevant_events_for_display = []
-    for event in all_events_raw:
-        try:
-            event_date_obj = date.fromisoformat(event.get("date", ""))
-            if actual_calendar_start_date <= event_date_obj <= actual_calendar_end_date:
-                relevant_events_for_display.append(event)
-        except ValueError:
-            continue
-
-    relevant_events_for_display.sort(key=lambda e: (e.get("date", ""), e.get('sort_priority', 99), e.get('sort_time', '23:59')))
+    # Only the events shown in the shift manager are loaded
+    relevant_events_for_display = utils.display_events_between(actual_calendar_start_date, actual_calendar_end_date)
 
     all_events_by_date_for_shift_view = defaultdict(list)
     for event in relevant_events_for_display:
@@ -410,33 +278,12 @@ def shift():
 
     # Prepare shift-specific assignments for form submission and counts (original logic)
     assignments_for_form_submission: Dict[str, List[str]] = defaultdict(list)
-    for event in all_events_raw: # Use all_events_raw to capture all shifts for the month for form
-        if event.get("category") == "shift":
-            try:
-                # Check if event_date is within the visible calendar range for display consistency
-                event_date_obj = date.fromisoformat(event.get("date", ""))
-                if actual_calendar_start_date <= event_date_obj <= actual_calendar_end_date:
-                     assignments_for_form_submission[event["date"]].append(event.get("employee", ""))
-            except ValueError:
-                continue
-
-    # For consecutive day calculations, use a wider range
-    assignments_for_consecutive_calc: Dict[str, List[str]] = defaultdict(list)
-    for event in all_events_raw:
-        if event.get("category") == "shift":
-            try:
-                event_date_obj = date.fromisoformat(event.get("date", ""))
-                if fetch_data_start_date_for_calc <= event_date_obj <= fetch_data_end_date_for_calc:
-                    assignments_for_consecutive_calc[event["date"]].append(event.get("employee", ""))
-            except ValueError: continue
+    assignments_for_form_submission.update(utils.shifts_between(actual_calendar_start_date, actual_calendar_end_date))
 
     employees = [n for n, info_user in config.USERS.items() if info_user.get("role") != "admin"]
 
     # Counts should be based on the current target_month, not the entire display or calculation range
-    target_month_shifts_for_counts: Dict[str, List[str]] = defaultdict(list)
-    for event in all_events_raw:
-        if event.get("category") == "shift" and event.get("date", "").startswith(target_month_display.strftime("%Y-%m")):
-            target_month_shifts_for_counts[event["date"]].append(event.get("employee", ""))
+    target_month_shifts_for_counts = utils.shifts_between(first_day_of_month, last_day_of_month)
 
     counts = {emp: sum(emp in v for v in target_month_shifts_for_counts.values()) for emp in employees}
     days_in_target_month = calendar.monthrange(target_month_display.year, target_month_display.month)[1]
@@ -450,7 +297,8 @@ def shift():
 
     rules, defined_attributes = utils.load_rules(); rules_data_for_js = {"rules": rules, "defined_attributes": defined_attributes}
     csrf_form = ShiftManagementForm()
-    consecutive_days_data = utils.calculate_consecutive_work_days_for_all(assignments_for_consecutive_calc, target_month_display)
+    # Exact counts for the target month, runs that began in earlier months included
+    consecutive_days_data = utils.consecutive_work_days_between(first_day_of_month, last_day_of_month)
 
     return render_template("shift_manager.html", user=user, month=target_month_display,
                            rules_for_js=rules_data_for_js, form=csrf_form,
@@ -561,17 +409,64 @@ def api_recalculate_shift_counts() -> "flask.Response":
 
 @bp.route('/api/check_shift_violations', methods=['POST'])
 def check_shift_violations_api():
+    """Check a whole month, or apply ``changes`` to an earlier check's session.
+
+    A full check (``assignments`` and ``month``) opens a session whose token
+    and version are returned. Later requests may send ``session``,
+    ``version`` and ``changes`` (``[{"date", "employee", "op": "add"|"remove"}]``)
+    and receive only the ``added``/``removed`` violations. A 409 response
+    with ``resync`` asks the client to send a full check again.
+    """
     payload = request.get_json()
     if not payload: return jsonify({"success": False, "error": "Invalid request data: No data received"}), 400
+    owner = session.get("user", {}).get("username", "")
+    if "changes" in payload: return _apply_shift_changes(payload, owner)
     current_assignments = payload.get('assignments'); target_month_str = payload.get('month')
     if current_assignments is None or not isinstance(current_assignments, dict): return jsonify({"success": False, "error": "Invalid request data: 'assignments' key missing or invalid"}), 400
     if not target_month_str or not isinstance(target_month_str, str): return jsonify({"success": False, "error": "Invalid request data: 'month' key missing or invalid"}), 400
     try: year, month_num = map(int, target_month_str.split('-')); target_month_start = date(year, month_num, 1)
     except ValueError: return jsonify({"success": False, "error": "Invalid month format. Please use YYYY-MM."}), 400
-    rules, _ = utils.load_rules(); users_config = config.USERS
-    violation_list = utils.get_shift_violations(current_assignments, rules, users_config)
-    consecutive_info = utils.calculate_consecutive_work_days_for_all(current_assignments, target_month_start)
-    return jsonify({"success": True, "violations": violation_list, "consecutive_work_info": consecutive_info})
+    rules, _ = utils.load_rules()
+    # Runs that began before the submitted days continue from the stored shifts
+    submitted_days = []
+    for day_iso in current_assignments:
+        try: submitted_days.append(date.fromisoformat(day_iso))
+        except (TypeError, ValueError): continue
+    streaks_before = utils.streaks_as_of(min(submitted_days) - timedelta(days=1)) if submitted_days else None
+    engine = violations.ShiftViolationEngine(current_assignments, rules, target_month_start, streaks_before)
+    token = violations.open_session(owner, engine)
+    return jsonify({"success": True, "violations": engine.all_violations(), "consecutive_work_info": engine.consecutive,
+                    "session": token, "version": engine.version})
+
+def _apply_shift_changes(payload: Dict, owner: str) -> "flask.Response":
+    token = payload.get("session"); changes = payload.get("changes")
+    if not isinstance(token, str) or not isinstance(changes, list): return jsonify({"success": False, "error": "Invalid request data: 'session' or 'changes' missing or invalid"}), 400
+    engine = violations.get_session(token, owner)
+    if engine is None: return jsonify({"success": False, "resync": True, "error": "Unknown session"}), 409
+    with engine.lock:
+        if payload.get("version") != engine.version or not engine.is_current():
+            return jsonify({"success": False, "resync": True, "error": "Session is out of date"}), 409
+        try: result = engine.apply(changes)
+        except ValueError as e: return jsonify({"success": False, "error": str(e)}), 400
+        return jsonify({"success": True, "session": token, "version": engine.version, **result})
+
+@bp.route('/api/generate_shift', methods=['POST'])
+def generate_shift_api():
+    """Generate the roster of ``month`` (``YYYY-MM``) and save it unless ``save`` is false.
+
+    ``time_budget`` optionally limits the search in seconds.
+    """
+    user = session.get("user")
+    if not user or user.get("role") != "admin": return jsonify({"success": False, "error": "権限がありません"}), 403
+    payload = request.get_json(silent=True) or {}; month_str = payload.get("month")
+    if not month_str or not isinstance(month_str, str): return jsonify({"success": False, "error": "Invalid request data: 'month' key missing or invalid"}), 400
+    try: year, month_num = map(int, month_str.split('-')); month_start = date(year, month_num, 1)
+    except ValueError: return jsonify({"success": False, "error": "Invalid month format. Please use YYYY-MM."}), 400
+    time_budget = payload.get("time_budget")
+    if time_budget is not None and (not isinstance(time_budget, (int, float)) or not 0 < time_budget <= 60): return jsonify({"success": False, "error": "'time_budget' must be between 0 and 60 seconds"}), 400
+    if payload.get("save", True): result = solver.generate_and_save(month_start, time_budget=time_budget)
+    else: result = solver.generate_shift_schedule(month_start, time_budget=time_budget)
+    return jsonify({"success": True, **result})
 
 @bp.route('/api/event/drop', methods=['POST'])
 def api_event_drop():
@@ -620,24 +515,11 @@ def api_event_drop():
                 return jsonify({"success": False, "error": "イベントの移動に失敗しました。"}), 500
 
         elif operation == "copy":
-            print(f"LOG: {datetime.now()} - Operation: copy. Original event_id: {event_id}")
-            print(f"LOG: {datetime.now()} - Loading events for ID generation...")
-            events = utils.load_events()
-            next_id = max((e.get("id", 0) for e in events), default=0) + 1
-            print(f"LOG: {datetime.now()} - New event ID generated: {next_id}")
-
-            copied_event = original_event.copy()
-            copied_event["id"] = next_id
-            copied_event["date"] = new_date_obj.isoformat()
-
-            events.append(copied_event)
-            print(f"LOG: {datetime.now()} - Saving events with new copied event...")
-            utils.save_events(events)
-            print(f"LOG: {datetime.now()} - Events saved. Notifying for copied event...")
-            utils._notify_event("add", copied_event)
-            print(f"LOG: {datetime.now()} - Notification sent. Checking rules...")
-            utils.check_rules_and_notify()
-            print(f"LOG: {datetime.now()} - Rules checked. Copy successful. Returning 201.")
+            print(f"LOG: {datetime.now()} - Operation: copy. Calling utils.copy_event for event_id: {event_id}")
+            next_id = utils.copy_event(event_id, new_date_obj)
+            print(f"LOG: {datetime.now()} - Returned from utils.copy_event. New event ID: {next_id}")
+            if next_id is None:
+                return jsonify({"success": False, "error": "指定されたイベントが見つかりません。"}), 404
             return jsonify({"success": True, "message": "イベントがコピーされました。", "new_event_id": next_id}), 201
 
         else:
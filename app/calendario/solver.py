@@ -0,0 +1,232 @@
+"""Automatic shift rosters for the Calendario shift manager.
+
+:func:`generate_shift_schedule` looks for an assignment of employees to the
+days of a month that satisfies the shift rules of :func:`utils.load_rules`.
+It starts from a greedy roster and improves it by local search: each step
+picks one of the remaining violations, tries the changes that could
+repair it and keeps the best, sometimes accepting a worse roster to leave a
+local minimum. Every change is checked incrementally by
+:class:`~app.calendario.violations.ShiftViolationEngine`, so a step costs
+only the rules touched by the changed day.
+
+Among rosters with the same number of violations, the one spreading the
+work most evenly (smallest sum of squared work days) is preferred.
+"""
+
+import calendar
+import math
+import random
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import config
+
+from . import utils
+from .violations import ShiftViolationEngine
+
+DEFAULT_TIME_BUDGET = 5.0  # seconds
+
+# Probability of a random change instead of a repair move
+NOISE = 0.1
+
+# Steps without a better roster after which a violation-free search stops
+PATIENCE = 2000
+
+_Change = Tuple[str, str, str]  # (day, employee, "add" | "remove")
+_Move = Tuple[_Change, ...]
+
+
+def shift_employees() -> List[str]:
+    """Return the employees a roster is built from."""
+    excluded = getattr(config, "EXCLUDED_USERS", [])
+    return [name for name, info in config.USERS.items() if info.get("role") != "admin" and name not in excluded]
+
+
+def _away(start: date, end: date) -> Dict[str, Set[str]]:
+    """Return ``{"YYYY-MM-DD": employees}`` on a business trip (``shucchou``) that day."""
+    away: Dict[str, Set[str]] = {}
+    index = utils._events_index()
+    lo, hi = index._bounds(index.dates, start, end)
+    for day_iso, event in zip(index.dates[lo:hi], index.events[lo:hi]):
+        if event.get("category") != "shucchou": continue
+        people = away.setdefault(day_iso, set())
+        people.update(event.get("participants") or [])
+        if event.get("employee"): people.add(event["employee"])
+    return away
+
+
+class _Search:
+    """State of one local search over the days of a month."""
+
+    def __init__(self, month_start: date, employees: List[str], rules: Dict[str, Any], rng: random.Random) -> None:
+        days_in_month = calendar.monthrange(month_start.year, month_start.month)[1]
+        month_end = month_start + timedelta(days=days_in_month - 1)
+        self.days = [(month_start + timedelta(days=i)).isoformat() for i in range(days_in_month)]
+        self.employees = employees; self.rng = rng
+        self.away = _away(month_start, month_end)
+
+        # The end of the previous month is fixed but counts towards runs into this month
+        context_days = min(int(rules.get("max_consecutive_days", 9999)), 31)
+        assignments = utils.shifts_between(month_start - timedelta(days=context_days), month_start - timedelta(days=1))
+        self.load = {emp: 0 for emp in employees}
+        min_staff = int(rules.get("min_staff_per_day", 0))
+        for day_iso in self.days:
+            candidates = sorted(self._available(day_iso), key=lambda emp: (self.load[emp], rng.random()))
+            assignments[day_iso] = candidates[:min_staff]
+            for emp in assignments[day_iso]: self.load[emp] += 1
+
+        self.engine = ShiftViolationEngine(assignments, rules, month_start)
+        self.first_day, self.last_day = self.days[0], self.days[-1]
+        self.open = {vid for vid, (_, v) in self.engine.violations.items() if self._in_month(v)}
+        self.spread = sum(count * count for count in self.load.values())
+        # One violation outweighs any change of the spread a single move can cause
+        self.weight = 2 * days_in_month + 2
+
+    def _in_month(self, violation: Dict[str, Any]) -> bool:
+        return self.first_day <= violation["date"] <= self.last_day
+
+    def _available(self, day_iso: str) -> List[str]:
+        away = self.away.get(day_iso, set())
+        return [emp for emp in self.employees if emp not in away]
+
+    def score(self) -> int:
+        return len(self.open) * self.weight + self.spread
+
+    def apply(self, move: _Move) -> None:
+        result = self.engine.apply([{"date": day_iso, "employee": emp, "op": op} for day_iso, emp, op in move])
+        for violation_id in result["removed"]: self.open.discard(violation_id)
+        for violation in result["added"]:
+            if self._in_month(violation): self.open.add(violation["id"])
+        for _, emp, op in move:
+            count = self.load[emp]
+            if op == "add": self.spread += 2 * count + 1; self.load[emp] = count + 1
+            else: self.spread -= 2 * count - 1; self.load[emp] = count - 1
+
+    @staticmethod
+    def undo(move: _Move) -> _Move:
+        return tuple((day_iso, emp, "remove" if op == "add" else "add") for day_iso, emp, op in reversed(move))
+
+    def _adds(self, day_iso: str, candidates: List[str]) -> List[_Move]:
+        assigned = self.engine.days.get(day_iso, []); available = set(self._available(day_iso))
+        return [((day_iso, emp, "add"),) for emp in candidates if emp in available and emp not in assigned]
+
+    def _removes(self, day_iso: str, candidates: List[str]) -> List[_Move]:
+        assigned = self.engine.days.get(day_iso, [])
+        return [((day_iso, emp, "remove"),) for emp in candidates if emp in assigned and emp in self.load]
+
+    def _swaps(self, day_iso: str, candidates: List[str]) -> List[_Move]:
+        """Replace one of ``candidates`` working on ``day_iso`` by someone who is not."""
+        adds = self._adds(day_iso, self.employees)
+        return [remove + add for remove in self._removes(day_iso, candidates) for add in adds]
+
+    def repair_moves(self, violation: Dict[str, Any]) -> List[_Move]:
+        """Return the moves that could remove ``violation``."""
+        rule_type = violation["rule_type"]; day_iso = violation["date"]
+        if rule_type == "min_staff_per_day":
+            return self._adds(day_iso, self.employees)
+        if rule_type == "forbidden_pair":
+            return self._removes(day_iso, violation["employees"])
+        if rule_type == "required_pair":
+            details = violation["details"]
+            return self._adds(day_iso, [details["missing_member"]]) + self._removes(day_iso, [details["present_member"]])
+        if rule_type == "required_attribute_count":
+            attribute = violation["attribute"]
+            return self._adds(day_iso, [emp for emp in self.employees if attribute in self.engine.employee_attributes.get(emp, [])])
+        if rule_type == "specialized_requirement_missing":
+            return self._adds(day_iso, violation["details"]["required_staff"])
+        if rule_type == "max_consecutive_days":
+            end = date.fromisoformat(day_iso); run = violation["details"]["current_consecutive"]
+            run_days = [(end - timedelta(days=i)).isoformat() for i in range(run)]
+            return [move for d in run_days if self.first_day <= d for move in self._swaps(d, [violation["employee"]]) + self._removes(d, [violation["employee"]])]
+        return []
+
+    def random_moves(self) -> List[_Move]:
+        """Return the changes of a random day: the swaps of one employee, or a toggle."""
+        day_iso = self.rng.choice(self.days); available = self._available(day_iso)
+        if not available: return []
+        emp = self.rng.choice(available)
+        if emp in self.engine.days.get(day_iso, []):
+            return self._swaps(day_iso, [emp]) or self._removes(day_iso, [emp])
+        return self._adds(day_iso, [emp])
+
+    def roster(self) -> Dict[str, List[str]]:
+        return {day_iso: list(self.engine.days.get(day_iso, [])) for day_iso in self.days}
+
+
+def generate_shift_schedule(
+    month_start: date,
+    time_budget: Optional[float] = None,
+    employees: Optional[List[str]] = None,
+    rules: Optional[Dict[str, Any]] = None,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Search a roster for the month of ``month_start``.
+
+    Parameters
+    ----------
+    month_start : date
+        Any day of the month to plan.
+    time_budget : float, optional
+        Seconds the search may take, ``config.SHIFT_SOLVER_TIME_BUDGET`` or
+        ``DEFAULT_TIME_BUDGET`` by default.
+        The search stops earlier once a violation-free roster stops
+        improving.
+    employees : list of str, optional
+        Employees to schedule, :func:`shift_employees` by default.
+    rules : dict, optional
+        Shift rules, the saved rules by default.
+    seed : int, optional
+        Seed of the random choices, for reproducible rosters.
+
+    Returns
+    -------
+    dict
+        ``assignments`` (``{"YYYY-MM-DD": [employee, ...]}`` for every day
+        of the month), the ``violations`` the best roster still has,
+        ``steps`` and ``elapsed`` seconds.
+    """
+    started = time.monotonic()
+    budget = getattr(config, "SHIFT_SOLVER_TIME_BUDGET", DEFAULT_TIME_BUDGET) if time_budget is None else time_budget
+    month_start = month_start.replace(day=1)
+    if rules is None: rules, _ = utils.load_rules()
+    search = _Search(month_start, list(employees if employees is not None else shift_employees()), rules, random.Random(seed))
+
+    best_score = search.score(); best_roster = search.roster(); steps = 0; since_best = 0
+    temperature = float(search.weight)
+    while time.monotonic() - started < budget:
+        if not search.open and since_best >= PATIENCE: break
+        steps += 1; since_best += 1
+        moves: List[_Move] = []
+        if search.open and search.rng.random() >= NOISE:
+            violation_id = search.rng.choice(sorted(search.open))
+            moves = search.repair_moves(search.engine.violations[violation_id][1])
+        if not moves: moves = search.random_moves()
+        if not moves: continue
+
+        # Try each candidate and keep the best one
+        current = search.score(); chosen: Optional[_Move] = None; chosen_score = 0
+        for move in moves:
+            search.apply(move); candidate_score = search.score(); search.apply(search.undo(move))
+            if chosen is None or candidate_score < chosen_score or (candidate_score == chosen_score and search.rng.random() < 0.5):
+                chosen, chosen_score = move, candidate_score
+        delta = chosen_score - current
+        if delta <= 0 or search.rng.random() < math.exp(-delta / temperature):
+            search.apply(chosen)
+            if chosen_score < best_score:
+                best_score, best_roster, since_best = chosen_score, search.roster(), 0
+        temperature = max(temperature * 0.999, 0.5)
+
+    return {
+        "assignments": best_roster,
+        "violations": [v for v in utils.get_shift_violations({**search.engine.days, **best_roster}, rules, {}) if search._in_month(v)],
+        "steps": steps,
+        "elapsed": time.monotonic() - started,
+    }
+
+
+def generate_and_save(month_start: date, time_budget: Optional[float] = None, seed: Optional[int] = None) -> Dict[str, Any]:
+    """Generate a roster with :func:`generate_shift_schedule` and save it with ``set_shift_schedule``."""
+    result = generate_shift_schedule(month_start, time_budget=time_budget, seed=seed)
+    utils.set_shift_schedule(month_start.replace(day=1), {d: emps for d, emps in result["assignments"].items() if emps})
+    return result
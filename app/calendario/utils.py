@@ -1,20 +1,22 @@
 """Utility functions for Calendario."""
 
 import json
+import re
+from bisect import bisect_left, bisect_right
 from datetime import date, timedelta, datetime, time
 from pathlib import Path
-from typing import List, Dict, Set, Optional, Iterable, Any
+from typing import Callable, List, Dict, Set, Optional, Iterable, Any, Tuple
 from collections import defaultdict
+from itertools import groupby
 import calendar # Added calendar import
 
 import config
-from app.utils import send_email
+from app import digest, sequence, storage
 
 
 def _notify_all(subject: str, body: str) -> None:
-    for user_info_val in config.USERS.values():
-        email = user_info_val.get("email")
-        if email: send_email(subject, body, email)
+    # Bursts of calendar changes are merged into one digest per user
+    digest.notify(subject, body, [info["email"] for info in config.USERS.values() if info.get("email")])
 
 def _notify_event(action: str, event_data: Dict[str, Any], old_date_val: str = "") -> None:
     print(f"LOG: {datetime.now()} - Entered _notify_event. Action: {action}, Event Title: {event_data.get('title')}")
@@ -50,26 +52,249 @@ DEFAULT_DEFINED_ATTRIBUTES = ["Dog", "Lady", "Man", "Kaji", "Massage"]
 EVENTS_PATH = Path(getattr(config, "CALENDAR_FILE", "events.json"))
 RULES_PATH = Path(getattr(config, "CALENDAR_RULES_FILE", "calendar_rules.json"))
 
+# Called with the dates whose shifts changed, e.g. to update the reminders
+# of the users on shift (see on_shifts_changed)
+_shift_listeners: List[Callable[[List[date]], None]] = []
+
+def on_shifts_changed(listener: Callable[[List[date]], None]) -> None:
+    """Call ``listener`` with the changed dates whenever shifts are added, moved or reassigned."""
+    _shift_listeners.append(listener)
+
+def _shifts_changed(events: Iterable[Dict[str, Any]], *extra_dates: str) -> None:
+    days: Set[date] = set()
+    for day_str in [e.get("date", "") for e in events if e.get("category") == "shift"] + list(extra_dates):
+        try: days.add(date.fromisoformat(day_str))
+        except (TypeError, ValueError): continue
+    if not days: return
+    for listener in _shift_listeners:
+        try: listener(sorted(days))
+        except Exception as e: print(f"Shift change listener failed: {e}")
+
+def _read_events() -> List[Dict[str, Any]]:
+    """Return the shared, read-only list of events."""
+    try:
+        return storage.read_json(EVENTS_PATH, [])
+    except json.JSONDecodeError:
+        print(f"LOG: {datetime.now()} - _read_events, JSONDecodeError")
+        return []
+
 def load_events() -> List[Dict[str, Any]]:
     print(f"LOG: {datetime.now()} - Entered load_events")
-    if EVENTS_PATH.exists():
-        with open(EVENTS_PATH, "r", encoding="utf-8") as f:
-            try:
-                events = json.load(f)
-                print(f"LOG: {datetime.now()} - Exiting load_events, loaded {len(events)} events")
-                return events
-            except json.JSONDecodeError:
-                print(f"LOG: {datetime.now()} - Exiting load_events, JSONDecodeError")
-                return []
-    print(f"LOG: {datetime.now()} - Exiting load_events, file not found")
-    return []
+    try:
+        events = storage.load_json(EVENTS_PATH, [])
+    except json.JSONDecodeError:
+        print(f"LOG: {datetime.now()} - Exiting load_events, JSONDecodeError")
+        return []
+    print(f"LOG: {datetime.now()} - Exiting load_events, loaded {len(events)} events")
+    return events
 
 def save_events(events_list: List[Dict[str, Any]]) -> None:
     print(f"LOG: {datetime.now()} - Entered save_events, saving {len(events_list)} events")
-    with open(EVENTS_PATH, "w", encoding="utf-8") as f:
-        json.dump(events_list, f, ensure_ascii=False, indent=2)
+    storage.save_json(EVENTS_PATH, events_list)
     print(f"LOG: {datetime.now()} - Exiting save_events")
 
+# Regex for parsing time from event titles
+time_title_pattern = re.compile(r'^(\d{1,2}:\d{2})\s*(.*)$')
+
+EVENT_SORT_PRIORITY = {
+    "shucchou": 1,
+    "hug": 2,
+    "other_no_time": 3,
+    "shift": 4,
+    "other_with_time": 5,
+    "mummy": 5, # 追加
+    "tattoo": 5, # 追加
+}
+
+def event_display_fields(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the fields the calendar templates use to show and order ``event``.
+
+    ``display_time`` and ``cleaned_title`` come from a leading ``HH:MM`` in
+    the title, ``sort_priority``/``sort_time`` order events within a day and
+    ``css_category_class`` selects the colour.
+    """
+    fields: Dict[str, Any] = {}
+    title_match = time_title_pattern.match(event.get('title', ''))
+    if title_match:
+        fields['display_time'] = title_match.group(1)
+        fields['cleaned_title'] = title_match.group(2).strip()
+    else:
+        fields['display_time'] = None
+        fields['cleaned_title'] = event.get('title', '')
+
+    category = event.get('category', 'other')
+    has_time = fields['display_time'] is not None
+    if category in ('shucchou', 'hug', 'shift'):
+        fields['sort_priority'] = EVENT_SORT_PRIORITY[category]
+        fields['sort_time'] = "00:00"
+    elif category in ['lesson', 'kouza', 'other', 'mummy', 'tattoo']:
+        if has_time:
+            fields['sort_priority'] = EVENT_SORT_PRIORITY['other_with_time']
+            fields['sort_time'] = fields['display_time']
+        else: # Time not specified
+            fields['sort_priority'] = EVENT_SORT_PRIORITY['other_no_time']
+            fields['sort_time'] = "00:00"
+    else: # Fallback
+        fields['sort_priority'] = 99
+        fields['sort_time'] = "23:59"
+
+    category = event.get('category') # Keep original case for logic if needed elsewhere
+    if category:
+        cat_lower = category.lower()
+        if cat_lower in ['出張', 'shucchou', 'trip']: # 'trip' was previously used for shucchou color
+            fields['css_category_class'] = 'shucchou'
+        elif cat_lower in ['マミー系', 'mummy', 'mammy']: # mammy for older data, mummy for new
+            fields['css_category_class'] = 'mummy'
+        else:
+            fields['css_category_class'] = cat_lower.replace(' ', '_') # Default to lowercase, replace spaces
+    else:
+        fields['css_category_class'] = 'other'
+    return fields
+
+class _EventIndex:
+    """Events in display order, built once per version of the events file.
+
+    Events are ordered by date, then by ``sort_priority`` and ``sort_time``
+    (see :func:`event_display_fields`), then by their position in the file.
+    """
+
+    def __init__(self, events: List[Dict[str, Any]]) -> None:
+        self.source = events
+        dated: List[Tuple[Tuple[str, int, str], Dict[str, Any], Dict[str, Any]]] = []
+        for event in events:
+            try: day = date.fromisoformat(event.get("date", "")).isoformat()
+            except (TypeError, ValueError): continue
+            fields = event_display_fields(event)
+            dated.append(((day, fields['sort_priority'], fields['sort_time']), event, fields))
+        dated.sort(key=lambda item: item[0])  # stable: file order among equal keys
+        self.dates = [key[0] for key, _, _ in dated]
+        self.events = [e for _, e, _ in dated]
+        self.fields = [f for _, _, f in dated]
+        shifts = [(key[0], e) for key, e, _ in dated if e.get("category") == "shift"]
+        self.shift_dates = [d for d, _ in shifts]
+        self.shifts = [e for _, e in shifts]
+        self.memo: Dict[Any, Any] = {}
+
+    @staticmethod
+    def _bounds(keys: List[str], start: date, end: date) -> Tuple[int, int]:
+        return bisect_left(keys, start.isoformat()), bisect_right(keys, end.isoformat())
+
+    def between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        lo, hi = self._bounds(self.dates, start, end)
+        return self.events[lo:hi]
+
+    def display_between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        lo, hi = self._bounds(self.dates, start, end)
+        return [{**e, **f} for e, f in zip(self.events[lo:hi], self.fields[lo:hi])]
+
+    def shifts_between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        lo, hi = self._bounds(self.shift_dates, start, end)
+        return self.shifts[lo:hi]
+
+_event_index: Optional[_EventIndex] = None
+
+def _events_index() -> _EventIndex:
+    """Return the date index of the current events file."""
+    global _event_index
+    events = _read_events(); index = _event_index
+    if index is None or index.source is not events:
+        index = _event_index = _EventIndex(events)
+    return index
+
+def events_between(start: date, end: date) -> List[Dict[str, Any]]:
+    """Return copies of the events dated ``start``..``end`` (inclusive) in display order.
+
+    Events whose ``date`` is not a valid ISO date are never returned.
+    """
+    return [dict(e) for e in _events_index().between(start, end)]
+
+def display_events_between(start: date, end: date) -> List[Dict[str, Any]]:
+    """Like :func:`events_between` with :func:`event_display_fields` merged in."""
+    return _events_index().display_between(start, end)
+
+def events_on(day: date) -> List[Dict[str, Any]]:
+    """Return copies of the events dated ``day``."""
+    return events_between(day, day)
+
+def shifts_between(start: date, end: date) -> Dict[str, List[str]]:
+    """Return ``{"YYYY-MM-DD": [employee, ...]}`` for shifts dated ``start``..``end``."""
+    assignments: Dict[str, List[str]] = defaultdict(list)
+    for event in _events_index().shifts_between(start, end):
+        assignments[event["date"]].append(event.get("employee", ""))
+    return dict(assignments)
+
+def first_event_date() -> Optional[date]:
+    """Return the date of the earliest event, or ``None`` without events."""
+    index = _events_index()
+    return date.fromisoformat(index.dates[0]) if index.dates else None
+
+def _streaks_path() -> Path:
+    return EVENTS_PATH.with_name(EVENTS_PATH.stem + "_streaks.json")
+
+def _iter_streaks(worked_days: Iterable[Tuple[date, Iterable[str]]], streaks: Optional[Dict[str, int]] = None, as_of: Optional[date] = None) -> Iterable[Tuple[date, Dict[str, int]]]:
+    """Walk ``(day, employees)`` pairs in date order once, yielding ``(day, {employee: n})``.
+
+    ``n`` is the employee's n-th consecutive work day. ``streaks`` are the
+    counts as of ``as_of``, the day before the first of ``worked_days``.
+    """
+    previous = streaks or {}; previous_day = as_of
+    for day, employees in worked_days:
+        continuing = previous_day is not None and (day - previous_day).days == 1
+        current = {emp: previous.get(emp, 0) + 1 if continuing else 1 for emp in employees}
+        yield day, current
+        previous, previous_day = current, day
+
+def _shift_days(index: _EventIndex, start: date, end: date) -> Iterable[Tuple[date, List[str]]]:
+    lo, hi = index._bounds(index.shift_dates, start, end)
+    for day_iso, group in groupby(zip(index.shift_dates[lo:hi], index.shifts[lo:hi]), key=lambda item: item[0]):
+        yield date.fromisoformat(day_iso), [e["employee"] for _, e in group if e.get("employee")]
+
+def _streak_checkpoints(index: _EventIndex) -> Dict[str, Dict[str, int]]:
+    """Return ``{"YYYY-MM": {employee: streak on the month's last day}}``.
+
+    The checkpoints are computed in a single pass over every shift and
+    persisted next to the events file, tagged with the events file stamp
+    so other workers reuse them until the events change.
+    """
+    if "streak_checkpoints" in index.memo: return index.memo["streak_checkpoints"]
+    events_stamp = storage.stamp(EVENTS_PATH); months: Optional[Dict[str, Dict[str, int]]] = None
+    # The stamp only describes ``index`` if the file was not replaced since it was read
+    current = events_stamp is not None and _read_events() is index.source
+    if current:
+        try: persisted = storage.read_json(_streaks_path(), {})
+        except json.JSONDecodeError: persisted = {}
+        if persisted.get("events") == list(events_stamp): months = persisted.get("months", {})
+    if months is None:
+        months = {}
+        for day, streaks in _iter_streaks(_shift_days(index, date.min, date.max)):
+            if streaks and (day + timedelta(days=1)).day == 1: months[day.strftime("%Y-%m")] = streaks
+        if current: storage.save_json(_streaks_path(), {"events": list(events_stamp), "months": months})
+    index.memo["streak_checkpoints"] = months
+    return months
+
+def streaks_as_of(day: date) -> Dict[str, int]:
+    """Return ``{employee: n}`` for employees working their n-th consecutive shift day on ``day``.
+
+    Only the shifts of ``day``'s month are read; earlier months come from
+    the persisted month-end checkpoints.
+    """
+    index = _events_index(); month_end = day.replace(day=1) - timedelta(days=1)
+    streaks = _streak_checkpoints(index).get(month_end.strftime("%Y-%m"), {}); last_day = month_end
+    for last_day, streaks in _iter_streaks(_shift_days(index, month_end + timedelta(days=1), day), streaks, month_end): pass
+    return dict(streaks) if last_day == day else {}
+
+def consecutive_work_days_between(start: date, end: date) -> Dict[str, Dict[str, int]]:
+    """Return ``{employee: {"YYYY-MM-DD": n}}`` for the stored shifts dated ``start``..``end``.
+
+    ``n`` counts every earlier consecutive day, however long before ``start``
+    the run began.
+    """
+    index = _events_index(); before = start - timedelta(days=1)
+    result: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for day, streaks in _iter_streaks(_shift_days(index, start, end), streaks_as_of(before), before):
+        for emp, count in streaks.items(): result[emp][day.isoformat()] = count
+    return dict(result)
+
 def get_event_by_id(event_id: int) -> Optional[Dict[str, Any]]:
     print(f"LOG: {datetime.now()} - Entered get_event_by_id for event_id: {event_id}")
     events = load_events()
@@ -85,25 +310,30 @@ def add_event(
     category: str = "other", participants: Optional[Iterable[str]] = None,
     time: Optional[datetime.time] = None,
 ) -> None:
-    events = load_events()
-    next_id = max((e.get("id", 0) for e in events), default=0) + 1
-    new_event = {
-        "id": next_id, "date": event_date_obj.isoformat(), "title": title,
-        "description": description, "employee": employee, "category": category,
-        "participants": list(participants or []),
-        "time": time if isinstance(time, str) else (time.isoformat(timespec='minutes') if hasattr(time, 'isoformat') else None),
-    }
-    events.append(new_event); save_events(events); _notify_event("add", new_event)
+    with storage.locked(EVENTS_PATH):
+        events = load_events()
+        next_id = sequence.next_id(EVENTS_PATH, events)
+        new_event = {
+            "id": next_id, "date": event_date_obj.isoformat(), "title": title,
+            "description": description, "employee": employee, "category": category,
+            "participants": list(participants or []),
+            "time": time if isinstance(time, str) else (time.isoformat(timespec='minutes') if hasattr(time, 'isoformat') else None),
+        }
+        events.append(new_event); save_events(events)
+    _notify_event("add", new_event)
+    _shifts_changed([new_event])
     check_rules_and_notify()
     if category == "lesson":
         from app.corso import utils as corso_utils
         corso_utils.add_post("system", title, description or "lesson scheduled", None, None)
 
 def update_event(event_id: int, form_data: Dict[str, Any]) -> bool:
-    events = load_events(); event_idx = -1
-    for i, ev_item in enumerate(events):
-        if ev_item.get("id") == event_id: event_idx = i; break
-    if event_idx != -1:
+    with storage.locked(EVENTS_PATH):
+        events = load_events(); event_idx = -1
+        for i, ev_item in enumerate(events):
+            if ev_item.get("id") == event_id: event_idx = i; break
+        if event_idx == -1: return False
+        event_before_update = events[event_idx].copy()
         current_event_id = events[event_idx]['id']; update_payload = form_data.copy()
         if 'date' in update_payload and isinstance(update_payload['date'], date):
             update_payload['date'] = update_payload['date'].isoformat()
@@ -113,38 +343,39 @@ def update_event(event_id: int, form_data: Dict[str, Any]) -> bool:
             update_payload['time'] = None
         events[event_idx].update(update_payload); events[event_idx]['id'] = current_event_id
         updated_event_for_notification = events[event_idx].copy()
-        save_events(events); _notify_event("update", updated_event_for_notification)
-        check_rules_and_notify(); return True
-    return False
+        save_events(events)
+    _notify_event("update", updated_event_for_notification)
+    _shifts_changed([event_before_update, updated_event_for_notification])
+    check_rules_and_notify(); return True
 
 def delete_event(event_id: int) -> bool:
-    events = load_events(); event_to_delete = None
-    for ev_item in events:
-        if ev_item.get("id") == event_id: event_to_delete = ev_item.copy(); break
-    new_events_list = [e for e in events if e.get("id") != event_id]; deleted = False
-    if len(new_events_list) < len(events):
-        deleted = True; save_events(new_events_list)
-        if event_to_delete: _notify_event("delete", event_to_delete)
+    with storage.locked(EVENTS_PATH):
+        events = load_events(); event_to_delete = None
+        for ev_item in events:
+            if ev_item.get("id") == event_id: event_to_delete = ev_item.copy(); break
+        new_events_list = [e for e in events if e.get("id") != event_id]; deleted = False
+        if len(new_events_list) < len(events):
+            deleted = True; save_events(new_events_list)
+    if deleted:
+        if event_to_delete: _notify_event("delete", event_to_delete); _shifts_changed([event_to_delete])
         check_rules_and_notify()
     return deleted
 
 def load_rules() -> tuple[Dict[str, Any], List[str]]:
     rules_dict = DEFAULT_RULES.copy() # specialized_requirements もコピーされる
-    if RULES_PATH.exists():
-        with open(RULES_PATH, "r", encoding="utf-8") as f:
-            try:
-                loaded_from_file = json.load(f)
-                # 既存のキーのみを上書きし、新しいキー(specialized_requirementsなど)はデフォルトを維持
-                for key in DEFAULT_RULES.keys(): # Iterate over keys in DEFAULT_RULES to ensure all are present
-                    if key in loaded_from_file:
-                        rules_dict[key] = loaded_from_file[key]
-                    # If a key from DEFAULT_RULES is not in loaded_from_file, it keeps its default value from rules_dict = DEFAULT_RULES.copy()
-                # Handle defined_attributes separately if it's stored outside DEFAULT_RULES structure in JSON but managed by it
-                if "defined_attributes" in loaded_from_file:
-                     rules_dict["defined_attributes"] = loaded_from_file["defined_attributes"]
-
-            except json.JSONDecodeError:
-                pass # デフォルトルールを使用
+    try:
+        loaded_from_file = storage.load_json(RULES_PATH, {})
+        # 既存のキーのみを上書きし、新しいキー(specialized_requirementsなど)はデフォルトを維持
+        for key in DEFAULT_RULES.keys(): # Iterate over keys in DEFAULT_RULES to ensure all are present
+            if key in loaded_from_file:
+                rules_dict[key] = loaded_from_file[key]
+            # If a key from DEFAULT_RULES is not in loaded_from_file, it keeps its default value from rules_dict = DEFAULT_RULES.copy()
+        # Handle defined_attributes separately if it's stored outside DEFAULT_RULES structure in JSON but managed by it
+        if "defined_attributes" in loaded_from_file:
+             rules_dict["defined_attributes"] = loaded_from_file["defined_attributes"]
+
+    except json.JSONDecodeError:
+        pass # デフォルトルールを使用
 
     defined_attributes = rules_dict.get("defined_attributes", DEFAULT_DEFINED_ATTRIBUTES[:])
     if not (isinstance(defined_attributes, list) and all(isinstance(attr, str) for attr in defined_attributes)):
@@ -177,8 +408,7 @@ def save_rules(
     # Ensure 'defined_attributes' from the argument list is authoritative
     rules_to_save["defined_attributes"] = defined_attributes
     rules_to_save["specialized_requirements"] = specialized_requirements_data # 専門予定データを追加
-    with open(RULES_PATH, "w", encoding="utf-8") as f:
-        json.dump(rules_to_save, f, ensure_ascii=False, indent=2)
+    storage.save_json(RULES_PATH, rules_to_save)
 
 def parse_pairs(text: str) -> List[List[str]]:
     pairs: List[List[str]] = [];_ = [pairs.append(names[:2]) for item in text.split(',') if item for names in [[p.strip() for p in item.split('-') if p.strip()]] if len(names) >= 2] if text else []
@@ -194,18 +424,21 @@ def parse_kv_int(text: str) -> Dict[str, int]:
 
 def move_event(event_id: int, new_event_date: date) -> bool:
     print(f"LOG: {datetime.now()} - Entered move_event for event_id: {event_id} to new_date: {new_event_date.isoformat()}")
-    events = load_events(); updated = False; changed_event_copy = None; original_date_str = ""
-    for ev_item in events:
-        if ev_item.get("id") == event_id:
-            original_date_str = ev_item.get("date", ""); ev_item["date"] = new_event_date.isoformat(); updated = True
-            changed_event_copy = ev_item.copy(); break
+    with storage.locked(EVENTS_PATH):
+        events = load_events(); updated = False; changed_event_copy = None; original_date_str = ""
+        for ev_item in events:
+            if ev_item.get("id") == event_id:
+                original_date_str = ev_item.get("date", ""); ev_item["date"] = new_event_date.isoformat(); updated = True
+                changed_event_copy = ev_item.copy(); break
+        if updated:
+            print(f"LOG: {datetime.now()} - Event {event_id} date updated in memory. Calling save_events.")
+            save_events(events)
 
     if updated:
-        print(f"LOG: {datetime.now()} - Event {event_id} date updated in memory. Calling save_events.")
-        save_events(events)
         print(f"LOG: {datetime.now()} - Returned from save_events for move. Calling _notify_event.")
         if changed_event_copy:
             _notify_event("move", changed_event_copy, original_date_str)
+            if changed_event_copy.get("category") == "shift": _shifts_changed([changed_event_copy], original_date_str)
         print(f"LOG: {datetime.now()} - Returned from _notify_event for move. Calling check_rules_and_notify.")
         check_rules_and_notify()
         print(f"LOG: {datetime.now()} - Returned from check_rules_and_notify for move.")
@@ -216,21 +449,43 @@ def move_event(event_id: int, new_event_date: date) -> bool:
     return updated
 
 def assign_employee(event_id: int, employee_name: str) -> bool:
-    events = load_events(); updated = False; changed_event_copy = None
-    for ev_item in events:
-        if ev_item.get("id") == event_id:
-            ev_item["employee"] = employee_name; updated = True; changed_event_copy = ev_item.copy(); break
-    if updated: save_events(events); _notify_event("assign", changed_event_copy) if changed_event_copy else None; check_rules_and_notify()
+    with storage.locked(EVENTS_PATH):
+        events = load_events(); updated = False; changed_event_copy = None
+        for ev_item in events:
+            if ev_item.get("id") == event_id:
+                ev_item["employee"] = employee_name; updated = True; changed_event_copy = ev_item.copy(); break
+        if updated: save_events(events)
+    if updated:
+        if changed_event_copy: _notify_event("assign", changed_event_copy); _shifts_changed([changed_event_copy])
+        check_rules_and_notify()
     return updated
 
+def copy_event(event_id: int, new_event_date: date) -> Optional[int]:
+    """Duplicate an event onto ``new_event_date`` and return the new ID."""
+    with storage.locked(EVENTS_PATH):
+        events = load_events(); original_event = None
+        for ev_item in events:
+            if ev_item.get("id") == event_id: original_event = ev_item; break
+        if original_event is None: return None
+        next_id = sequence.next_id(EVENTS_PATH, events)
+        copied_event = original_event.copy(); copied_event["id"] = next_id; copied_event["date"] = new_event_date.isoformat()
+        events.append(copied_event); save_events(events)
+    _notify_event("add", copied_event); _shifts_changed([copied_event]); check_rules_and_notify()
+    return next_id
+
 def set_shift_schedule(month_date: date, schedule_data: Dict[str, List[str]]) -> None:
-    events = load_events(); events = [e for e in events if not (e.get("category") == "shift" and e.get("date", "").startswith(month_date.strftime("%Y-%m")))]
-    next_id = max((e.get("id", 0) for e in events), default=0) + 1
-    for day_iso_str, emps_list in schedule_data.items():
-        for emp_name_val in emps_list:
-            new_shift = {"id": next_id, "date": day_iso_str, "title": emp_name_val, "description": "", "employee": emp_name_val, "category": "shift", "participants": []}
-            events.append(new_shift); next_id += 1
-    save_events(events); check_rules_and_notify(send_notifications=False)
+    with storage.locked(EVENTS_PATH):
+        events = load_events(); month_prefix = month_date.strftime("%Y-%m")
+        replaced_shifts = [e for e in events if e.get("category") == "shift" and e.get("date", "").startswith(month_prefix)]
+        events = [e for e in events if not (e.get("category") == "shift" and e.get("date", "").startswith(month_prefix))]
+        next_id = sequence.next_id(EVENTS_PATH, events, count=sum(len(emps) for emps in schedule_data.values()))
+        for day_iso_str, emps_list in schedule_data.items():
+            for emp_name_val in emps_list:
+                new_shift = {"id": next_id, "date": day_iso_str, "title": emp_name_val, "description": "", "employee": emp_name_val, "category": "shift", "participants": []}
+                events.append(new_shift); next_id += 1
+        save_events(events)
+    _shifts_changed(replaced_shifts, *schedule_data)
+    check_rules_and_notify(send_notifications=False)
 
 def get_admin_email_address() -> Optional[str]:
     for user_cfg in config.USERS.values():
@@ -251,22 +506,24 @@ def check_rules_and_notify(send_notifications: bool = False) -> None:
     pass
 
 def get_users_on_shift(target_date: date) -> List[str]:
-    events = load_events(); users_on_shift_today: Set[str] = set(); target_date_iso = target_date.isoformat()
-    for event in events:
-        if event.get('date') == target_date_iso and event.get('category') == 'shift' and event.get('employee'):
-            users_on_shift_today.add(event['employee'])
+    users_on_shift_today: Set[str] = set()
+    for event in _events_index().shifts_between(target_date, target_date):
+        if event.get('employee'): users_on_shift_today.add(event['employee'])
     return list(users_on_shift_today)
 
 def compute_employee_stats(start_date_param: Optional[date] = None, end_date_param: Optional[date] = None) -> Dict[str, Dict[str, int]]:
-    events = load_events(); stats_by_employee: Dict[str, Set[date]] = defaultdict(set) # Use defaultdict
-    for event_item_stats in events:
-        emp_name_stats = event_item_stats.get("employee"); date_iso_str_stats = event_item_stats.get("date")
-        if not emp_name_stats or not date_iso_str_stats: continue
-        try: event_date_obj_stats = date.fromisoformat(date_iso_str_stats)
-        except ValueError: continue
-        if (start_date_param and event_date_obj_stats < start_date_param) or \
-           (end_date_param and event_date_obj_stats > end_date_param): continue
-        stats_by_employee[emp_name_stats].add(event_date_obj_stats)
+    index = _events_index(); memo_key = ("employee_stats", start_date_param, end_date_param)
+    if memo_key not in index.memo:
+        if len(index.memo) >= 64: index.memo.clear()
+        index.memo[memo_key] = _compute_employee_stats(index, start_date_param, end_date_param)
+    return {emp: dict(data) for emp, data in index.memo[memo_key].items()}
+
+def _compute_employee_stats(index: _EventIndex, start_date_param: Optional[date], end_date_param: Optional[date]) -> Dict[str, Dict[str, int]]:
+    stats_by_employee: Dict[str, Set[str]] = defaultdict(set) # Use defaultdict
+    for event_item_stats in index.between(start_date_param or date.min, end_date_param or date.max):
+        emp_name_stats = event_item_stats.get("employee")
+        if not emp_name_stats: continue
+        stats_by_employee[emp_name_stats].add(event_item_stats.get("date"))
     total_days_in_range_val = None
     if start_date_param and end_date_param and end_date_param >= start_date_param:
         total_days_in_range_val = (end_date_param - start_date_param).days + 1
@@ -278,168 +535,81 @@ def compute_employee_stats(start_date_param: Optional[date] = None, end_date_par
         final_stats[emp_name_stats_final] = emp_data
     return final_stats
 
+def _consecutive_violation(emp_name: str, consecutive_run: int, max_consecutive: int, last_day_of_run: date) -> Dict[str, Any]:
+    return {"date": last_day_of_run.isoformat(), "rule_type": "max_consecutive_days", "employee": emp_name, "description": f"{emp_name}さんは{consecutive_run}連勤です (最大{max_consecutive}日)。超過最終日: {last_day_of_run.isoformat()}", "details": {"current_consecutive": consecutive_run, "max_allowed": max_consecutive, "employee": emp_name, "offending_end_date": last_day_of_run.isoformat()}}
+
+def _min_staff_violation(target_date_iso_str: str, current_staff_count: int, min_staff: int) -> Dict[str, Any]:
+    return {"date": target_date_iso_str, "rule_type": "min_staff_per_day", "description": f"{target_date_iso_str}は最低{min_staff}人必要ですが、現在{current_staff_count}人です", "details": {"current_staff": current_staff_count, "min_required": min_staff, "date": target_date_iso_str}}
+
+def _forbidden_pair_violation(target_date_iso_str: str, pair: List[str]) -> Dict[str, Any]:
+    return {"date": target_date_iso_str, "rule_type": "forbidden_pair", "employees": pair, "description": f"{pair[0]}さんと{pair[1]}さんは{target_date_iso_str}に同時勤務が禁止されています", "details": {"pair": pair, "date": target_date_iso_str}}
+
+def _required_pair_violation(target_date_iso_str: str, pair: List[str], first_present: bool) -> Dict[str, Any]:
+    missing_member = pair[1] if first_present else pair[0]; present_member = pair[0] if first_present else pair[1]
+    return {"date": target_date_iso_str, "rule_type": "required_pair", "employees": pair, "description": f"{pair[0]}さんと{pair[1]}さんは{target_date_iso_str}にペアでの勤務が必要です ({missing_member}さんがいません)", "details": {"pair": pair, "present_member": present_member, "missing_member": missing_member, "date": target_date_iso_str}}
+
+def _attribute_violation(target_date_iso_str: str, req_attr_name: str, current_attr_count: int, req_count: int) -> Dict[str, Any]:
+    return {"date": target_date_iso_str, "rule_type": "required_attribute_count", "attribute": req_attr_name, "description": f"{target_date_iso_str}には属性'{req_attr_name}'が最低{req_count}人必要ですが、現在{current_attr_count}人です", "details": {"current_count": current_attr_count, "required_count": req_count, "attribute": req_attr_name, "date": target_date_iso_str}}
+
+def _specialized_violation(target_date_iso_str: str, event_category_key: str, required_staff_list: List[str], assigned_emps_on_day: List[str]) -> Dict[str, Any]:
+    # 警告メッセージの担当者リスト部分を作成
+    required_staff_str = "または".join(required_staff_list)
+    # カテゴリ表示名 (実際のアプリケーションでは、キーから表示名へのマッピングが望ましい)
+    # 例: category_display_names = {"mummy": "マミー系", "tattoo": "タトゥー"}
+    category_display_name = event_category_key # For now, use key
+    description = f"{category_display_name}の予定がある日({target_date_iso_str})に{required_staff_str}が割り当てられていません"
+    return {
+        "date": target_date_iso_str,
+        "rule_type": "specialized_requirement_missing",
+        "category": event_category_key,
+        "description": description,
+        "details": {
+            "required_staff": required_staff_list,
+            "assigned_staff": assigned_emps_on_day,
+            "category": event_category_key,
+            "date": target_date_iso_str
+        }
+    }
+
 def get_shift_violations(assignments: Dict[str, List[str]], rules: Dict[str, Any], users_config: Dict[str, Any]) -> List[Dict[str, Any]]:
-    detected_violations: List[Dict[str, Any]] = []; defined_attributes = rules.get("defined_attributes", DEFAULT_DEFINED_ATTRIBUTES[:])
-    if not (isinstance(defined_attributes, list) and all(isinstance(attr, str) for attr in defined_attributes)):
-        defined_attributes = DEFAULT_DEFINED_ATTRIBUTES[:]
-    max_consecutive = int(rules.get("max_consecutive_days", 9999)); employee_work_dates: Dict[str, List[date]] = defaultdict(list)
-    sorted_assignment_dates = sorted(assignments.keys())
-    for date_iso_str in sorted_assignment_dates:
-        try:
-            current_date_obj = date.fromisoformat(date_iso_str)
-            for emp_name in assignments[date_iso_str]: employee_work_dates[emp_name].append(current_date_obj)
-        except ValueError: print(f"Warning: Invalid date format '{date_iso_str}' in assignments for rule check."); continue
-    for emp_name, work_dates in employee_work_dates.items():
-        if not work_dates: continue; work_dates.sort(); consecutive_run = 0
-        if work_dates:
-            consecutive_run = 1
-            for i in range(1, len(work_dates)):
-                if work_dates[i] == work_dates[i-1] + timedelta(days=1): consecutive_run += 1
-                else:
-                    if consecutive_run > max_consecutive:
-                        last_day_of_run = work_dates[i-1]
-                        detected_violations.append({"date": last_day_of_run.isoformat(), "rule_type": "max_consecutive_days", "employee": emp_name, "description": f"{emp_name}さんは{consecutive_run}連勤です (最大{max_consecutive}日)。超過最終日: {last_day_of_run.isoformat()}", "details": {"current_consecutive": consecutive_run, "max_allowed": max_consecutive, "employee": emp_name, "offending_end_date": last_day_of_run.isoformat()}})
-                    consecutive_run = 1
-            if consecutive_run > max_consecutive:
-                last_day_of_run = work_dates[-1]
-                detected_violations.append({"date": last_day_of_run.isoformat(), "rule_type": "max_consecutive_days", "employee": emp_name, "description": f"{emp_name}さんは{consecutive_run}連勤です (最大{max_consecutive}日)。超過最終日: {last_day_of_run.isoformat()}", "details": {"current_consecutive": consecutive_run, "max_allowed": max_consecutive, "employee": emp_name, "offending_end_date": last_day_of_run.isoformat()}})
-    min_staff = int(rules.get("min_staff_per_day", 0))
-    for target_date_iso_str, assigned_emps in assignments.items():
-        current_staff_count = len(assigned_emps)
-        if current_staff_count < min_staff: detected_violations.append({"date": target_date_iso_str, "rule_type": "min_staff_per_day", "description": f"{target_date_iso_str}は最低{min_staff}人必要ですが、現在{current_staff_count}人です", "details": {"current_staff": current_staff_count, "min_required": min_staff, "date": target_date_iso_str}})
-    forbidden_pairs_list = rules.get("forbidden_pairs", [])
-    for target_date_iso_str, assigned_emps in assignments.items():
-        assigned_emps_set = set(assigned_emps)
-        for pair in forbidden_pairs_list:
-            if len(pair) >= 2 and pair[0] in assigned_emps_set and pair[1] in assigned_emps_set: detected_violations.append({"date": target_date_iso_str, "rule_type": "forbidden_pair", "employees": pair, "description": f"{pair[0]}さんと{pair[1]}さんは{target_date_iso_str}に同時勤務が禁止されています", "details": {"pair": pair, "date": target_date_iso_str}})
-    required_pairs_list = rules.get("required_pairs", [])
-    for target_date_iso_str, assigned_emps in assignments.items():
-        assigned_emps_set = set(assigned_emps)
-        for pair in required_pairs_list:
-            if len(pair) >= 2:
-                empA, empB = pair[0], pair[1]; empA_present = empA in assigned_emps_set; empB_present = empB in assigned_emps_set
-                if empA_present != empB_present:
-                    missing_member = empB if empA_present else empA; present_member = empA if empA_present else empB
-                    detected_violations.append({"date": target_date_iso_str, "rule_type": "required_pair", "employees": pair, "description": f"{pair[0]}さんと{pair[1]}さんは{target_date_iso_str}にペアでの勤務が必要です ({missing_member}さんがいません)", "details": {"pair": pair, "present_member": present_member, "missing_member": missing_member, "date": target_date_iso_str}})
-    employee_attributes_map = rules.get("employee_attributes", {}); required_attributes_map = rules.get("required_attributes", {})
-    for target_date_iso_str, assigned_emps in assignments.items():
-        daily_attribute_counts: Dict[str, int] = defaultdict(int)
-        for emp_name in assigned_emps:
-            emp_attrs_raw = employee_attributes_map.get(emp_name, []); emp_attrs_list = [emp_attrs_raw] if isinstance(emp_attrs_raw, str) else emp_attrs_raw
-            for attr in emp_attrs_list:
-                if attr in defined_attributes: daily_attribute_counts[attr] += 1
-        for req_attr_name, req_count_any in required_attributes_map.items():
-            req_count = int(req_count_any); current_attr_count = daily_attribute_counts.get(req_attr_name, 0)
-            if current_attr_count < req_count: detected_violations.append({"date": target_date_iso_str, "rule_type": "required_attribute_count", "attribute": req_attr_name, "description": f"{target_date_iso_str}には属性'{req_attr_name}'が最低{req_count}人必要ですが、現在{current_attr_count}人です", "details": {"current_count": current_attr_count, "required_count": req_count, "attribute": req_attr_name, "date": target_date_iso_str}})
-
-    # 専門予定のチェック
-    # Ensure 'specialized_requirements' key exists and is a dict, even if it's empty
-    specialized_requirements = rules.get("specialized_requirements", {})
-    if not isinstance(specialized_requirements, dict): # Should not happen if load_rules is correct
-        specialized_requirements = {}
-
-    if specialized_requirements:
-        all_events = load_events() # 全イベントをロード
-        events_by_date: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
-        for event in all_events:
-            event_date_str = event.get("date")
-            if event_date_str: # Ensure date exists
-                events_by_date[event_date_str].append(event)
-
-        for target_date_iso_str, assigned_emps_on_day in assignments.items():
-            # その日のイベントを取得
-            day_events = events_by_date.get(target_date_iso_str, [])
-
-            for event_category_key, required_staff_list in specialized_requirements.items():
-                # event_category_key は "mummy", "tattoo" など
-                # required_staff_list は ["sara", "hitomi"] など
-
-                if not required_staff_list: # Skip if no staff are required for this category
-                    continue
-
-                # その日に専門予定カテゴリのイベントがあるかチェック
-                category_event_exists_on_day = any(
-                    ev.get("category") == event_category_key for ev in day_events
-                )
-
-                if category_event_exists_on_day:
-                    # 必須担当者が割り当てられているかチェック
-                    is_required_staff_assigned = any(
-                        emp in assigned_emps_on_day for emp in required_staff_list
-                    )
-
-                    if not is_required_staff_assigned:
-                        # 警告メッセージの担当者リスト部分を作成
-                        required_staff_str = "または".join(required_staff_list)
-                        # カテゴリ表示名 (実際のアプリケーションでは、キーから表示名へのマッピングが望ましい)
-                        # 例: category_display_names = {"mummy": "マミー系", "tattoo": "タトゥー"}
-                        # category_display_name = category_display_names.get(event_category_key, event_category_key)
-                        category_display_name = event_category_key # For now, use key
-
-                        description = f"{category_display_name}の予定がある日({target_date_iso_str})に{required_staff_str}が割り当てられていません"
-                        detected_violations.append({
-                            "date": target_date_iso_str,
-                            "rule_type": "specialized_requirement_missing",
-                            "category": event_category_key,
-                            "description": description,
-                            "details": {
-                                "required_staff": required_staff_list,
-                                "assigned_staff": assigned_emps_on_day,
-                                "category": event_category_key,
-                                "date": target_date_iso_str
-                            }
-                        })
-    return detected_violations
+    """Return every rule violation of ``assignments`` (``{"YYYY-MM-DD": [employee, ...]}``).
+
+    Violations are reported rule by rule: consecutive work days, minimum
+    staff, forbidden pairs, required pairs, required attributes and
+    specialized requirements. The rules are evaluated on per-employee day
+    bitmasks, see :class:`app.calendario.violations.CompiledShiftRules`.
+    """
+    from .violations import CompiledShiftRules
+    return CompiledShiftRules(rules).evaluate(assignments)
 
 # --- New function for Step 1 of this subtask ---
 def calculate_consecutive_work_days_for_all(
     assignments: Dict[str, List[str]],
-    target_month_start: date
+    target_month_start: date,
+    streaks_before: Optional[Dict[str, int]] = None,
 ) -> Dict[str, Dict[str, int]]:
+    """Return ``{employee: {"YYYY-MM-DD": n}}`` for the days of the target month.
+
+    The assignments are walked once in date order for all employees.
+    ``streaks_before`` holds the consecutive days each employee had worked
+    up to the day before the earliest date in ``assignments`` (see
+    :func:`streaks_as_of`); without it runs start inside ``assignments``.
+    """
     all_consecutive_info: Dict[str, Dict[str, int]] = defaultdict(dict)
-    
-    year = target_month_start.year
-    month = target_month_start.month
-    _, days_in_month = calendar.monthrange(year, month)
-    target_month_end = date(year, month, days_in_month)
-
-    all_employees_in_assignments: Set[str] = set()
-    for emp_list in assignments.values():
-        for emp_name in emp_list:
-            all_employees_in_assignments.add(emp_name)
-
-    for employee in all_employees_in_assignments:
-        employee_work_dates: List[date] = []
-        # Collect all dates this employee worked, across all provided assignments
-        # This needs to include dates *before* the target_month_start to correctly calculate
-        # consecutive days that roll into the target_month.
-        # The 'assignments' dict should ideally contain data for at least one month prior if possible.
-        for date_iso_str, emps_on_day in assignments.items():
-            if employee in emps_on_day:
-                try:
-                    employee_work_dates.append(date.fromisoformat(date_iso_str))
-                except ValueError:
-                    # Log or handle malformed date string in assignments
-                    print(f"Warning: Malformed date string '{date_iso_str}' in assignments for employee {employee}.")
-                    continue
-        
-        if not employee_work_dates:
-            continue
-
-        employee_work_dates.sort() # Crucial for consecutive day calculation
-
-        consecutive_days_count = 0
-        for i, current_work_date in enumerate(employee_work_dates):
-            if i == 0 or current_work_date != (employee_work_dates[i-1] + timedelta(days=1)):
-                consecutive_days_count = 1 # Reset or start count
-            else:
-                consecutive_days_count += 1 # Increment consecutive days
-            
-            # Store the count if the date falls within the target month
-            if target_month_start <= current_work_date <= target_month_end:
+    _, days_in_month = calendar.monthrange(target_month_start.year, target_month_start.month)
+    target_month_end = date(target_month_start.year, target_month_start.month, days_in_month)
+
+    worked_days: List[Tuple[date, List[str]]] = []
+    for date_iso_str in sorted(assignments):
+        try: worked_days.append((date.fromisoformat(date_iso_str), assignments[date_iso_str]))
+        except ValueError: print(f"Warning: Malformed date string '{date_iso_str}' in assignments."); continue
+    as_of = worked_days[0][0] - timedelta(days=1) if worked_days and streaks_before else None
+    for current_work_date, streaks in _iter_streaks(worked_days, streaks_before, as_of):
+        # Store the count if the date falls within the target month
+        if target_month_start <= current_work_date <= target_month_end:
+            for employee, consecutive_days_count in streaks.items():
                 all_consecutive_info[employee][current_work_date.isoformat()] = consecutive_days_count
-                
-    return dict(all_consecutive_info) # Convert defaultdict to dict for return if preferred
+    return dict(all_consecutive_info)
 
 def another_initials_filter_for_japanese_names(name):
     if not name:
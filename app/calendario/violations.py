@@ -0,0 +1,427 @@
+"""Incremental shift rule checks for the shift manager.
+
+:class:`ShiftViolationEngine` evaluates the same rules as
+:func:`app.calendario.utils.get_shift_violations` but keeps its state so
+a single change (an employee added to or removed from a day) only
+re-evaluates the rule instances that involve that employee on that day
+and the consecutive-work run around it.
+
+Engines are kept per browser session in a small in-process registry.
+With several worker processes a request may reach a worker that does not
+know the session; the client then simply sends a full check again.
+"""
+
+from collections import OrderedDict
+from datetime import date, timedelta
+import threading
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import utils
+
+# Order in which get_shift_violations reports the rule types
+RULE_ORDER = {
+    "max_consecutive_days": 0,
+    "min_staff_per_day": 1,
+    "forbidden_pair": 2,
+    "required_pair": 3,
+    "required_attribute_count": 4,
+    "specialized_requirement_missing": 5,
+}
+
+# A rule instance checked for one day, e.g. ("forbidden_pair", 2)
+_Instance = Tuple[str, Any]
+
+MAX_SESSIONS = 64
+
+
+def _bits(mask: int) -> Iterator[int]:
+    """Yield the positions of the set bits of ``mask`` in ascending order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _runs(mask: int) -> Iterator[Tuple[int, int]]:
+    """Yield ``(start, length)`` of each run of consecutive set bits."""
+    while mask:
+        start = (mask & -mask).bit_length() - 1
+        shifted = mask >> start
+        length = (shifted ^ (shifted + 1)).bit_length() - 1
+        yield start, length
+        mask &= ~(((1 << length) - 1) << start)
+
+
+def _add_row(planes: List[int], row: int) -> None:
+    """Add ``row`` (one bit per day) to the bit-sliced per-day counters ``planes``."""
+    carry = row
+    for k in range(len(planes)):
+        if not carry: return
+        planes[k], carry = planes[k] ^ carry, planes[k] & carry
+    if carry: planes.append(carry)
+
+
+def _below(planes: List[int], required: int, all_days: int) -> int:
+    """Return the days whose bit-sliced counter is smaller than ``required``."""
+    greater = 0; equal = all_days
+    for k in range(max(len(planes), required.bit_length()) - 1, -1, -1):
+        plane = planes[k] if k < len(planes) else 0
+        if (required >> k) & 1: equal &= plane
+        else: greater |= equal & plane; equal &= ~plane
+    return all_days & ~(greater | equal)
+
+
+class CompiledShiftRules:
+    """Shift rules prepared for evaluating many schedules.
+
+    :meth:`evaluate` encodes a schedule as one integer bitmask per employee
+    with a bit per day, so each rule is a few bitwise operations over whole
+    rows: a forbidden pair is ``row_a & row_b``, a required pair
+    ``row_a ^ row_b`` and consecutive runs are runs of set bits.
+    """
+
+    def __init__(self, rules: Dict[str, Any]) -> None:
+        self.rules = rules
+        defined_attributes = rules.get("defined_attributes", utils.DEFAULT_DEFINED_ATTRIBUTES[:])
+        if not (isinstance(defined_attributes, list) and all(isinstance(attr, str) for attr in defined_attributes)):
+            defined_attributes = utils.DEFAULT_DEFINED_ATTRIBUTES[:]
+        self.max_consecutive = int(rules.get("max_consecutive_days", 9999))
+        self.min_staff = int(rules.get("min_staff_per_day", 0))
+        self.forbidden_pairs = rules.get("forbidden_pairs", [])
+        self.required_pairs = rules.get("required_pairs", [])
+        self.required_attributes = {name: int(count) for name, count in rules.get("required_attributes", {}).items()}
+        self.attribute_order = {name: i for i, name in enumerate(self.required_attributes)}
+        self.employee_attributes: Dict[str, List[str]] = {}
+        for emp, attrs in rules.get("employee_attributes", {}).items():
+            attrs_list = [attrs] if isinstance(attrs, str) else attrs
+            self.employee_attributes[emp] = [a for a in attrs_list if a in defined_attributes]
+        specialized = rules.get("specialized_requirements", {})
+        self.specialized = {cat: staff for cat, staff in specialized.items() if staff} if isinstance(specialized, dict) else {}
+        self.specialized_order = {cat: i for i, cat in enumerate(self.specialized)}
+
+        # Rule instances each employee takes part in
+        self.instances_of: Dict[str, List[_Instance]] = {}
+        for rule_type, pairs in (("forbidden_pair", self.forbidden_pairs), ("required_pair", self.required_pairs)):
+            for i, pair in enumerate(pairs):
+                if len(pair) < 2: continue
+                for emp in set(pair[:2]): self.instances_of.setdefault(emp, []).append((rule_type, i))
+        for emp, attrs in self.employee_attributes.items():
+            for attr in dict.fromkeys(attrs):
+                if attr in self.required_attributes:
+                    self.instances_of.setdefault(emp, []).append(("required_attribute_count", attr))
+
+    def _encode(self, assignments: Dict[str, List[str]]) -> Dict[str, int]:
+        rows: Dict[str, int] = {}
+        for i, emps in enumerate(assignments.values()):
+            for emp in emps: rows[emp] = rows.get(emp, 0) | (1 << i)
+        return rows
+
+    def _calendar_rows(self, assignments: Dict[str, List[str]]) -> Tuple[int, Dict[str, int]]:
+        """Rows over consecutive calendar days, starting at the returned ordinal."""
+        dated: List[Tuple[int, List[str]]] = []
+        for date_iso_str in sorted(assignments):
+            try: dated.append((date.fromisoformat(date_iso_str).toordinal(), assignments[date_iso_str]))
+            except ValueError: print(f"Warning: Invalid date format '{date_iso_str}' in assignments for rule check."); continue
+        base = dated[0][0] if dated else 0
+        rows: Dict[str, int] = {}
+        for ordinal, emps in dated:
+            for emp in emps: rows[emp] = rows.get(emp, 0) | (1 << (ordinal - base))
+        return base, rows
+
+    def _event_days(self, assignments: Dict[str, List[str]]) -> Dict[str, int]:
+        """Return ``category -> days with such an event`` for specialized requirements."""
+        if not self.specialized: return {}
+        positions: Dict[str, int] = {}
+        for i, date_iso_str in enumerate(assignments):
+            try: day_iso = date.fromisoformat(date_iso_str).isoformat()
+            except ValueError: continue
+            positions[day_iso] = positions.get(day_iso, 0) | (1 << i)
+        if not positions: return {}
+        index = utils._events_index(); masks: Dict[str, int] = {}
+        lo, hi = index._bounds(index.dates, date.fromisoformat(min(positions)), date.fromisoformat(max(positions)))
+        for day_iso, event in zip(index.dates[lo:hi], index.events[lo:hi]):
+            category = event.get("category")
+            if category in self.specialized and day_iso in positions: masks[category] = masks.get(category, 0) | positions[day_iso]
+        return masks
+
+    def _pair_masks(self, rows: Dict[str, int]) -> Iterator[Tuple[str, int, List[str], int]]:
+        for i, pair in enumerate(self.forbidden_pairs):
+            if len(pair) >= 2: yield "forbidden_pair", i, pair, rows.get(pair[0], 0) & rows.get(pair[1], 0)
+        for i, pair in enumerate(self.required_pairs):
+            if len(pair) >= 2: yield "required_pair", i, pair, rows.get(pair[0], 0) ^ rows.get(pair[1], 0)
+
+    def _attribute_planes(self, rows: Dict[str, int]) -> Dict[str, List[int]]:
+        planes: Dict[str, List[int]] = {attr: [] for attr in self.required_attributes}
+        for emp, row in rows.items():
+            for attr in self.employee_attributes.get(emp, []):
+                if attr in planes: _add_row(planes[attr], row)
+        return planes
+
+    def evaluate(self, assignments: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """Return the violations of ``assignments`` (``{"YYYY-MM-DD": [employee, ...]}``).
+
+        The result is the same list :func:`app.calendario.utils.get_shift_violations`
+        reports, in the same order.
+        """
+        detected: List[Dict[str, Any]] = []
+        base, calendar_rows = self._calendar_rows(assignments)
+        for emp, row in calendar_rows.items():
+            for start, length in _runs(row):
+                if length > self.max_consecutive:
+                    detected.append(utils._consecutive_violation(emp, length, self.max_consecutive, date.fromordinal(base + start + length - 1)))
+
+        days = list(assignments); all_days = (1 << len(days)) - 1
+        for day_iso in days:
+            if len(assignments[day_iso]) < self.min_staff: detected.append(utils._min_staff_violation(day_iso, len(assignments[day_iso]), self.min_staff))
+
+        rows = self._encode(assignments)
+        for rule_type in ("forbidden_pair", "required_pair"):
+            hits = sorted((i, rule_index, pair) for rt, rule_index, pair, mask in self._pair_masks(rows) if rt == rule_type for i in _bits(mask))
+            for i, _, pair in hits:
+                if rule_type == "forbidden_pair": detected.append(utils._forbidden_pair_violation(days[i], pair))
+                else: detected.append(utils._required_pair_violation(days[i], pair, bool((rows.get(pair[0], 0) >> i) & 1)))
+
+        hits_attr = []
+        for attr_index, (attr, planes) in enumerate(self._attribute_planes(rows).items()):
+            if self.required_attributes[attr] <= 0: continue
+            for i in _bits(_below(planes, self.required_attributes[attr], all_days)):
+                count = sum(((plane >> i) & 1) << k for k, plane in enumerate(planes))
+                hits_attr.append((i, attr_index, attr, count))
+        for i, _, attr, count in sorted(hits_attr):
+            detected.append(utils._attribute_violation(days[i], attr, count, self.required_attributes[attr]))
+
+        hits_spec = []
+        for category, event_days in self._event_days(assignments).items():
+            staff_days = 0
+            for emp in self.specialized[category]: staff_days |= rows.get(emp, 0)
+            for i in _bits(event_days & ~staff_days): hits_spec.append((i, self.specialized_order[category], category))
+        for i, _, category in sorted(hits_spec):
+            detected.append(utils._specialized_violation(days[i], category, self.specialized[category], assignments[days[i]]))
+        return detected
+
+    def count(self, assignments: Dict[str, List[str]]) -> int:
+        """Return the number of violations of ``assignments`` without describing them."""
+        total = 0
+        _, calendar_rows = self._calendar_rows(assignments)
+        for row in calendar_rows.values():
+            total += sum(1 for _, length in _runs(row) if length > self.max_consecutive)
+        total += sum(1 for emps in assignments.values() if len(emps) < self.min_staff)
+        rows = self._encode(assignments); all_days = (1 << len(assignments)) - 1
+        total += sum(bin(mask).count("1") for _, _, _, mask in self._pair_masks(rows))
+        for attr, planes in self._attribute_planes(rows).items():
+            if self.required_attributes[attr] > 0: total += bin(_below(planes, self.required_attributes[attr], all_days)).count("1")
+        for category, event_days in self._event_days(assignments).items():
+            staff_days = 0
+            for emp in self.specialized[category]: staff_days |= rows.get(emp, 0)
+            total += bin(event_days & ~staff_days).count("1")
+        return total
+
+
+class ShiftViolationEngine(CompiledShiftRules):
+    """Violations and consecutive-day counts of one shift schedule."""
+
+    def __init__(
+        self,
+        assignments: Dict[str, List[str]],
+        rules: Dict[str, Any],
+        target_month_start: date,
+        streaks_before: Optional[Dict[str, int]] = None,
+    ) -> None:
+        super().__init__(rules)
+        self.events_index = utils._events_index()
+        self.target_month_start = target_month_start
+        self.version = 0
+        self.lock = threading.Lock()
+
+        self.days: Dict[str, List[str]] = {d: list(emps) for d, emps in assignments.items()}
+        self.work: Dict[str, Set[date]] = {}
+        first_day: Optional[date] = None
+        for day_iso, emps in self.days.items():
+            try: day = date.fromisoformat(day_iso)
+            except ValueError: continue
+            first_day = day if first_day is None else min(first_day, day)
+            for emp in emps: self.work.setdefault(emp, set()).add(day)
+        # Runs starting on the first assignment date continue ``streaks_before``
+        self.streaks_before = streaks_before or {}
+        self.streak_day = first_day - timedelta(days=1) if first_day else None
+
+        # id -> (sort key, violation)
+        self.violations: Dict[str, Tuple[Tuple[Any, ...], Dict[str, Any]]] = {}
+        # employee -> {"YYYY-MM-DD": n-th consecutive day} within the target month
+        self.consecutive: Dict[str, Dict[str, int]] = {}
+        # employee -> ids of their max_consecutive_days violations
+        self.run_violations: Dict[str, Set[str]] = {}
+        for day_iso in self.days:
+            for instance in self._all_instances():
+                self._evaluate(day_iso, instance)
+        for emp, dates in self.work.items():
+            if dates: self._evaluate_runs(emp, min(dates), max(dates))
+
+    def _all_instances(self) -> Iterable[_Instance]:
+        yield ("min_staff_per_day", None)
+        for i, pair in enumerate(self.forbidden_pairs):
+            if len(pair) >= 2: yield ("forbidden_pair", i)
+        for i, pair in enumerate(self.required_pairs):
+            if len(pair) >= 2: yield ("required_pair", i)
+        for attr in self.required_attributes: yield ("required_attribute_count", attr)
+        for category in self.specialized: yield ("specialized_requirement_missing", category)
+
+    def _day_instances(self, employee: str) -> Iterable[_Instance]:
+        """Rule instances whose result on a day can change with ``employee``."""
+        yield ("min_staff_per_day", None)
+        yield from self.instances_of.get(employee, [])
+        # The violation lists the assigned staff, so it changes with anyone
+        for category in self.specialized: yield ("specialized_requirement_missing", category)
+
+    @staticmethod
+    def _instance_id(day_iso: str, instance: _Instance) -> str:
+        rule_type, key = instance
+        return f"{rule_type}|{day_iso}" if key is None else f"{rule_type}|{day_iso}|{key}"
+
+    def _instance_order(self, instance: _Instance) -> int:
+        rule_type, key = instance
+        if rule_type == "required_attribute_count": return self.attribute_order[key]
+        if rule_type == "specialized_requirement_missing": return self.specialized_order[key]
+        return key or 0
+
+    def _check(self, day_iso: str, instance: _Instance) -> Optional[Dict[str, Any]]:
+        rule_type, key = instance
+        assigned = self.days.get(day_iso, [])
+        if rule_type == "min_staff_per_day":
+            if len(assigned) < self.min_staff: return utils._min_staff_violation(day_iso, len(assigned), self.min_staff)
+        elif rule_type == "forbidden_pair":
+            pair = self.forbidden_pairs[key]
+            if pair[0] in assigned and pair[1] in assigned: return utils._forbidden_pair_violation(day_iso, pair)
+        elif rule_type == "required_pair":
+            pair = self.required_pairs[key]; first_present = pair[0] in assigned
+            if first_present != (pair[1] in assigned): return utils._required_pair_violation(day_iso, pair, first_present)
+        elif rule_type == "required_attribute_count":
+            count = sum(self.employee_attributes.get(emp, []).count(key) for emp in assigned)
+            if count < self.required_attributes[key]: return utils._attribute_violation(day_iso, key, count, self.required_attributes[key])
+        elif rule_type == "specialized_requirement_missing":
+            try: day = date.fromisoformat(day_iso)
+            except ValueError: return None
+            staff = self.specialized[key]
+            if any(ev.get("category") == key for ev in self.events_index.between(day, day)) and not any(emp in assigned for emp in staff):
+                return utils._specialized_violation(day_iso, key, staff, list(assigned))
+        return None
+
+    def _evaluate(self, day_iso: str, instance: _Instance) -> None:
+        violation_id = self._instance_id(day_iso, instance)
+        violation = self._check(day_iso, instance)
+        if violation is None:
+            self.violations.pop(violation_id, None)
+        else:
+            violation["id"] = violation_id
+            sort_key = (RULE_ORDER[instance[0]], day_iso, self._instance_order(instance))
+            self.violations[violation_id] = (sort_key, violation)
+
+    def _evaluate_runs(self, employee: str, first: date, last: date) -> None:
+        """Re-evaluate the consecutive runs of ``employee`` between ``first`` and ``last``.
+
+        ``first`` and ``last`` must not be inside a run that extends past them.
+        """
+        dates = self.work.get(employee, set())
+        month_end = (self.target_month_start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        counts = self.consecutive.setdefault(employee, {})
+        run_ids = self.run_violations.setdefault(employee, set())
+        for violation_id in [v for v in run_ids if first.isoformat() <= self.violations[v][1]["date"] <= last.isoformat()]:
+            run_ids.discard(violation_id); del self.violations[violation_id]
+        run = 0; day = first
+        carried = self.streaks_before.get(employee, 0) if first - timedelta(days=1) == self.streak_day else 0
+        while day <= last + timedelta(days=1):
+            if day <= last and day in dates:
+                run += 1
+                if self.target_month_start <= day <= month_end: counts[day.isoformat()] = carried + run
+            else:
+                if run > self.max_consecutive:
+                    end = day - timedelta(days=1)
+                    violation = utils._consecutive_violation(employee, run, self.max_consecutive, end)
+                    violation["id"] = f"max_consecutive_days|{end.isoformat()}|{employee}"
+                    self.violations[violation["id"]] = ((RULE_ORDER["max_consecutive_days"], end.isoformat(), employee), violation)
+                    run_ids.add(violation["id"])
+                run = 0; carried = 0
+                if day <= last: counts.pop(day.isoformat(), None)
+            day += timedelta(days=1)
+        if not counts: self.consecutive.pop(employee, None)
+
+    def all_violations(self) -> List[Dict[str, Any]]:
+        """Return every current violation ordered by rule type, date and rule."""
+        return [v for _, v in sorted(self.violations.values(), key=lambda item: item[0])]
+
+    def apply(self, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply ``changes`` and return what changed.
+
+        Each change is ``{"date": "YYYY-MM-DD", "employee": name, "op": "add" | "remove"}``.
+        The result holds ``added`` (new or modified violations), ``removed``
+        (ids of violations that no longer apply) and ``consecutive_work_info``
+        with the updated counts, ``None`` marking a count that disappeared.
+        """
+        before = {vid: v for vid, (_, v) in self.violations.items()}
+        touched_counts: Dict[str, Set[str]] = {}
+        for change in changes:
+            day_iso = change.get("date"); employee = change.get("employee"); op = change.get("op")
+            if not isinstance(day_iso, str) or not isinstance(employee, str) or not employee or op not in ("add", "remove"):
+                raise ValueError(f"invalid change: {change!r}")
+            assigned = self.days.setdefault(day_iso, [])
+            if op == "add":
+                if employee in assigned: continue
+                assigned.append(employee)
+            else:
+                if employee not in assigned: continue
+                assigned.remove(employee)
+            for instance in self._day_instances(employee):
+                self._evaluate(day_iso, instance)
+            try: day = date.fromisoformat(day_iso)
+            except ValueError: continue
+            dates = self.work.setdefault(employee, set())
+            if op == "add": dates.add(day)
+            else: dates.discard(day)
+            first = last = day
+            while first - timedelta(days=1) in dates: first -= timedelta(days=1)
+            while last + timedelta(days=1) in dates: last += timedelta(days=1)
+            self._evaluate_runs(employee, first, last)
+            touched = touched_counts.setdefault(employee, set())
+            d = first
+            while d <= last: touched.add(d.isoformat()); d += timedelta(days=1)
+        self.version += 1
+
+        after = {vid: v for vid, (_, v) in self.violations.items()}
+        added = [self.violations[vid] for vid, v in after.items() if before.get(vid) != v]
+        consecutive_changes = {
+            emp: {d: self.consecutive.get(emp, {}).get(d) for d in sorted(days)}
+            for emp, days in touched_counts.items()
+        }
+        return {
+            "added": [v for _, v in sorted(added, key=lambda item: item[0])],
+            "removed": sorted(vid for vid in before if vid not in after),
+            "consecutive_work_info": consecutive_changes,
+        }
+
+    def is_current(self) -> bool:
+        """Return False when the rules or events changed since the engine was built."""
+        rules, _ = utils.load_rules()
+        return rules == self.rules and utils._events_index() is self.events_index
+
+
+_sessions: "OrderedDict[str, Tuple[str, ShiftViolationEngine]]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def open_session(owner: str, engine: ShiftViolationEngine) -> str:
+    """Register ``engine`` for ``owner`` and return its session token."""
+    token = uuid.uuid4().hex
+    with _sessions_lock:
+        _sessions[token] = (owner, engine)
+        while len(_sessions) > MAX_SESSIONS: _sessions.popitem(last=False)
+    return token
+
+
+def get_session(token: str, owner: str) -> Optional[ShiftViolationEngine]:
+    """Return the engine of ``token`` if it belongs to ``owner``."""
+    with _sessions_lock:
+        entry = _sessions.get(token)
+        if entry is None or entry[0] != owner: return None
+        _sessions.move_to_end(token)
+        return entry[1]
@@ -14,6 +14,7 @@ from flask import (
 from app.utils import save_uploaded_file, send_email
 import config
 
+from app import pagination
 from . import bp
 from .forms import AddCorsoForm, FeedbackForm
 from app.calendario import utils as calendario_utils
@@ -34,8 +35,9 @@ def index():
 
     user = session.get("user")
     include_expired = user.get("role") == "admin"
-    posts = utils.filter_posts(include_expired=include_expired)
-    return render_template("corso_list.html", posts=posts, user=user)
+    # Posts moved to the cold archive are listed on the archive page
+    page = pagination.newest(utils.CORSO_PATH, where=None if include_expired else lambda p: not utils.is_expired(p))
+    return render_template("corso_list.html", posts=page.items, page=page, user=user)
 
 
 @bp.route("/add", methods=["GET", "POST"])
@@ -89,8 +91,7 @@ def detail(post_id: int):
     """Show post detail."""
 
     user = session.get("user")
-    posts = utils.load_posts()
-    post = next((p for p in posts if p.get("id") == post_id), None)
+    post = utils.get_post(post_id)
     if not post:
         flash("該当IDがありません")
         return redirect(url_for("corso.index"))
@@ -117,7 +118,7 @@ def download(filename: str):
     """Download an attached file if within valid period."""
 
     user = session.get("user")
-    posts = utils.load_posts()
+    posts = utils.all_posts()
     for p in posts:
         if p.get("filename") == filename:
             end_date = p.get("end_date")
@@ -1,14 +1,9 @@
 from datetime import date
-from typing import List
-
-try:  # pragma: no cover - optional dependency
-    from apscheduler.schedulers.background import BackgroundScheduler
-except Exception:  # pragma: no cover - optional dependency
-    BackgroundScheduler = None  # type: ignore
-
-scheduler = BackgroundScheduler() if BackgroundScheduler else None  # type: ignore
+import time
+from typing import List, Optional
 
 import config
+from app import reminders, scheduler
 from app.utils import send_email, get_admin_email
 from . import utils
 
@@ -20,66 +15,64 @@ def _notify(users: List[str], subject: str, body: str) -> None:
             send_email(subject, body, email)
 
 
-def daily_reminder(today: date = date.today()) -> None:
-    posts = utils.active_posts(include_expired=True)
-    for p in posts:
-        end = p.get("end_date")
-        if not end:
-            continue
-        try:
-            end_d = date.fromisoformat(end)
-        except Exception:
-            continue
-        if today <= end_d:
+OVERDUE_INTERVAL = 6 * 3600  # seconds between overdue reminders
+
+
+def daily_reminder(today: Optional[date] = None) -> None:
+    today = today or date.today()
+    for p in utils.open_feedback():
+        end_d, due_d = p["end_date"], p["due_date"]
+        if end_d is None or today <= end_d:
             continue
-        due = p.get("due_date")
-        overdue = False
-        if due:
-            try:
-                overdue = today > date.fromisoformat(due)
-            except Exception:
-                overdue = False
-        if overdue:
+        if due_d is not None and today > due_d:
             continue
-        pending = [u for u in config.USERS if u not in p.get("feedback", {})]
+        pending = utils.pending_users(p)
         if pending:
             _notify(pending, "Corso feedback reminder", f"Please submit feedback for '{p['title']}'")
 
 
-def overdue_reminder(today: date = date.today()) -> None:
-    posts = utils.active_posts(include_expired=True)
-    admin_email = get_admin_email()
-    changed = False
-    for p in posts:
-        due = p.get("due_date")
-        if not due:
-            continue
-        try:
-            due_d = date.fromisoformat(due)
-        except Exception:
+def schedule_overdue_reminders(today: date = None) -> int:
+    """Queue an overdue reminder for each corso past its due date that lacks feedback."""
+
+    today = today or date.today()
+    now = time.time()
+    count = 0
+    for p in utils.open_feedback():
+        due_d = p["due_date"]
+        if due_d is None or today <= due_d or not utils.pending_users(p):
             continue
-        if today <= due_d:
+        reminders.schedule(utils.OVERDUE_REMINDER, str(p["id"]), now, replace=False)
+        count += 1
+    return count
+
+
+def overdue_reminder(items, now) -> None:
+    """Send the due overdue reminders and queue the next ones while feedback is missing."""
+
+    admin_email = get_admin_email()
+    index = {str(p["id"]): p for p in utils.open_feedback()}
+    for key, due in items:
+        p = index.get(key)
+        if p is None:
             continue
-        pending = [u for u in config.USERS if u not in p.get("feedback", {})]
+        pending = utils.pending_users(p)
         if not pending:
             continue
         _notify(pending, "Corso feedback overdue", f"Feedback overdue for '{p['title']}'")
-        if not p.get("admin_notified") and admin_email:
+        if not p["admin_notified"] and admin_email:
             send_email(
                 "Corso feedback overdue",
                 f"Users pending for '{p['title']}'",
                 admin_email,
             )
-            p["admin_notified"] = True
-            changed = True
-    if changed:
-        utils.save_posts(posts)
+            utils.mark_admin_notified(p["id"])
+        next_due = due + OVERDUE_INTERVAL
+        while next_due <= now:
+            next_due += OVERDUE_INTERVAL
+        reminders.schedule(utils.OVERDUE_REMINDER, key, next_due)
 
 
-def start_scheduler() -> None:
-    if scheduler is None:
-        return
-    if not scheduler.get_jobs():
-        scheduler.add_job(lambda: daily_reminder(), "cron", hour=9)
-        scheduler.add_job(lambda: overdue_reminder(), "cron", hour="*/6")
-        scheduler.start()
+# Jobs run by the central scheduler (see app.scheduler)
+scheduler.register("corso.daily_reminder", lambda: daily_reminder(), hour=9)
+scheduler.register("corso.overdue_reminders", lambda: schedule_overdue_reminders(), hour=0)
+reminders.register(utils.OVERDUE_REMINDER, overdue_reminder)
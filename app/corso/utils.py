@@ -1,10 +1,10 @@
 """Utility functions for Corso posts."""
 
-import json
 from datetime import datetime, timedelta, date
 from pathlib import Path
 
 import config
+from app import reminders, search, storage, tiering
 
 # Allow only documents and images for attachments
 ALLOWED_EXTS = {
@@ -19,102 +19,191 @@ MAX_SIZE = 10 * 1024 * 1024
 
 CORSO_PATH = Path(getattr(config, "CORSO_FILE", "corso.json"))
 
+# Finished (archived) posts are moved to the cold archive, by creation month
+_archive = tiering.ColdArchive(
+    "corso", lambda: CORSO_PATH, lambda p: bool(p.get("archived")), tiering.month_of("timestamp")
+)
+
+# Keyword indexes of the live and the archived posts
+_search = search.SearchIndex.for_file("corso", lambda: CORSO_PATH, ("title", "body"))
+_cold_search = search.SearchIndex.for_archive("corso_archive", _archive, ("title", "body"), group="corso")
+
 
 def load_posts():
     """Load Corso posts from JSON file."""
 
-    if CORSO_PATH.exists():
-        with open(CORSO_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load_json(CORSO_PATH, [])
 
 
 def save_posts(posts):
     """Save posts list to JSON file."""
 
-    with open(CORSO_PATH, "w", encoding="utf-8") as f:
-        json.dump(posts, f, ensure_ascii=False, indent=2)
+    storage.save_json(CORSO_PATH, posts)
 
 
 def add_post(author, title, body, end_date=None, filename=None):
     """Add a new Corso post."""
 
-    posts = load_posts()
-    next_id = max((p.get("id", 0) for p in posts), default=0) + 1
-    due = None
-    if end_date:
-        try:
-            due = (end_date + timedelta(days=3)).isoformat()
-        except Exception:
-            pass
-    posts.append(
-        {
-            "id": next_id,
-            "author": author,
-            "title": title,
-            "body": body,
-            "end_date": end_date.isoformat() if hasattr(end_date, "isoformat") and end_date else end_date,
-            "due_date": due,
-            "filename": filename,
-            "timestamp": datetime.now().isoformat(timespec="seconds"),
-            "feedback": {},
-            "archived": False,
-            "admin_notified": False,
-        }
-    )
-    save_posts(posts)
+    with storage.locked(CORSO_PATH):
+        posts = load_posts()
+        next_id = _archive.next_id(posts)
+        due = None
+        if end_date:
+            try:
+                due = (end_date + timedelta(days=3)).isoformat()
+            except Exception:
+                pass
+        posts.append(
+            {
+                "id": next_id,
+                "author": author,
+                "title": title,
+                "body": body,
+                "end_date": end_date.isoformat() if hasattr(end_date, "isoformat") and end_date else end_date,
+                "due_date": due,
+                "filename": filename,
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "feedback": {},
+                "archived": False,
+                "admin_notified": False,
+            }
+        )
+        save_posts(posts)
 
 
 def delete_post(post_id):
     """Delete a Corso post by ID."""
 
-    posts = load_posts()
-    new_posts = [p for p in posts if p.get("id") != post_id]
-    if len(new_posts) == len(posts):
-        return False
-    save_posts(new_posts)
+    with storage.locked(CORSO_PATH):
+        posts = load_posts()
+        new_posts = [p for p in posts if p.get("id") != post_id]
+        if len(new_posts) < len(posts):
+            save_posts(new_posts)
+        elif not _archive.delete(post_id):
+            return False
+    reminders.resolve(OVERDUE_REMINDER, str(post_id))
     return True
 
 
 def add_feedback(post_id: int, username: str, body: str) -> bool:
     """Add feedback text for a corso."""
 
-    posts = load_posts()
-    for p in posts:
-        if p.get("id") == post_id:
-            fb = p.setdefault("feedback", {})
-            fb[username] = {
-                "body": body,
-                "timestamp": datetime.now().isoformat(timespec="seconds"),
-            }
-            save_posts(posts)
-            return True
-    return False
+    with storage.locked(CORSO_PATH):
+        posts = load_posts()
+        before = _feedback.stamp()
+        for p in posts:
+            if p.get("id") == post_id:
+                fb = p.setdefault("feedback", {})
+                fb[username] = {
+                    "body": body,
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                }
+                save_posts(posts)
+                _feedback.update(before, reminders.add_to("submitted", post_id, username))
+                record = _feedback.get().get(post_id)
+                if record is not None and not pending_users(record):
+                    reminders.resolve(OVERDUE_REMINDER, str(post_id))
+                return True
+        return False
 
 
 def finish_post(post_id: int) -> bool:
     """Mark corso as archived."""
 
-    posts = load_posts()
+    with storage.locked(CORSO_PATH):
+        posts = load_posts()
+        before = _feedback.stamp()
+        for p in posts:
+            if p.get("id") == post_id:
+                p["archived"] = True
+                save_posts(posts)
+                _feedback.update(before, reminders.drop(post_id))
+                reminders.resolve(OVERDUE_REMINDER, str(post_id))
+                return True
+        return False
+
+
+def mark_admin_notified(post_id: int) -> bool:
+    """Record that the admin was told about overdue feedback."""
+
+    with storage.locked(CORSO_PATH):
+        posts = load_posts()
+        for p in posts:
+            if p.get("id") == post_id:
+                p["admin_notified"] = True
+                save_posts(posts)
+                return True
+        return False
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _feedback_index(posts):
+    """Map the ID of every open corso to its dates and the users who gave feedback."""
+
+    index = {}
     for p in posts:
-        if p.get("id") == post_id:
-            p["archived"] = True
-            save_posts(posts)
-            return True
-    return False
+        if p.get("archived"):
+            continue
+        index[p.get("id")] = {
+            "id": p.get("id"),
+            "title": p.get("title"),
+            "end_date": _parse_date(p.get("end_date")),
+            "due_date": _parse_date(p.get("due_date")),
+            "submitted": set(p.get("feedback", {})),
+            "admin_notified": bool(p.get("admin_notified")),
+        }
+    return index
+
+
+_feedback = reminders.ReminderIndex(lambda: CORSO_PATH, _feedback_index)
+
+# Pending overdue reminders, keyed by corso ID
+OVERDUE_REMINDER = "corso.overdue"
+
+
+def open_feedback():
+    """Return the open corsi as records of :func:`_feedback_index`."""
+
+    return list(_feedback.get().values())
+
+
+def pending_users(record):
+    """Return the users who have not given feedback on the corso ``record``."""
+
+    return [u for u in config.USERS if u not in record["submitted"]]
 
 
 def active_posts(include_expired: bool = False):
     posts = load_posts()
-    return [p for p in posts if not p.get("archived") and (include_expired or not _is_expired(p))]
+    return [p for p in posts if not p.get("archived") and (include_expired or not is_expired(p))]
 
 
 def archived_posts():
-    posts = load_posts()
-    return [p for p in posts if p.get("archived")]
+    return [p for p in _archive.with_hot(load_posts()) if p.get("archived")]
+
+
+def all_posts():
+    """Return the live posts followed by the ones in the cold archive."""
+
+    return _archive.with_hot(load_posts())
 
 
-def _is_expired(post: dict) -> bool:
+def get_post(post_id):
+    """Return the post ``post_id``, live or archived, or ``None``."""
+
+    post = next((p for p in load_posts() if p.get("id") == post_id), None)
+    return post if post is not None else _archive.get(post_id)
+
+
+def is_expired(post: dict) -> bool:
+    """Return whether the ``end_date`` of ``post`` has passed."""
+
     end_date = post.get("end_date")
     if end_date:
         try:
@@ -127,17 +216,20 @@ def _is_expired(post: dict) -> bool:
 def filter_posts(author="", keyword="", include_expired=False):
     """Filter posts by author, keyword and expiration."""
 
-    posts = load_posts()
+    # Archived posts are only listed together with the expired ones
+    posts = all_posts() if include_expired else load_posts()
+    matched = None
+    if keyword:
+        matched = _search.matching_ids(keyword)
+        if include_expired:
+            matched |= _cold_search.matching_ids(keyword)
     results = []
     now = datetime.now()
     for p in posts:
         if author and p.get("author") != author:
             continue
-        if keyword:
-            title = p.get("title", "")
-            body = p.get("body", "")
-            if keyword.lower() not in (title + body).lower():
-                continue
+        if matched is not None and p.get("id") not in matched:
+            continue
         end_date = p.get("end_date")
         if not include_expired and end_date:
             try:
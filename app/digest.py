@@ -0,0 +1,163 @@
+"""Per-recipient digests merging bursts of notifications.
+
+While the digest timer runs (see :func:`start`), :func:`notify` does not
+send anything. It buffers one entry per recipient and channel in the
+outbox database instead. :func:`flush` merges the entries of each
+recipient, channel and subject once the oldest of them is ``WINDOW``
+seconds old. The merged message ("カレンダー更新 (12件)", listing the
+changes made between 10:00 and 10:05) then goes to :mod:`app.outbox` as
+a single job.
+
+Without the timer, as in the command line tools and tests,
+:func:`notify` sends every message immediately.
+"""
+
+from contextlib import closing
+from datetime import datetime
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import config
+
+from . import outbox
+from .utils import send_email
+
+WINDOW = 300.0  # seconds a digest collects notifications
+FLUSH_INTERVAL = 30.0  # seconds between checks for digests to send
+
+_timer: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def window() -> float:
+    return float(getattr(config, "NOTIFY_DIGEST_WINDOW", WINDOW))
+
+
+def _connect() -> sqlite3.Connection:
+    # Same database as the outbox, so a digest and its job change together
+    conn = outbox.connect()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS digest ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " channel TEXT NOT NULL,"
+        " recipient TEXT NOT NULL,"
+        " subject TEXT NOT NULL,"
+        " body TEXT NOT NULL,"
+        " created REAL NOT NULL)"
+    )
+    return conn
+
+
+def running() -> bool:
+    """Return True when this process buffers notifications into digests."""
+
+    return _timer is not None and _timer.is_alive() and not _stop.is_set()
+
+
+def add(subject: str, body: str, emails: Iterable[str], now: Optional[float] = None) -> None:
+    """Buffer a notification for ``emails`` and the configured push channels."""
+
+    now = time.time() if now is None else now
+    entries: List[Tuple[str, str]] = [("email", email) for email in emails]
+    # LINE Notify and Pushbullet have one token each, so they get one digest
+    if getattr(config, "LINE_NOTIFY_TOKEN", ""):
+        entries.append(("line_notify", ""))
+    if getattr(config, "PUSHBULLET_TOKEN", ""):
+        entries.append(("pushbullet", ""))
+    with closing(_connect()) as conn:
+        conn.executemany(
+            "INSERT INTO digest (channel, recipient, subject, body, created) VALUES (?, ?, ?, ?, ?)",
+            [(channel, recipient, subject, body, now) for channel, recipient in entries],
+        )
+
+
+def notify(subject: str, body: str, emails: Iterable[str]) -> None:
+    """Send ``subject``/``body`` to ``emails``, merged into digests while the timer runs."""
+
+    if running():
+        add(subject, body, emails)
+        return
+    for email in emails:
+        send_email(subject, body, email)
+
+
+def compose(subject: str, entries: List[Tuple[float, str]]) -> Tuple[str, str]:
+    """Return the subject and body merging ``entries`` (``(created, body)``)."""
+
+    if len(entries) == 1:
+        return subject, entries[0][1]
+    first = datetime.fromtimestamp(entries[0][0]).strftime("%H:%M")
+    last = datetime.fromtimestamp(entries[-1][0]).strftime("%H:%M")
+    header = f"{first}〜{last} に{subject}が{len(entries)}件ありました。"
+    return f"{subject} ({len(entries)}件)", "\n".join([header, ""] + [f"- {body}" for _, body in entries])
+
+
+def flush(now: Optional[float] = None, force: bool = False) -> int:
+    """Send the digests whose oldest entry is ``WINDOW`` old, or all with ``force``.
+
+    Returns the number of messages queued.
+    """
+
+    now = time.time() if now is None else now
+    cutoff = float("inf") if force else now - window()
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            due = conn.execute(
+                "SELECT channel, recipient, subject FROM digest"
+                " GROUP BY channel, recipient, subject HAVING MIN(created) <= ?",
+                (cutoff,),
+            ).fetchall()
+            messages = []
+            for channel, recipient, subject in due:
+                rows = conn.execute(
+                    "SELECT id, created, body FROM digest"
+                    " WHERE channel = ? AND recipient = ? AND subject = ? ORDER BY created, id",
+                    (channel, recipient, subject),
+                ).fetchall()
+                messages.append((channel, recipient, compose(subject, [(r[1], r[2]) for r in rows])))
+                conn.executemany("DELETE FROM digest WHERE id = ?", [(r[0],) for r in rows])
+            for channel, recipient, (subject, body) in messages:
+                if channel == "email":
+                    outbox.enqueue("email", {"subject": subject, "body": body, "to": recipient}, conn)
+                elif channel == "line_notify":
+                    outbox.enqueue("line_notify", {"message": f"{subject}\n{body}"}, conn)
+                else:
+                    outbox.enqueue("pushbullet", {"title": subject, "body": body}, conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return len(messages)
+
+
+def _run(interval: float) -> None:
+    while not _stop.wait(interval):
+        try:
+            flush()
+        except Exception as exc:  # pragma: no cover - database errors
+            print(f"Digest flush error: {exc}")
+
+
+def start(interval: float = FLUSH_INTERVAL) -> None:
+    """Start buffering notifications and the timer flushing the digests."""
+
+    global _timer
+    if running():
+        return
+    _stop.clear()
+    _timer = threading.Thread(target=_run, args=(interval,), name="digest", daemon=True)
+    _timer.start()
+
+
+def stop() -> None:
+    """Stop the timer and send the buffered digests."""
+
+    global _timer
+    _stop.set()
+    if _timer is not None:
+        _timer.join(5)
+        _timer = None
+    flush(force=True)
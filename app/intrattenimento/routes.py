@@ -10,6 +10,7 @@ from flask import (
     request,
     send_from_directory,
 )
+from app import pagination
 from app.utils import save_uploaded_file
 
 from . import bp
@@ -33,10 +34,13 @@ def require_login():
 def index():
     user = session.get('user')
     include_expired = user.get('role') == 'admin'
-    posts = utils.filter_posts(include_expired=include_expired)
+    page = pagination.newest(
+        utils.INTRATTENIMENTO_PATH, where=None if include_expired else lambda p: not utils.is_expired(p)
+    )
     return render_template(
         'intrattenimento/intrattenimento_list.html',
-        posts=posts,
+        posts=page.items,
+        page=page,
         user=user,
     )
 
@@ -211,7 +215,7 @@ def task_feedback():
 
 @bp.route('/tasks/download/<path:filename>')
 def task_download(filename: str):
-    tasks = utils.load_tasks()
+    tasks = utils.all_tasks()
     for t in tasks:
         if t.get('filename') == filename:
             return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=True)
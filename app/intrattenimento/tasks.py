@@ -1,15 +1,8 @@
 from datetime import date, datetime
 from typing import List
 
-try:  # pragma: no cover - optional dependency
-    from apscheduler.schedulers.background import BackgroundScheduler
-except Exception:  # pragma: no cover - optional dependency
-    BackgroundScheduler = None  # type: ignore
-
-
-scheduler = BackgroundScheduler() if BackgroundScheduler else None  # type: ignore
-
 import config
+from app import scheduler
 from app.utils import send_email
 from . import utils
 
@@ -42,13 +35,5 @@ def notify_missing_posts(today: date = date.today()) -> List[str]:
     return notified
 
 
-def start_scheduler() -> None:
-    """Start APScheduler to send daily reminder emails."""
-
-    if scheduler is None:
-        return
-
-    if not scheduler.get_jobs():
-        scheduler.add_job(lambda: notify_missing_posts(), "cron", hour=20)
-        scheduler.start()
-
+# Daily reminder emails, run by the central scheduler (see app.scheduler)
+scheduler.register("intrattenimento.missing_posts", lambda: notify_missing_posts(), hour=20)
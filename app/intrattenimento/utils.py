@@ -1,13 +1,26 @@
-import json
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional
 
 import config
+from app import search, sequence, storage, tiering
 
 INTRATTENIMENTO_PATH = Path(getattr(config, "INTRATTENIMENTO_FILE", "intrattenimento.json"))
 TASKS_PATH = Path(getattr(config, "INTRATTENIMENTO_TASK_FILE", "intrattenimento_tasks.json"))
 
+# Finished tasks are moved to the cold archive, by creation month
+_task_archive = tiering.ColdArchive(
+    "intrattenimento_tasks", lambda: TASKS_PATH,
+    lambda t: t.get("status") == "finished", tiering.month_of("timestamp"),
+)
+
+# Keyword indexes for the global search
+search.SearchIndex.for_file("intrattenimento", lambda: INTRATTENIMENTO_PATH, ("title", "body"))
+search.SearchIndex.for_file("intrattenimento_tasks", lambda: TASKS_PATH, ("title", "body"), group="intrattenimento")
+search.SearchIndex.for_archive(
+    "intrattenimento_tasks_archive", _task_archive, ("title", "body"), group="intrattenimento"
+)
+
 # Allow images, documents and media files as attachments
 ALLOWED_EXTS = {
     "txt",
@@ -26,39 +39,49 @@ MAX_VIDEO_SIZE = 3 * 1024 * 1024 * 1024
 
 
 def load_posts():
-    if INTRATTENIMENTO_PATH.exists():
-        with open(INTRATTENIMENTO_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load_json(INTRATTENIMENTO_PATH, [])
 
 
 def save_posts(posts):
-    with open(INTRATTENIMENTO_PATH, "w", encoding="utf-8") as f:
-        json.dump(posts, f, ensure_ascii=False, indent=2)
+    storage.save_json(INTRATTENIMENTO_PATH, posts)
 
 
 def add_post(author, title, body, end_date=None, filename=None):
-    posts = load_posts()
-    next_id = max((p.get("id", 0) for p in posts), default=0) + 1
-    posts.append({
-        "id": next_id,
-        "author": author,
-        "title": title,
-        "body": body,
-        "end_date": end_date.isoformat() if hasattr(end_date, "isoformat") and end_date else end_date,
-        "filename": filename,
-        "timestamp": datetime.now().isoformat(timespec="seconds"),
-    })
-    save_posts(posts)
+    with storage.locked(INTRATTENIMENTO_PATH):
+        posts = load_posts()
+        next_id = sequence.next_id(INTRATTENIMENTO_PATH, posts)
+        posts.append({
+            "id": next_id,
+            "author": author,
+            "title": title,
+            "body": body,
+            "end_date": end_date.isoformat() if hasattr(end_date, "isoformat") and end_date else end_date,
+            "filename": filename,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        })
+        save_posts(posts)
 
 
 def delete_post(post_id):
-    posts = load_posts()
-    new_posts = [p for p in posts if p.get("id") != post_id]
-    if len(new_posts) == len(posts):
-        return False
-    save_posts(new_posts)
-    return True
+    with storage.locked(INTRATTENIMENTO_PATH):
+        posts = load_posts()
+        new_posts = [p for p in posts if p.get("id") != post_id]
+        if len(new_posts) == len(posts):
+            return False
+        save_posts(new_posts)
+        return True
+
+
+def is_expired(post: Dict[str, str]) -> bool:
+    """Return whether the ``end_date`` of ``post`` has passed."""
+
+    end_date = post.get("end_date")
+    if end_date:
+        try:
+            return datetime.fromisoformat(end_date) < datetime.now()
+        except ValueError:
+            pass
+    return False
 
 
 def filter_posts(include_expired: bool = False, **_unused) -> List[Dict[str, str]]:
@@ -68,71 +91,58 @@ def filter_posts(include_expired: bool = False, **_unused) -> List[Dict[str, str
     backward compatibility.
     """
 
-    posts = load_posts()
-    results: List[Dict[str, str]] = []
-    now = datetime.now()
-    for p in posts:
-        end_date = p.get("end_date")
-        if not include_expired and end_date:
-            try:
-                if datetime.fromisoformat(end_date) < now:
-                    continue
-            except ValueError:
-                pass
-        results.append(p)
-    return results
+    return [p for p in load_posts() if include_expired or not is_expired(p)]
 
 
 def load_tasks() -> List[Dict[str, str]]:
-    if TASKS_PATH.exists():
-        with open(TASKS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load_json(TASKS_PATH, [])
 
 
 def save_tasks(tasks: List[Dict[str, str]]) -> None:
-    with open(TASKS_PATH, "w", encoding="utf-8") as f:
-        json.dump(tasks, f, ensure_ascii=False, indent=2)
+    storage.save_json(TASKS_PATH, tasks)
 
 
 def add_task(title: str, body: str, due_date=None, filename=None) -> int:
-    tasks = load_tasks()
-    next_id = max((t.get("id", 0) for t in tasks), default=0) + 1
-    tasks.append(
-        {
-            "id": next_id,
-            "title": title,
-            "body": body,
-            "due_date": due_date.isoformat() if hasattr(due_date, "isoformat") and due_date else None,
-            "filename": filename,
-            "status": "open",
-            "feedback": {},
-            "timestamp": datetime.now().isoformat(timespec="seconds"),
-        }
-    )
-    save_tasks(tasks)
-    return next_id
+    with storage.locked(TASKS_PATH):
+        tasks = load_tasks()
+        next_id = _task_archive.next_id(tasks)
+        tasks.append(
+            {
+                "id": next_id,
+                "title": title,
+                "body": body,
+                "due_date": due_date.isoformat() if hasattr(due_date, "isoformat") and due_date else None,
+                "filename": filename,
+                "status": "open",
+                "feedback": {},
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+            }
+        )
+        save_tasks(tasks)
+        return next_id
 
 
 def finish_task(task_id: int) -> bool:
-    tasks = load_tasks()
-    for t in tasks:
-        if t.get("id") == task_id:
-            t["status"] = "finished"
-            save_tasks(tasks)
-            return True
-    return False
+    with storage.locked(TASKS_PATH):
+        tasks = load_tasks()
+        for t in tasks:
+            if t.get("id") == task_id:
+                t["status"] = "finished"
+                save_tasks(tasks)
+                return True
+        return False
 
 
 def add_feedback(task_id: int, username: str, body: str) -> bool:
-    tasks = load_tasks()
-    for t in tasks:
-        if t.get("id") == task_id and t.get("status") == "open":
-            feedback = t.setdefault("feedback", {})
-            feedback[username] = body
-            save_tasks(tasks)
-            return True
-    return False
+    with storage.locked(TASKS_PATH):
+        tasks = load_tasks()
+        for t in tasks:
+            if t.get("id") == task_id and t.get("status") == "open":
+                feedback = t.setdefault("feedback", {})
+                feedback[username] = body
+                save_tasks(tasks)
+                return True
+        return False
 
 
 def get_active_tasks() -> List[Dict[str, str]]:
@@ -140,7 +150,12 @@ def get_active_tasks() -> List[Dict[str, str]]:
 
 
 def get_finished_tasks() -> List[Dict[str, str]]:
-    return [t for t in load_tasks() if t.get("status") == "finished"]
+    return [t for t in all_tasks() if t.get("status") == "finished"]
+
+
+def all_tasks() -> List[Dict[str, str]]:
+    """Return the live tasks followed by the ones in the cold archive."""
+    return _task_archive.with_hot(load_tasks())
 
 
 def get_feedback(task_id: int, username: str) -> Optional[str]:
@@ -149,4 +164,7 @@ def get_feedback(task_id: int, username: str) -> Optional[str]:
         if t.get("id") == task_id:
             feedback = t.get("feedback", {})
             return feedback.get(username)
+    archived = _task_archive.get(task_id)
+    if archived is not None:
+        return archived.get("feedback", {}).get(username)
     return None
@@ -0,0 +1,176 @@
+"""Append-only JSON-lines journals with compacted gzip archives.
+
+A journal is a ``.jsonl`` file holding one JSON record per line. New
+records are appended with a single ``write()`` so adding a record costs
+the same however long the journal is. :func:`compact` periodically moves
+older records into gzip compressed segments stored in
+``<journal>_archive/<segment>.jsonl.gz``. :func:`iter_records` streams
+the archived segments followed by the live journal.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import storage
+
+
+def archive_dir(path: storage.PathLike) -> Path:
+    """Return the directory holding the compacted segments of ``path``."""
+
+    path = Path(path)
+    return path.with_name(path.stem + "_archive")
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def append(path: storage.PathLike, record: Dict[str, Any]) -> None:
+    """Append ``record`` to the journal at ``path``."""
+
+    line = _encode(record)
+    with storage.locked(path):
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            size = os.lseek(fd, 0, os.SEEK_END)
+            if size:
+                os.lseek(fd, size - 1, os.SEEK_SET)
+                if os.read(fd, 1) != b"\n":
+                    # Terminate a record torn by a crash so it stays on its own line
+                    line = b"\n" + line
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def rewrite(path: storage.PathLike, records: Iterable[Dict[str, Any]]) -> None:
+    """Atomically replace the journal at ``path`` with ``records``."""
+
+    storage.write_atomic(path, "".join(_encode(r).decode("utf-8") for r in records))
+
+
+def _iter_lines(f) -> Iterator[Dict[str, Any]]:
+    for raw in f:
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            yield json.loads(raw)
+        except ValueError:
+            # Partial record left behind by a crash during append
+            continue
+
+
+def iter_segment(path: storage.PathLike) -> Iterator[Dict[str, Any]]:
+    """Yield the records of a single journal or archive segment."""
+
+    opener = gzip.open if str(path).endswith(".gz") else open
+    try:
+        f = opener(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        yield from _iter_lines(f)
+
+
+def read_from(path: storage.PathLike, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Return the complete records of the journal after byte ``offset``.
+
+    Also returns the offset just past the last complete line, where the
+    next read should start; a record still being appended is left for it.
+    """
+
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [], offset
+    with f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    return list(_iter_lines(data[:end].splitlines())), offset + end
+
+
+def segments(path: storage.PathLike) -> List[Path]:
+    """Return the archived segments of ``path`` in chronological order."""
+
+    directory = archive_dir(path)
+    if not directory.is_dir():
+        return []
+    return sorted(directory.glob("*.jsonl.gz"))
+
+
+def iter_records(path: storage.PathLike) -> Iterator[Dict[str, Any]]:
+    """Stream every record, archived segments first."""
+
+    for segment in segments(path):
+        yield from iter_segment(segment)
+    yield from iter_segment(path)
+
+
+def _write_gzip_atomic(path: Path, records: List[Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                for record in records:
+                    gz.write(_encode(record))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def compact(
+    path: storage.PathLike,
+    segment_of: Callable[[Dict[str, Any]], Optional[str]],
+    keep_from: str,
+) -> int:
+    """Move records older than ``keep_from`` into archive segments.
+
+    Parameters
+    ----------
+    path : PathLike
+        Journal file.
+    segment_of : Callable
+        Returns the segment name of a record (for example ``"2025-01"``)
+        or ``None`` if the record should stay in the live journal.
+    keep_from : str
+        Records whose segment sorts before this value are archived.
+
+    Returns
+    -------
+    int
+        Number of records moved out of the live journal.
+    """
+
+    with storage.locked(path):
+        live: List[Dict[str, Any]] = []
+        moved: Dict[str, List[Dict[str, Any]]] = {}
+        for record in iter_segment(path):
+            segment = segment_of(record)
+            if segment is not None and segment < keep_from:
+                moved.setdefault(segment, []).append(record)
+            else:
+                live.append(record)
+        if not moved:
+            return 0
+        # Archives are written before the live journal is shortened, so a
+        # crash in between duplicates records instead of losing them.
+        directory = archive_dir(path)
+        for segment, records in sorted(moved.items()):
+            target = directory / f"{segment}.jsonl.gz"
+            _write_gzip_atomic(target, list(iter_segment(target)) + records)
+        rewrite(path, live)
+        return sum(len(r) for r in moved.values())
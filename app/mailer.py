@@ -0,0 +1,240 @@
+"""SMTP transport keeping authenticated sessions open between messages.
+
+Connecting, ``STARTTLS`` and ``login`` cost several round trips, so
+:func:`send` hands each message to a pooled session that already went
+through them. Reminder jobs sending to every user back to back therefore
+use one connection instead of one per message. A session that idled
+longer than ``IDLE_TIMEOUT`` is closed instead of reused, and a session the
+server dropped is replaced transparently.
+
+:class:`SMTPSink` is a small local SMTP server that accepts and records
+every message, for tests and benchmarks.
+"""
+
+from email import message_from_bytes
+from email.message import Message
+import smtplib
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+
+POOL_SIZE = 2  # sessions open at the same time per server
+IDLE_TIMEOUT = 30.0  # seconds
+
+# Errors after which a session is discarded and the message sent again
+_RETRY_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError)
+
+
+class _Session:
+    def __init__(self, smtp: Any) -> None:
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """Sessions to one SMTP server, at most ``size`` of them at a time."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        use_tls: bool = False,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        size: int = POOL_SIZE,
+        factory: Any = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.factory = factory or smtplib.SMTP
+        self._idle: List[_Session] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections = 0  # sessions opened so far
+
+    def _connect(self) -> _Session:
+        smtp = self.factory(self.host, self.port)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self.connections += 1
+        return _Session(smtp)
+
+    @staticmethod
+    def _close(session: _Session) -> None:
+        try:
+            session.smtp.quit()
+        except Exception:
+            pass
+
+    def _acquire(self) -> _Session:
+        with self._lock:
+            while self._idle:
+                session = self._idle.pop()
+                if time.monotonic() - session.last_used <= IDLE_TIMEOUT:
+                    return session
+                self._close(session)
+        return self._connect()
+
+    def _release(self, session: _Session) -> None:
+        session.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(session)
+
+    def send(self, msg: Message) -> None:
+        """Send ``msg`` over a pooled session, reconnecting once if it was dropped."""
+
+        with self._slots:
+            session = self._acquire()
+            try:
+                session.smtp.send_message(msg)
+            except _RETRY_ERRORS:
+                self._close(session)
+                session = self._connect()
+                try:
+                    session.smtp.send_message(msg)
+                except BaseException:
+                    self._close(session)
+                    raise
+            except BaseException:
+                self._close(session)
+                raise
+            self._release(session)
+
+    def close(self) -> None:
+        """Close the idle sessions."""
+
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._close(session)
+
+
+_pools: Dict[Tuple[Any, ...], SMTPPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool() -> SMTPPool:
+    """Return the pool for the SMTP settings in ``config``."""
+
+    key = (
+        getattr(config, "MAIL_SERVER", "localhost"),
+        getattr(config, "MAIL_PORT", 25),
+        getattr(config, "MAIL_USE_TLS", False),
+        getattr(config, "MAIL_USERNAME", None),
+        getattr(config, "MAIL_PASSWORD", None),
+        # A replaced SMTP class (as in tests) gets sessions of its own
+        smtplib.SMTP,
+    )
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SMTPPool(*key[:5], size=getattr(config, "MAIL_POOL_SIZE", POOL_SIZE), factory=key[5])
+        return pool
+
+
+def send(msg: Message) -> None:
+    """Send ``msg`` with the configured SMTP server."""
+
+    get_pool().send(msg)
+
+
+def close_all() -> None:
+    """Close every idle pooled session."""
+
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self) -> None:
+        sink: "SMTPSink" = self.server.sink  # type: ignore[attr-defined]
+        with sink.lock:
+            sink.connections += 1
+        self._reply("220 famigliapp sink ready")
+        sender = None; recipients: List[str] = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250 famigliapp")
+            elif verb == "MAIL":
+                sender = command.split(":", 1)[1].strip(); recipients = []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip().strip("<>"))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                with sink.lock:
+                    sink.messages.append((sender, recipients, message_from_bytes(b"".join(lines))))
+                self._reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Local SMTP server recording the messages it receives.
+
+    Usage::
+
+        with SMTPSink() as sink:
+            config.MAIL_SERVER, config.MAIL_PORT = sink.host, sink.port
+            ...
+        sink.messages  # [(sender, recipients, email.message.Message), ...]
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.messages: List[Tuple[Optional[str], List[str], Message]] = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _SinkServer((host, port), _SinkHandler)
+        self._server.sink = self  # type: ignore[attr-defined]
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "SMTPSink":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
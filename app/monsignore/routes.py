@@ -2,6 +2,7 @@
 
 import os
 from flask import render_template, session, redirect, url_for, flash, request, send_from_directory
+from app import pagination
 from app.utils import save_uploaded_file, send_email # Added send_email
 import config
 from datetime import datetime, date
@@ -28,9 +29,9 @@ def index():
 @bp.route('/kadai')
 def kadai_list():
     user = session.get("user")
-    kadai_entries = utils.get_active_kadai_entries()
-    kadai_entries.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-    return render_template("monsignore_kadai_list.html", kadai_entries=kadai_entries, user=user)
+    # Newest first, one page at a time
+    page = pagination.newest(utils.KADAI_PATH, where=lambda entry: entry.get("status") == "active")
+    return render_template("monsignore_kadai_list.html", kadai_entries=page.items, page=page, user=user)
 
 @bp.route('/archive')
 def archive_list():
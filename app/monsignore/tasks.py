@@ -3,17 +3,11 @@
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Any, Optional
 
-try:  # pragma: no cover - optional dependency
-    from apscheduler.schedulers.background import BackgroundScheduler
-except ImportError:  # pragma: no cover - optional dependency
-    BackgroundScheduler = None
-
 import config
+from app import scheduler
 from app.utils import send_email # For sending emails
 from . import utils # Monsignore specific utilities
 
-scheduler = BackgroundScheduler() if BackgroundScheduler else None
-
 
 def notify_kadai_feedback_reminders() -> List[Dict[str, Any]]:
     """
@@ -24,7 +18,6 @@ def notify_kadai_feedback_reminders() -> List[Dict[str, Any]]:
     Returns a list of notification records.
     """
     today = date.today()
-    active_kadai_entries = utils.get_active_kadai_entries()
 
     general_users_with_email: Dict[str, Dict[str, Any]] = {}
     if hasattr(config, "USERS") and isinstance(config.USERS, dict):
@@ -39,24 +32,18 @@ def notify_kadai_feedback_reminders() -> List[Dict[str, Any]]:
     notified_actions: List[Dict[str, Any]] = []
     current_time_iso = datetime.now().isoformat()
 
-    for kadai in active_kadai_entries:
-        kadai_id = kadai.get("id")
-        kadai_title = kadai.get("title", "N/A")
-        feedback_deadline_str = kadai.get("feedback_deadline")
-        kadai_creation_ts_str = kadai.get("timestamp")
-
-        if not kadai_id or not feedback_deadline_str or not kadai_creation_ts_str:
-            continue
-
-        try:
-            feedback_deadline_obj = datetime.fromisoformat(feedback_deadline_str).date()
-            kadai_creation_obj = datetime.fromisoformat(kadai_creation_ts_str).date()
-        except ValueError:
-            continue
+    # Only active Kadai with valid dates are indexed, together with the
+    # users who already gave feedback
+    for kadai in utils.open_kadai_feedback():
+        kadai_id = kadai["id"]
+        kadai_title = kadai["title"]
+        feedback_deadline_str = kadai["feedback_deadline"]
+        feedback_deadline_obj = kadai["deadline"]
+        kadai_creation_obj = kadai["created"]
 
         for username, user_details in general_users_with_email.items():
             user_email = user_details['email']
-            submitted = username in kadai.get("feedback_submissions", {})
+            submitted = username in kadai["submitted"]
 
             if not submitted:
                 common_notification_data = {
@@ -82,8 +69,7 @@ def notify_kadai_feedback_reminders() -> List[Dict[str, Any]]:
                     )
                     notified_actions.append({**common_notification_data, 'status': 'notified_overdue_user'})
 
-                    overdue_admin_notified_list = kadai.get("overdue_admin_notified_users", [])
-                    if username not in overdue_admin_notified_list:
+                    if username not in kadai["admins_notified"]:
                         for admin_user in admin_users_with_email:
                             admin_email = admin_user.get("email")
                             if admin_email:
@@ -108,71 +94,11 @@ def archive_old_kadai_entries() -> List[int]:
     Archives Kadai entries older than 48 hours from their creation time.
     Returns a list of IDs of the archived entries.
     """
-    now = datetime.now()
-    active_kadai_entries = utils.get_active_kadai_entries()
-    archived_ids: List[int] = []
-
-    for kadai in active_kadai_entries:
-        kadai_id = kadai.get("id")
-        creation_timestamp_str = kadai.get("timestamp")
-
-        if not kadai_id or not creation_timestamp_str:
-            # Log error or skip if essential data is missing
-            continue
+    return utils.archive_kadai_older_than(datetime.now() - timedelta(hours=48))
 
-        try:
-            creation_dt = datetime.fromisoformat(creation_timestamp_str)
-        except ValueError:
-            # Log error or skip if timestamp format is invalid
-            continue
 
-        archive_trigger_time = creation_dt + timedelta(hours=48)
-
-        if now >= archive_trigger_time:
-            if utils.archive_kadai_entry(kadai_id):
-                archived_ids.append(kadai_id)
-                # Optional: Log("Archived Kadai ID: {kadai_id}")
-
-    return archived_ids
-
-
-def start_scheduler() -> None:
-    """
-    Starts APScheduler jobs for:
-    - Sending daily Kadai feedback reminders (10 AM).
-    - Archiving old Kadai entries (01:05 AM).
-    """
-    if scheduler is None:  # pragma: no cover
-        return
-
-    # Check if jobs are already scheduled to prevent duplicates if called multiple times
-    # This simplistic check assumes job IDs are not explicitly set or are predictable.
-    # A more robust check might involve inspecting scheduler.get_jobs() more thoroughly.
-    if not scheduler.get_jobs():
-        scheduler.add_job(
-            notify_kadai_feedback_reminders,
-            "cron",
-            hour=10,  # Runs daily at 10 AM
-            id="notify_kadai_reminders" # Added job ID
-        )
-        scheduler.add_job(
-            archive_old_kadai_entries,
-            "cron",
-            hour=1,   # Runs daily at 01:05 AM
-            minute=5,
-            id="archive_old_kadai" # Added job ID
-        )
-        try: # pragma: no cover
-            scheduler.start()
-        except (KeyboardInterrupt, SystemExit): # pragma: no cover
-            pass # Allow clean shutdown
-        except Exception as e: # pragma: no cover
-            # Log scheduler start error if any
-            print(f"Error starting scheduler: {e}")
-
-    elif not scheduler.running: # pragma: no cover
-        # If jobs are defined but scheduler isn't running (e.g., after a stop)
-        try:
-            scheduler.start(paused=False) # Start without re-adding jobs
-        except Exception as e:
-            print(f"Error restarting scheduler: {e}")
+# Jobs run by the central scheduler (see app.scheduler):
+# - daily Kadai feedback reminders (10 AM)
+# - archiving old Kadai entries (01:05 AM)
+scheduler.register("monsignore.notify_kadai_reminders", notify_kadai_feedback_reminders, hour=10)
+scheduler.register("monsignore.archive_old_kadai", archive_old_kadai_entries, hour=1, minute=5)
@@ -1,5 +1,6 @@
 from flask import render_template, session, redirect, url_for, flash, request
 
+from app import pagination
 from . import bp, utils
 from .forms import NedariForm
 from app.utils import send_email
@@ -15,13 +16,11 @@ def require_login():
 @bp.route('/')
 def index():
     user = session.get('user')
-    posts = utils.load_posts()
+    where = None
     if user.get('role') != 'admin':
-        posts = [
-            p for p in posts
-            if p.get('visibility') == 'all' or p.get('author') == user.get('username')
-        ]
-    return render_template('nedari_list.html', posts=posts, user=user)
+        where = lambda p: p.get('visibility') == 'all' or p.get('author') == user.get('username')
+    page = pagination.newest(utils.NEDARI_PATH, where=where)
+    return render_template('nedari_list.html', posts=page.items, page=page, user=user)
 
 
 @bp.route('/add', methods=['GET', 'POST'])
@@ -0,0 +1,223 @@
+"""Persistent outbox for notifications delivered in the background.
+
+Notifications are stored as jobs in a SQLite table and delivered by a pool
+of worker threads, so a request that notifies every user only pays for
+inserting the jobs. A failed delivery is retried with exponential backoff;
+after ``MAX_ATTEMPTS`` failures the job is kept with status ``failed``.
+
+A job is claimed by moving its ``next_attempt`` past a lease, so several
+worker processes can share one outbox and a job whose worker died is
+picked up again once the lease expires. Delivery is therefore
+at-least-once.
+
+Each kind of job has a handler registered with :func:`register`. Handlers
+receive the payload given to :func:`enqueue` and raise on failure.
+"""
+
+from contextlib import closing
+import json
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 30.0  # seconds before the first retry, doubled on each retry
+BACKOFF_MAX = 3600.0
+LEASE = 300.0  # seconds a claimed job is hidden from other workers
+POLL_INTERVAL = 5.0
+
+_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+_workers: List[threading.Thread] = []
+_stop = threading.Event()
+_wakeup = threading.Condition()
+_app = None
+
+
+def outbox_path() -> str:
+    return getattr(config, "OUTBOX_FILE", "outbox.sqlite3")
+
+
+def connect() -> sqlite3.Connection:
+    """Open the outbox database in autocommit mode."""
+
+    conn = sqlite3.connect(outbox_path(), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS outbox ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " kind TEXT NOT NULL,"
+        " payload TEXT NOT NULL,"
+        " status TEXT NOT NULL DEFAULT 'pending',"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " next_attempt REAL NOT NULL,"
+        " created REAL NOT NULL,"
+        " last_error TEXT)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+    return conn
+
+
+def register(kind: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+    """Deliver jobs of ``kind`` with ``handler``."""
+
+    _handlers[kind] = handler
+
+
+def running() -> bool:
+    """Return True when this process has started background workers."""
+
+    return bool(_workers) and not _stop.is_set()
+
+
+def enqueue(kind: str, payload: Dict[str, Any], conn: Optional[sqlite3.Connection] = None) -> int:
+    """Store a job of ``kind`` and return its ID.
+
+    The job is delivered by the workers of any process sharing the outbox.
+    Pass ``conn`` (from :func:`connect`) to add the job within the caller's
+    transaction.
+    """
+
+    if kind not in _handlers:
+        raise ValueError(f"unknown outbox job kind: {kind}")
+    now = time.time()
+    sql = "INSERT INTO outbox (kind, payload, next_attempt, created) VALUES (?, ?, ?, ?)"
+    params = (kind, json.dumps(payload, ensure_ascii=False), now, now)
+    if conn is not None:
+        job_id = conn.execute(sql, params).lastrowid
+    else:
+        with closing(connect()) as own_conn:
+            job_id = own_conn.execute(sql, params).lastrowid
+    with _wakeup:
+        _wakeup.notify()
+    return job_id
+
+
+def backoff(attempts: int) -> float:
+    """Return the delay before retrying a job that failed ``attempts`` times."""
+
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claim(conn: sqlite3.Connection, now: float) -> Optional[tuple]:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id, kind, payload, attempts FROM outbox"
+            " WHERE status = 'pending' AND next_attempt <= ?"
+            " ORDER BY next_attempt, id LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt = ? WHERE id = ?",
+                (now + LEASE, row[0]),
+            )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+
+def process_one(now: Optional[float] = None) -> bool:
+    """Deliver one due job. Return False when no job is due."""
+
+    now = time.time() if now is None else now
+    with closing(connect()) as conn:
+        row = _claim(conn, now)
+        if row is None:
+            return False
+        job_id, kind, payload, attempts = row
+        attempts += 1
+        try:
+            handler = _handlers[kind]
+            if _app is not None:
+                with _app.app_context():
+                    handler(json.loads(payload))
+            else:
+                handler(json.loads(payload))
+        except Exception as exc:
+            if attempts >= MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?",
+                    (repr(exc), job_id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE outbox SET next_attempt = ?, last_error = ? WHERE id = ?",
+                    (now + backoff(attempts), repr(exc), job_id),
+                )
+        else:
+            conn.execute("DELETE FROM outbox WHERE id = ?", (job_id,))
+    return True
+
+
+def drain(now: Optional[float] = None) -> int:
+    """Deliver every due job in the calling thread and return how many were tried."""
+
+    count = 0
+    while process_one(now):
+        count += 1
+    return count
+
+
+def pending(status: str = "pending") -> List[Dict[str, Any]]:
+    """Return the jobs with ``status`` (``pending`` or ``failed``), oldest first."""
+
+    with closing(connect()) as conn:
+        rows = conn.execute(
+            "SELECT id, kind, payload, attempts, next_attempt, last_error FROM outbox"
+            " WHERE status = ? ORDER BY id",
+            (status,),
+        ).fetchall()
+    return [
+        {"id": r[0], "kind": r[1], "payload": json.loads(r[2]), "attempts": r[3], "next_attempt": r[4], "last_error": r[5]}
+        for r in rows
+    ]
+
+
+def _worker() -> None:
+    while not _stop.is_set():
+        try:
+            delivered = process_one()
+        except Exception as exc:  # pragma: no cover - database errors
+            print(f"Outbox worker error: {exc}")
+            delivered = False
+        if not delivered:
+            with _wakeup:
+                _wakeup.wait(POLL_INTERVAL)
+
+
+def start(app=None, workers: Optional[int] = None) -> None:
+    """Start the worker threads delivering the outbox.
+
+    ``app`` is the Flask application whose context handlers run in.
+    """
+
+    global _app
+    if running():
+        return
+    _app = app
+    _stop.clear()
+    _workers.clear()
+    for i in range(workers or getattr(config, "OUTBOX_WORKERS", 4)):
+        thread = threading.Thread(target=_worker, name=f"outbox-{i}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+
+
+def stop(timeout: float = 5.0) -> None:
+    """Stop the worker threads; undelivered jobs stay in the outbox."""
+
+    _stop.set()
+    with _wakeup:
+        _wakeup.notify_all()
+    for thread in _workers:
+        thread.join(timeout)
+    _workers.clear()
@@ -0,0 +1,83 @@
+"""Cursor pagination shared by the list views.
+
+List pages show the newest ``PAGE_SIZE`` records and a link to the next
+page. The cursor of a page is the ``id`` of the last record of the
+previous one, so the next page starts right after it even when records
+were added in between, and reading a page of a JSON store with
+:func:`newest` stops as soon as the page is full instead of copying the
+whole file. Templates render the links with the ``pager`` macro of
+``macros.html``.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import config
+
+from . import storage
+
+PAGE_SIZE = 20
+
+
+def page_size() -> int:
+    return getattr(config, "PAGE_SIZE", PAGE_SIZE)
+
+
+class Page(NamedTuple):
+    """Records of one page, newest first."""
+
+    items: List[Dict[str, Any]]
+    cursor: Optional[int]
+    next_cursor: Optional[int]
+
+    def url(self, cursor: Optional[int]) -> str:
+        """Return the URL of the current view at ``cursor`` (the first page for ``None``)."""
+
+        from flask import request, url_for
+
+        args = request.args.to_dict()
+        args.update(request.view_args or {})
+        args.pop("cursor", None)
+        if cursor is not None:
+            args["cursor"] = cursor
+        return url_for(request.endpoint, **args)
+
+
+def current_cursor() -> Optional[int]:
+    """Return the cursor requested in the query string, if any."""
+
+    from flask import request
+
+    return request.args.get("cursor", type=int)
+
+
+def newest(
+    path: storage.PathLike,
+    where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Page:
+    """Return the requested page of the JSON list at ``path``.
+
+    ``cursor`` defaults to the one of the current request.
+    """
+
+    cursor = current_cursor() if cursor is None else cursor
+    items, next_cursor = storage.newest(path, limit or page_size(), before=cursor, where=where)
+    return Page(items, cursor, next_cursor)
+
+
+def paginate(records: Iterable[Dict[str, Any]], cursor: Optional[int] = None, limit: Optional[int] = None) -> Page:
+    """Return the requested page of ``records`` already filtered by the caller.
+
+    The records are ordered newest (highest ``id``) first.
+    ``cursor`` defaults to the one of the current request.
+    """
+
+    cursor = current_cursor() if cursor is None else cursor
+    limit = limit or page_size()
+    ordered = sorted(records, key=lambda r: r.get("id", 0), reverse=True)
+    if cursor is not None:
+        ordered = [r for r in ordered if r.get("id", 0) < cursor]
+    items = ordered[:limit]
+    next_cursor = items[-1].get("id") if len(ordered) > limit else None
+    return Page(items, cursor, next_cursor)
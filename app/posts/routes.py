@@ -5,7 +5,7 @@ from datetime import datetime
 
 from . import bp
 from .forms import AddPostForm, PostFilterForm, CommentForm
-from app import utils
+from app import pagination, utils
 from app.utils import send_email
 import config
 
@@ -31,18 +31,28 @@ def index():
 
     user = session.get("user")
     form = PostFilterForm(request.args)
-    posts = utils.filter_posts(
-        category=form.category.data or "",
-        author=form.author.data or "",
-        keyword=form.keyword.data or "",
-        start=_parse_date(form.start_date.data),
-        end=_parse_date(form.end_date.data),
-    )
+    category = form.category.data or ""
+    author = form.author.data or ""
+    keyword = form.keyword.data or ""
+    start = _parse_date(form.start_date.data)
+    end = _parse_date(form.end_date.data)
+    if keyword or start or end or utils._use_db():
+        page = pagination.paginate(
+            utils.filter_posts(category=category, author=author, keyword=keyword, start=start, end=end)
+        )
+    else:
+        # Only the newest page of the store is read
+        page = pagination.newest(
+            utils.POSTS_PATH,
+            where=lambda p: (not category or p.get("category") == category)
+            and (not author or p.get("author") == author),
+        )
     comment_form = CommentForm()
-    for p in posts:
-        p["comments"] = utils.get_comments(p.get("id"))
+    for p in page.items:
+        p["comment_count"] = utils.comment_count(p)
+        p["comments"] = utils.get_comments(p.get("id")) if p["comment_count"] else []
     return render_template(
-        "posts_list.html", posts=posts, form=form, comment_form=comment_form, user=user
+        "posts_list.html", posts=page.items, page=page, form=form, comment_form=comment_form, user=user
     )
 
 
@@ -118,8 +128,7 @@ def edit_comment(comment_id: int):
     """Edit an existing comment (author or admin)."""
 
     user = session.get("user")
-    comments = utils.load_comments()
-    comment = next((c for c in comments if c.get("id") == comment_id), None)
+    comment = utils.get_comment(comment_id)
     if not comment:
         flash("該当IDがありません")
         return redirect(url_for("posts.index"))
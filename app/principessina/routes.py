@@ -11,6 +11,7 @@ from flask import (
     send_from_directory,
     current_app
 )
+from app import pagination
 from app.utils import save_uploaded_file
 from datetime import datetime, date, timedelta # Added timedelta for report submission reporting day logic
 
@@ -291,11 +292,10 @@ def video_page():
             n_f_n = folder_form.folder_name.data; success, message = utils.create_custom_media_folder(media_type_base_path_abs, n_f_n)
             flash(message, "success" if success else "danger")
             return redirect(url_for('.video_page', current_folder=n_f_n if success else current_folder_name))
-    media_entries = utils.get_media_entries(media_type="video", custom_folder_name=current_folder_name)
-    media_entries.sort(key=lambda x: x.get("upload_timestamp", ""), reverse=True)
+    page = pagination.paginate(utils.get_media_entries(media_type="video", custom_folder_name=current_folder_name))
     current_folder_display_name = current_folder_name if current_folder_name else "年月フォルダ"
     return render_template("decima_video_page.html", video_form=video_form, folder_form=folder_form, copy_form=copy_form,
-        video_entries=media_entries, custom_video_folders=all_custom_folders, all_custom_video_folders=all_custom_folders,
+        video_entries=page.items, page=page, custom_video_folders=all_custom_folders, all_custom_video_folders=all_custom_folders,
         current_folder_name=current_folder_name, current_folder_display_name=current_folder_display_name, user=user)
 
 @bp.route('/photo', methods=['GET', 'POST'])
@@ -329,11 +329,10 @@ def photo_page():
             n_f_n = folder_form.folder_name.data; success, message = utils.create_custom_media_folder(media_type_base_path_abs, n_f_n)
             flash(message, "success" if success else "danger")
             return redirect(url_for('.photo_page', current_folder=n_f_n if success else current_folder_name))
-    media_entries = utils.get_media_entries(media_type="photo", custom_folder_name=current_folder_name)
-    media_entries.sort(key=lambda x: x.get("upload_timestamp", ""), reverse=True)
+    page = pagination.paginate(utils.get_media_entries(media_type="photo", custom_folder_name=current_folder_name))
     current_folder_display_name = current_folder_name if current_folder_name else "年月フォルダ"
     return render_template("decima_photo_page.html", photo_form=photo_form, folder_form=folder_form, copy_form=copy_form,
-        photo_entries=media_entries, custom_photo_folders=all_custom_folders, all_custom_photo_folders=all_custom_folders,
+        photo_entries=page.items, page=page, custom_photo_folders=all_custom_folders, all_custom_photo_folders=all_custom_folders,
         current_folder_name=current_folder_name, current_folder_display_name=current_folder_display_name, user=user)
 
 @bp.route('/media/<int:media_id>/copy_to_folder', methods=['POST'])
@@ -1,19 +1,20 @@
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Any
-
-try:  # pragma: no cover - optional dependency
-    from apscheduler.schedulers.background import BackgroundScheduler
-except ImportError:  # pragma: no cover - optional dependency
-    BackgroundScheduler = None
-
-scheduler = BackgroundScheduler() if BackgroundScheduler else None
+import time
+from typing import List, Dict, Any, Optional, Tuple
 
 import config
+from app import reminders, scheduler
 from app.utils import send_email
 from . import utils
 from app.calendario import utils as calendario_utils # Import Calendario utils
 
-admin_overdue_alert_sent_today: Dict[date, bool] = {}
+# The day admins were last alerted is kept in the job ledger so a restart
+# does not alert them twice
+ADMIN_ALERT_JOB = "principessina.decima_overdue_notification"
+
+
+def _admin_alert_sent(day: date) -> bool:
+    return scheduler.job_state(ADMIN_ALERT_JOB).get("admin_alert_sent") == day.isoformat()
 
 def get_admin_user_emails() -> List[str]:
     admins = []
@@ -25,59 +26,103 @@ def get_admin_user_emails() -> List[str]:
                 admins.append(user_data["email"])
     return admins
 
-def send_decima_report_reminders() -> List[Dict[str, Any]]:
-    now = datetime.now()
-    current_hour = now.hour
-    notified_actions: List[Dict[str, Any]] = [] # Changed variable name for clarity
-
-    is_reporting_window = (11 <= current_hour <= 23) or (0 <= current_hour <= 4)
-    if not is_reporting_window:
-        return notified_actions
+# Report types every user on shift submits for the day, with their names
+REQUIRED_REPORT_TYPES = {"yura": "「今日のユラちゃん」", "mangiato": "「食べたもの」"}
 
-    if current_hour >= 11: reporting_day_date = date.today()
-    else: reporting_day_date = date.today() - timedelta(days=1)
+def _missing_report_types(username: str, day: date) -> List[str]:
+    submitted = utils.submitted_report_types(username, day)
+    return [t for t in REQUIRED_REPORT_TYPES if t not in submitted]
 
-    try:
-        shift_users_today_usernames = calendario_utils.get_users_on_shift(reporting_day_date)
-    except Exception as e: # Catch potential errors like file not found for calendario events
-        print(f"Error fetching shift users for {reporting_day_date}: {e}")
-        return notified_actions # Exit if we can't determine shift users
+# Reminders are queued at 11:00 and sent hourly from 11:05 on the shift day
+# until 04:05 the next morning
+SCHEDULE_AT = (11, 0)
+FIRST_REMINDER = (11, 5)
+LAST_REMINDER = (4, 5)
 
-    if not shift_users_today_usernames:
-        return notified_actions # No users on shift, no reminders to send
+def _reminder_window(day: date) -> Tuple[float, float]:
+    next_day = day + timedelta(days=1)
+    first = datetime(day.year, day.month, day.day, *FIRST_REMINDER)
+    last = datetime(next_day.year, next_day.month, next_day.day, *LAST_REMINDER)
+    return first.timestamp(), last.timestamp()
 
-    all_reports = utils.load_posts()
+def schedule_decima_reminders(day: Optional[date] = None) -> int:
+    """Queue reminders for the reports still missing from the users on shift on ``day``.
 
-    for username_on_shift in shift_users_today_usernames:
+    Returns the number of pending reminder items.
+    """
+    day = day or date.today()
+    try:
+        shift_users = calendario_utils.get_users_on_shift(day)
+    except Exception as e: # Catch potential errors like file not found for calendario events
+        print(f"Error fetching shift users for {day}: {e}")
+        return 0
+    first, _ = _reminder_window(day); count = 0
+    for username_on_shift in shift_users:
         user_config = getattr(config, "USERS", {}).get(username_on_shift)
-        if not user_config or not user_config.get("email"):
-            continue # Skip if user details or email not in config
-
-        user_email = user_config["email"]
-        user_has_yura, user_has_mangiato = False, False
-        for report in all_reports:
-            if report.get("author") == username_on_shift:
-                try:
-                    if datetime.fromisoformat(report.get("timestamp", "")).date() == reporting_day_date:
-                        if report.get("report_type") == "yura": user_has_yura = True
-                        elif report.get("report_type") == "mangiato": user_has_mangiato = True
-                except ValueError: continue
-            if user_has_yura and user_has_mangiato: break
-
-        if not (user_has_yura and user_has_mangiato):
-            missing_reports_parts = []
-            if not user_has_yura: missing_reports_parts.append("「今日のユラちゃん」")
-            if not user_has_mangiato: missing_reports_parts.append("「食べたもの」")
-            missing_reports_str = "と".join(missing_reports_parts)
-
-            email_subject = "Decima報告リマインダー"
-            email_body = (f"今日のDecima報告のうち、{missing_reports_str}の報告がまだのようです。\n"
-                          f"投稿期限は本日（または本日開始のシフトの場合、翌朝）4時です。\nご提出をお願いいたします。")
-            send_email(email_subject, email_body, user_email)
-            notified_actions.append({
-                "username": username_on_shift, "status": "reminder_sent",
-                "missing": missing_reports_str, "reporting_day": reporting_day_date.isoformat()
-            })
+        if not user_config or not user_config.get("email"): continue
+        for report_type in _missing_report_types(username_on_shift, day):
+            reminders.schedule(utils.DECIMA_REMINDER, f"{day.isoformat()}|{username_on_shift}|{report_type}", first, replace=False)
+            count += 1
+    return count
+
+def sync_decima_reminders(day: date, now: Optional[float] = None) -> None:
+    """Bring the pending reminders of ``day`` in line with its current shift.
+
+    Called when the shifts of ``day`` change once its reminders are queued:
+    users added to the shift get reminders, users removed from it lose them.
+    """
+    now = time.time() if now is None else now
+    _, last = _reminder_window(day)
+    if not datetime(day.year, day.month, day.day, *SCHEDULE_AT).timestamp() <= now <= last: return
+    on_shift = set(calendario_utils.get_users_on_shift(day)); prefix = f"{day.isoformat()}|"
+    for key, _ in reminders.pending(utils.DECIMA_REMINDER):
+        if key.startswith(prefix) and key.split("|", 2)[1] not in on_shift:
+            reminders.resolve(utils.DECIMA_REMINDER, key)
+    schedule_decima_reminders(day)
+
+def _on_shifts_changed(days: List[date]) -> None:
+    for day in days: sync_decima_reminders(day)
+
+def send_decima_report_reminders(items: List[Tuple[str, float]], now: float) -> List[Dict[str, Any]]:
+    """Send the due reminders (see :func:`schedule_decima_reminders`) and queue the next ones.
+
+    Users no longer on the shift of the reporting day are skipped and their
+    remaining items dropped.
+    """
+    notified_actions: List[Dict[str, Any]] = []
+    due_by_user: Dict[Tuple[str, str], float] = {}
+    for key, due in items:
+        day_str, username, _ = key.split("|", 2)
+        due_by_user[(day_str, username)] = due
+    shift_by_day: Dict[str, List[str]] = {}
+    for (day_str, username_on_shift), due in due_by_user.items():
+        reporting_day_date = date.fromisoformat(day_str)
+        if day_str not in shift_by_day:
+            shift_by_day[day_str] = calendario_utils.get_users_on_shift(reporting_day_date)
+        if username_on_shift not in shift_by_day[day_str]:
+            reminders.resolve(utils.DECIMA_REMINDER, f"{day_str}|{username_on_shift}|", prefix=True)
+            continue
+        user_config = getattr(config, "USERS", {}).get(username_on_shift)
+        missing_types = _missing_report_types(username_on_shift, reporting_day_date)
+        if not missing_types or not user_config or not user_config.get("email"):
+            continue
+        missing_reports_str = "と".join(REQUIRED_REPORT_TYPES[t] for t in missing_types)
+
+        email_subject = "Decima報告リマインダー"
+        email_body = (f"今日のDecima報告のうち、{missing_reports_str}の報告がまだのようです。\n"
+                      f"投稿期限は本日（または本日開始のシフトの場合、翌朝）4時です。\nご提出をお願いいたします。")
+        send_email(email_subject, email_body, user_config["email"])
+        notified_actions.append({
+            "username": username_on_shift, "status": "reminder_sent",
+            "missing": missing_reports_str, "reporting_day": reporting_day_date.isoformat()
+        })
+        # Next hour, skipping the hours missed while no scheduler was running
+        _, last = _reminder_window(reporting_day_date)
+        next_due = due + 3600
+        while next_due <= now: next_due += 3600
+        if next_due <= last:
+            for report_type in missing_types:
+                reminders.schedule(utils.DECIMA_REMINDER, f"{day_str}|{username_on_shift}|{report_type}", next_due)
     return notified_actions
 
 
@@ -95,30 +140,16 @@ def send_decima_overdue_notifications() -> List[Dict[str, Any]]:
     if not shift_users_due_usernames:
         return notified_actions
 
-    all_reports = utils.load_posts()
-
     for username_on_shift in shift_users_due_usernames:
         user_config = getattr(config, "USERS", {}).get(username_on_shift)
         if not user_config or not user_config.get("email"):
             continue
 
         user_email = user_config["email"]
-        user_has_yura, user_has_mangiato = False, False
-        for report in all_reports:
-            if report.get("author") == username_on_shift:
-                try:
-                    if datetime.fromisoformat(report.get("timestamp", "")).date() == due_reporting_day_date:
-                        if report.get("report_type") == "yura": user_has_yura = True
-                        elif report.get("report_type") == "mangiato": user_has_mangiato = True
-                except ValueError: continue
-            if user_has_yura and user_has_mangiato: break
-
-        if not (user_has_yura and user_has_mangiato):
+        missing_types = _missing_report_types(username_on_shift, due_reporting_day_date)
+        if missing_types:
             overdue_shift_users_exist = True
-            missing_reports_parts = []
-            if not user_has_yura: missing_reports_parts.append("「今日のユラちゃん」")
-            if not user_has_mangiato: missing_reports_parts.append("「食べたもの」")
-            missing_reports_str = "と".join(missing_reports_parts)
+            missing_reports_str = "と".join(REQUIRED_REPORT_TYPES[t] for t in missing_types)
 
             email_subject = "【至急】Decima報告が期限切れです"
             email_body = (f"{due_reporting_day_date.strftime('%Y年%m月%d日')}分のDecima報告のうち、{missing_reports_str}が未提出です。\n至急ご提出ください。")
@@ -129,7 +160,7 @@ def send_decima_overdue_notifications() -> List[Dict[str, Any]]:
             })
 
     if overdue_shift_users_exist:
-        if not admin_overdue_alert_sent_today.get(date.today(), False):
+        if not _admin_alert_sent(date.today()):
             admin_emails = get_admin_user_emails()
             if admin_emails:
                 email_subject = "Decima報告遅延者発生"
@@ -137,38 +168,20 @@ def send_decima_overdue_notifications() -> List[Dict[str, Any]]:
                               f"詳細はシステムログまたは該当ユーザーへの通知をご確認ください。")
                 for admin_email in admin_emails:
                     send_email(email_subject, email_body, admin_email)
-                admin_overdue_alert_sent_today[date.today()] = True
+                scheduler.set_job_state(ADMIN_ALERT_JOB, admin_alert_sent=date.today().isoformat())
                 notified_actions.append({"status": "overdue_admins_notified", "due_reporting_day": due_reporting_day_date.isoformat()})
     return notified_actions
 
 def reset_daily_admin_alert_flag():
-    admin_overdue_alert_sent_today.clear()
+    scheduler.set_job_state(ADMIN_ALERT_JOB, admin_alert_sent=None)
 
 def archive_old_reports() -> List[int]:
-    now = datetime.now()
-    active_reports = utils.get_active_reports()
-    archived_ids: List[int] = []
-    for report in active_reports:
-        report_id = report.get("id")
-        creation_timestamp_str = report.get("timestamp")
-        if not report_id or not creation_timestamp_str: continue
-        try: creation_dt = datetime.fromisoformat(creation_timestamp_str)
-        except ValueError: continue
-        if report.get('status') == 'active' and now >= (creation_dt + timedelta(days=3)):
-            if utils.archive_report(report_id):
-                archived_ids.append(report_id)
-    return archived_ids
-
-def start_scheduler() -> None:
-    if scheduler is None: return # pragma: no cover
-    if not scheduler.get_jobs():
-        scheduler.add_job(send_decima_report_reminders, "cron", hour='11-23,0-4', minute=5, id="decima_hourly_reminder")
-        scheduler.add_job(send_decima_overdue_notifications, "cron", hour='5-23/2', minute=15, id="decima_overdue_notification")
-        scheduler.add_job(reset_daily_admin_alert_flag, "cron", hour=0, minute=1, id="reset_admin_alert_flag")
-        scheduler.add_job(archive_old_reports, "cron", hour=1, minute=15, id="archive_decima_reports")
-        try: scheduler.start() # pragma: no cover
-        except (KeyboardInterrupt, SystemExit): pass # pragma: no cover
-        except Exception as e: print(f"Error starting Principessina/Decima scheduler: {e}") # pragma: no cover
-    elif not scheduler.running: # pragma: no cover
-        try: scheduler.start(paused=False)
-        except Exception as e: print(f"Error restarting Principessina/Decima scheduler: {e}") # pragma: no cover
+    return utils.archive_reports_older_than(datetime.now() - timedelta(days=3))
+
+
+scheduler.register("principessina.decima_reminders", schedule_decima_reminders, hour=SCHEDULE_AT[0], minute=SCHEDULE_AT[1])
+reminders.register(utils.DECIMA_REMINDER, send_decima_report_reminders)
+calendario_utils.on_shifts_changed(_on_shifts_changed)
+scheduler.register(ADMIN_ALERT_JOB, send_decima_overdue_notifications, hour='5-23/2', minute=15)
+scheduler.register("principessina.reset_admin_alert_flag", reset_daily_admin_alert_flag, hour=0, minute=1)
+scheduler.register("principessina.archive_decima_reports", archive_old_reports, hour=1, minute=15)
@@ -3,11 +3,16 @@
 from datetime import datetime, date # Ensure date is imported
 import json
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Set, Tuple
 import os
 import re
 
 import config
+from app import sequence, storage
+from app import reminders
+from app import search
+from app import tiering
+from app.reminders import ReminderIndex
 
 # --- Settings for Decima Reports (Text-based) ---
 PRINCIPESSINA_PATH = Path(
@@ -28,56 +33,110 @@ MAX_MEDIA_SIZE = 3 * 1024 * 1024 * 1024 # 3GB
 # --- Decima Report Functions ---
 
 def load_posts() -> List[Dict[str, Any]]:
-    if PRINCIPESSINA_PATH.exists():
-        with open(PRINCIPESSINA_PATH, "r", encoding="utf-8") as f:
-            try: return json.load(f)
-            except json.JSONDecodeError: return []
-    return []
+    try: return storage.load_json(PRINCIPESSINA_PATH, [])
+    except json.JSONDecodeError: return []
 
 def save_posts(posts: List[Dict[str, Any]]) -> None:
-    with open(PRINCIPESSINA_PATH, "w", encoding="utf-8") as f:
-        json.dump(posts, f, ensure_ascii=False, indent=2)
+    storage.save_json(PRINCIPESSINA_PATH, posts)
+
+def _submission_index(reports: List[Dict[str, Any]]) -> Dict[str, Dict[str, Set[str]]]:
+    """Report types submitted, by day (ISO date of ``timestamp``) and author."""
+    index: Dict[str, Dict[str, Set[str]]] = {}
+    for report in reports:
+        try: day = datetime.fromisoformat(report.get("timestamp", "")).date().isoformat()
+        except (TypeError, ValueError): continue
+        index.setdefault(day, {}).setdefault(report.get("author"), set()).add(report.get("report_type"))
+    return index
+
+_submissions = ReminderIndex(lambda: PRINCIPESSINA_PATH, _submission_index)
+
+# Archived reports are moved to monthly files of the cold archive (by creation month)
+_archive = tiering.ColdArchive(
+    "principessina", lambda: PRINCIPESSINA_PATH,
+    lambda r: r.get("status") == "archived", tiering.month_of("timestamp"),
+)
+
+# Phrase search; archived text never changes, so the cold index is only refreshed by moves
+_search = search.SearchIndex.for_file("principessina", lambda: PRINCIPESSINA_PATH, ("text_content",))
+_cold_search = search.SearchIndex.for_archive(
+    "principessina_archive", _archive, ("text_content",), group="principessina"
+)
+
+# Pending hourly reminders, keyed "<day>|<author>|<report_type>"
+DECIMA_REMINDER = "principessina.decima"
+
+def submitted_report_types(author: str, day: date) -> Set[str]:
+    """Return the report types ``author`` submitted on ``day`` (archived ones included)."""
+    return _submissions.get().get(day.isoformat(), {}).get(author, set())
 
 def add_report(author: str, report_type: str, text_content: str) -> int:
-    reports = load_posts()
-    next_id = max((int(r.get("id", 0)) for r in reports), default=0) + 1
-    new_report_entry = {
-        "id": next_id, "author": author, "report_type": report_type,
-        "text_content": text_content, "timestamp": datetime.now().isoformat(timespec="seconds"),
-        "status": "active", "archived_timestamp": None,
-        "custom_folder_name": None,
-        "referenced_in_custom_folders": []
-    }
-    reports.append(new_report_entry)
-    save_posts(reports)
+    with storage.locked(PRINCIPESSINA_PATH):
+        reports = load_posts(); before = _submissions.stamp()
+        next_id = _archive.next_id(reports)
+        now = datetime.now()
+        new_report_entry = {
+            "id": next_id, "author": author, "report_type": report_type,
+            "text_content": text_content, "timestamp": now.isoformat(timespec="seconds"),
+            "status": "active", "archived_timestamp": None,
+            "custom_folder_name": None,
+            "referenced_in_custom_folders": []
+        }
+        reports.append(new_report_entry)
+        save_posts(reports)
+        _submissions.update(before, lambda index: index.setdefault(now.date().isoformat(), {}).setdefault(author, set()).add(report_type))
+    reminders.resolve(DECIMA_REMINDER, f"{now.date().isoformat()}|{author}|{report_type}")
     return next_id
 
 def delete_post(report_id: int) -> bool:
-    reports = load_posts()
-    original_length = len(reports)
-    new_reports = [r for r in reports if r.get("id") != report_id]
-    if len(new_reports) < original_length:
-        save_posts(new_reports)
-        return True
-    return False
+    with storage.locked(PRINCIPESSINA_PATH):
+        reports = load_posts()
+        original_length = len(reports)
+        new_reports = [r for r in reports if r.get("id") != report_id]
+        if len(new_reports) < original_length:
+            save_posts(new_reports)
+            return True
+        return _archive.delete(report_id)
 
 def filter_posts(author: str = "", keyword: str = "") -> List[Dict[str, Any]]:
     return []
 
 def archive_report(report_id: int) -> bool:
-    reports = load_posts()
-    report_found = False
-    for report in reports:
-        if report.get("id") == report_id:
-            if report.get("status") == "active":
-                report["status"] = "archived"
-                report["archived_timestamp"] = datetime.now().isoformat(timespec="seconds")
-                report_found = True
-            break
-    if report_found:
-        save_posts(reports)
-        return True
-    return False
+    with storage.locked(PRINCIPESSINA_PATH):
+        reports = load_posts()
+        report_found = False
+        for report in reports:
+            if report.get("id") == report_id:
+                if report.get("status") == "active":
+                    report["status"] = "archived"
+                    report["archived_timestamp"] = datetime.now().isoformat(timespec="seconds")
+                    report_found = True
+                break
+        if report_found:
+            save_posts(reports)
+            return True
+        return False
+
+def archive_reports_older_than(cutoff: datetime) -> List[int]:
+    """Archive every active report created at or before ``cutoff`` with one save.
+
+    Returns the IDs of the archived reports.
+    """
+    with storage.locked(PRINCIPESSINA_PATH):
+        reports = load_posts(); before = _submissions.stamp()
+        archived_at = datetime.now().isoformat(timespec="seconds")
+        archived_ids: List[int] = []
+        for report in reports:
+            if report.get("status") != "active" or not report.get("id") or not report.get("timestamp"): continue
+            try: created = datetime.fromisoformat(report["timestamp"])
+            except ValueError: continue
+            if created <= cutoff:
+                report["status"] = "archived"; report["archived_timestamp"] = archived_at
+                archived_ids.append(report["id"])
+        if archived_ids:
+            save_posts(reports)
+            # Archived reports still count as submitted
+            _submissions.update(before, lambda index: None)
+        return archived_ids
 
 def get_active_reports(report_type: Optional[str] = None) -> List[Dict[str, Any]]:
     reports = load_posts()
@@ -93,6 +152,10 @@ def get_archived_reports(
     search_date_to: Optional[date] = None
 ) -> List[Dict[str, Any]]:
     all_reports = load_posts()
+    # Cold archive months are only read within the searched date range
+    since = search_date_from.strftime("%Y-%m") if search_date_from else None
+    until = search_date_to.strftime("%Y-%m") if search_date_to else None
+    all_reports = _archive.with_hot(all_reports, since=since, until=until)
     # First, filter for archived status
     candidate_reports = [r for r in all_reports if r.get("status") == "archived"]
 
@@ -110,10 +173,8 @@ def get_archived_reports(
 
     # Phrase Search
     if search_phrase:
-        candidate_reports = [
-            r for r in candidate_reports
-            if search_phrase.lower() in r.get('text_content', '').lower()
-        ]
+        matched = _search.matching_ids(search_phrase) | _cold_search.matching_ids(search_phrase)
+        candidate_reports = [r for r in candidate_reports if r.get("id") in matched]
 
     # Date Range Search (on original 'timestamp')
     if search_date_from:
@@ -132,97 +193,106 @@ def get_archived_reports(
 
 # --- Report Custom Folder Management ---
 def load_report_folder_names() -> List[str]:
-    if REPORT_FOLDERS_PATH.exists():
-        with open(REPORT_FOLDERS_PATH, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-                return data.get("folder_names", [])
-            except json.JSONDecodeError: return []
-    return []
+    try:
+        data = storage.read_json(REPORT_FOLDERS_PATH, {})
+        return list(data.get("folder_names", []))
+    except json.JSONDecodeError: return []
 
 def save_report_folder_names(names: List[str]) -> None:
-    with open(REPORT_FOLDERS_PATH, "w", encoding="utf-8") as f:
-        json.dump({"folder_names": sorted(list(set(names)))}, f, ensure_ascii=False, indent=2)
+    storage.save_json(REPORT_FOLDERS_PATH, {"folder_names": sorted(list(set(names)))})
 
 def get_custom_folders_for_reports() -> List[str]:
     return load_report_folder_names()
 
 def create_report_custom_folder(folder_name: str) -> Tuple[bool, str]:
-    if not folder_name or len(folder_name) > 100:
-        return False, "フォルダ名は1文字以上100文字以内で入力してください。"
-    if ".." in folder_name or "/" in folder_name or "\\" in folder_name:
-        return False, "フォルダ名に無効な文字が含まれています。"
-    if not re.match(r'^[a-zA-Z0-9_ -]+$', folder_name):
-        return False, "フォルダ名には英数字、スペース、アンダースコア(_)、ハイフン(-)のみ使用できます。"
-    folder_names = load_report_folder_names()
-    if folder_name in folder_names:
-        return False, f"フォルダ「{folder_name}」は既に存在します。"
-    folder_names.append(folder_name)
-    save_report_folder_names(folder_names)
-    return True, f"フォルダ「{folder_name}」を作成しました。"
+    with storage.locked(REPORT_FOLDERS_PATH):
+        if not folder_name or len(folder_name) > 100:
+            return False, "フォルダ名は1文字以上100文字以内で入力してください。"
+        if ".." in folder_name or "/" in folder_name or "\\" in folder_name:
+            return False, "フォルダ名に無効な文字が含まれています。"
+        if not re.match(r'^[a-zA-Z0-9_ -]+$', folder_name):
+            return False, "フォルダ名には英数字、スペース、アンダースコア(_)、ハイフン(-)のみ使用できます。"
+        folder_names = load_report_folder_names()
+        if folder_name in folder_names:
+            return False, f"フォルダ「{folder_name}」は既に存在します。"
+        folder_names.append(folder_name)
+        save_report_folder_names(folder_names)
+        return True, f"フォルダ「{folder_name}」を作成しました。"
 
 def add_report_reference_to_custom_folder(report_id: int, target_folder_name: str) -> bool:
-    reports = load_posts()
-    report_found_and_updated = False
-    for report in reports:
-        if report.get("id") == report_id:
-            if report.get("custom_folder_name") == target_folder_name: return False
-            references = report.setdefault("referenced_in_custom_folders", [])
-            if target_folder_name not in references:
-                references.append(target_folder_name)
-                report_found_and_updated = True
-            else: return True
-            break
-    if report_found_and_updated:
-        save_posts(reports)
-        return True
-    return False
+    with storage.locked(PRINCIPESSINA_PATH):
+        reports = load_posts()
+        report_found_and_updated = False
+        for report in reports:
+            if report.get("id") == report_id:
+                if report.get("custom_folder_name") == target_folder_name: return False
+                references = report.setdefault("referenced_in_custom_folders", [])
+                if target_folder_name not in references:
+                    references.append(target_folder_name)
+                    report_found_and_updated = True
+                else: return True
+                break
+        if report_found_and_updated:
+            save_posts(reports)
+            return True
+        return bool(_archive.update(report_id, lambda r: _add_reference(r, target_folder_name)))
+
+def _add_reference(report: Dict[str, Any], folder_name: str) -> bool:
+    if report.get("custom_folder_name") == folder_name: return False
+    references = report.setdefault("referenced_in_custom_folders", [])
+    if folder_name not in references: references.append(folder_name)
+    return True
 
 def remove_report_reference_from_custom_folder(report_id: int, target_folder_name: str) -> bool:
-    reports = load_posts()
-    report_found = False; list_modified = False
-    for report in reports:
-        if report.get("id") == report_id:
-            report_found = True
-            references = report.get("referenced_in_custom_folders", [])
-            if target_folder_name in references:
-                references.remove(target_folder_name)
-                list_modified = True
-            break
-    if not report_found: return False
-    if list_modified: save_posts(reports)
+    with storage.locked(PRINCIPESSINA_PATH):
+        reports = load_posts()
+        report_found = False; list_modified = False
+        for report in reports:
+            if report.get("id") == report_id:
+                report_found = True
+                references = report.get("referenced_in_custom_folders", [])
+                if target_folder_name in references:
+                    references.remove(target_folder_name)
+                    list_modified = True
+                break
+        if not report_found:
+            return _archive.update(report_id, lambda r: _remove_reference(r, target_folder_name)) is not None
+        if list_modified: save_posts(reports)
+        return True
+
+def _remove_reference(report: Dict[str, Any], folder_name: str) -> bool:
+    references = report.get("referenced_in_custom_folders", [])
+    if folder_name not in references: return False
+    references.remove(folder_name)
     return True
 
 # --- Decima Media Functions ---
 # (These remain unchanged from previous steps)
 def load_media_entries() -> List[Dict[str, Any]]:
-    if MEDIA_PATH.exists():
-        with open(MEDIA_PATH, "r", encoding="utf-8") as f:
-            try: return json.load(f)
-            except json.JSONDecodeError: return []
-    return []
+    try: return storage.load_json(MEDIA_PATH, [])
+    except json.JSONDecodeError: return []
 
 def save_media_entries(entries: List[Dict[str, Any]]) -> None:
-    with open(MEDIA_PATH, "w", encoding="utf-8") as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
+    storage.save_json(MEDIA_PATH, entries)
 
 def add_media_entry(
     uploader_username: str, media_type: str, original_filename: str,
     server_filepath: str, title: Optional[str] = None,
     custom_folder_name: Optional[str] = None
 ) -> int:
-    entries = load_media_entries()
-    next_id = max((int(e.get("id", 0)) for e in entries), default=0) + 1
-    new_entry = {
-        "id": next_id, "uploader_username": uploader_username, "media_type": media_type,
-        "title": title, "original_filename": original_filename,
-        "server_filepath": server_filepath, "custom_folder_name": custom_folder_name,
-        "upload_timestamp": datetime.now().isoformat(timespec="seconds"),
-        "referenced_in_custom_folders": []
-    }
-    entries.append(new_entry)
-    save_media_entries(entries)
-    return next_id
+    with storage.locked(MEDIA_PATH):
+        entries = load_media_entries()
+        next_id = sequence.next_id(MEDIA_PATH, entries)
+        new_entry = {
+            "id": next_id, "uploader_username": uploader_username, "media_type": media_type,
+            "title": title, "original_filename": original_filename,
+            "server_filepath": server_filepath, "custom_folder_name": custom_folder_name,
+            "upload_timestamp": datetime.now().isoformat(timespec="seconds"),
+            "referenced_in_custom_folders": []
+        }
+        entries.append(new_entry)
+        save_media_entries(entries)
+        return next_id
 
 def get_media_entries(
     media_type: Optional[str] = None,
@@ -246,27 +316,28 @@ def get_media_entries(
     return filtered_entries
 
 def delete_media_entry(media_id: int, base_static_uploads_path: str) -> bool:
-    entries = load_media_entries()
-    original_length = len(entries)
-    entry_to_delete = None
-    for entry in entries:
-        if entry.get("id") == media_id:
-            entry_to_delete = entry
-            break
-    if not entry_to_delete: return False
-    if entry_to_delete.get("server_filepath"):
-        try:
-            full_file_path = os.path.join(base_static_uploads_path, entry_to_delete["server_filepath"])
-            if os.path.exists(full_file_path): os.remove(full_file_path)
-        except Exception: pass
-    new_entries = [e for e in entries if e.get("id") != media_id]
-    if len(new_entries) < original_length:
-        save_media_entries(new_entries)
-        return True
-    if not new_entries and original_length == 1 and entry_to_delete:
-        save_media_entries(new_entries)
-        return True
-    return False
+    with storage.locked(MEDIA_PATH):
+        entries = load_media_entries()
+        original_length = len(entries)
+        entry_to_delete = None
+        for entry in entries:
+            if entry.get("id") == media_id:
+                entry_to_delete = entry
+                break
+        if not entry_to_delete: return False
+        if entry_to_delete.get("server_filepath"):
+            try:
+                full_file_path = os.path.join(base_static_uploads_path, entry_to_delete["server_filepath"])
+                if os.path.exists(full_file_path): os.remove(full_file_path)
+            except Exception: pass
+        new_entries = [e for e in entries if e.get("id") != media_id]
+        if len(new_entries) < original_length:
+            save_media_entries(new_entries)
+            return True
+        if not new_entries and original_length == 1 and entry_to_delete:
+            save_media_entries(new_entries)
+            return True
+        return False
 
 def ensure_media_folder_structure(
     base_principessina_upload_path: str, media_type: str,
@@ -304,33 +375,35 @@ def get_custom_folders(base_principessina_media_type_path: str) -> List[str]:
     except OSError: return []
 
 def add_media_reference_to_custom_folder(media_id: int, target_custom_folder_name: str) -> bool:
-    entries = load_media_entries()
-    entry_found_and_updated = False
-    for entry in entries:
-        if entry.get("id") == media_id:
-            if entry.get("custom_folder_name") == target_custom_folder_name: return False
-            references = entry.setdefault("referenced_in_custom_folders", [])
-            if target_custom_folder_name not in references:
-                references.append(target_custom_folder_name)
-                entry_found_and_updated = True
-            else: return True
-            break
-    if entry_found_and_updated:
-        save_media_entries(entries)
-        return True
-    return False
+    with storage.locked(MEDIA_PATH):
+        entries = load_media_entries()
+        entry_found_and_updated = False
+        for entry in entries:
+            if entry.get("id") == media_id:
+                if entry.get("custom_folder_name") == target_custom_folder_name: return False
+                references = entry.setdefault("referenced_in_custom_folders", [])
+                if target_custom_folder_name not in references:
+                    references.append(target_custom_folder_name)
+                    entry_found_and_updated = True
+                else: return True
+                break
+        if entry_found_and_updated:
+            save_media_entries(entries)
+            return True
+        return False
 
 def remove_media_reference_from_custom_folder(media_id: int, target_custom_folder_name: str) -> bool:
-    entries = load_media_entries()
-    entry_found = False; list_modified = False
-    for entry in entries:
-        if entry.get("id") == media_id:
-            entry_found = True
-            references = entry.get("referenced_in_custom_folders", [])
-            if target_custom_folder_name in references:
-                references.remove(target_custom_folder_name)
-                list_modified = True
-            break
-    if not entry_found: return False
-    if list_modified: save_media_entries(entries)
-    return True
+    with storage.locked(MEDIA_PATH):
+        entries = load_media_entries()
+        entry_found = False; list_modified = False
+        for entry in entries:
+            if entry.get("id") == media_id:
+                entry_found = True
+                references = entry.get("referenced_in_custom_folders", [])
+                if target_custom_folder_name in references:
+                    references.remove(target_custom_folder_name)
+                    list_modified = True
+                break
+        if not entry_found: return False
+        if list_modified: save_media_entries(entries)
+        return True
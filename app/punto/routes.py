@@ -90,9 +90,7 @@ def edit(username: str):
     old_o = points.get(username, {}).get("O", 0)
     form = EditPointsForm(a=old_a, o=old_o, u=old_a - old_o)
     if form.validate_on_submit():
-        points[username] = {"A": form.a.data, "O": form.o.data}
-        utils.save_points(points)
-        utils.log_points_change(username, form.a.data - old_a, form.o.data - old_o)
+        utils.set_user_points(username, form.a.data, form.o.data)
         flash("保存しました")
         return redirect(url_for("punto.dashboard"))
 
@@ -112,12 +110,9 @@ def adjust(username: str, metric: str, delta: int):
         flash("不正な操作です")
         return redirect(url_for("punto.dashboard"))
 
-    points = utils.load_points()
-    current = points.get(username, {"A": 0, "O": 0})
-    current[metric] = current.get(metric, 0) + delta
-    points[username] = current
-    utils.save_points(points)
-    utils.log_points_change(username, delta if metric == "A" else 0, delta if metric == "O" else 0)
+    utils.adjust_user_points(
+        username, delta if metric == "A" else 0, delta if metric == "O" else 0
+    )
     return redirect(url_for("punto.dashboard"))
 
 
@@ -136,12 +131,7 @@ def set_points(username: str):
         flash("数値を入力してください")
         return redirect(url_for("punto.dashboard"))
 
-    points = utils.load_points()
-    old_a = points.get(username, {}).get("A", 0)
-    old_o = points.get(username, {}).get("O", 0)
-    points[username] = {"A": a, "O": o}
-    utils.save_points(points)
-    utils.log_points_change(username, a - old_a, o - old_o)
+    utils.set_user_points(username, a, o)
     flash("保存しました")
     return redirect(url_for("punto.dashboard"))
 
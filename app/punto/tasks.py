@@ -0,0 +1,11 @@
+from app import scheduler
+from app.utils import compact_points_history
+
+
+def compact_history() -> int:
+    """Archive the points history of previous months."""
+
+    return compact_points_history()
+
+
+scheduler.register("punto.compact_history", lambda: compact_history(), day=1, hour=3)
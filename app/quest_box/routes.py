@@ -10,6 +10,7 @@ from flask import (
 )
 from datetime import date
 
+from app import pagination
 from . import bp
 from .forms import QuestForm, RewardForm
 from . import utils
@@ -25,8 +26,8 @@ def require_login():
 @bp.route("/")
 def index():
     user = session.get("user")
-    quests = utils.load_quests()
-    return render_template("quest_list.html", quests=quests, user=user)
+    page = pagination.newest(utils.QUESTS_PATH)
+    return render_template("quest_list.html", quests=page.items, page=page, user=user)
 
 
 @bp.route("/completed")
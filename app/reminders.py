@@ -0,0 +1,213 @@
+"""Indexes answering the reminder jobs' "who has not submitted yet" questions.
+
+Reminder jobs used to compare every user with every entry of a store,
+parsing dates on the way. A :class:`ReminderIndex` instead keeps the sets
+those jobs need ("report types submitted by author and day", "users who
+gave feedback on an entry", ...) derived from one JSON document, so a job
+only takes set differences.
+
+An index is built from the document the first time it is used and
+rebuilt whenever :func:`app.storage.stamp` shows the file changed, e.g.
+after a write by another process. Writers in this process call
+:meth:`ReminderIndex.update` with the change they made, which applies it
+to the index instead of rebuilding it.
+
+Recurring reminders are also kept as explicit pending items with a due
+time (see :func:`schedule`). Writers resolve an item as soon as the
+report or feedback it waits for is saved, and :func:`tick`, run every
+minute by the scheduler, only pops the items that are due. The items live
+in the outbox database ordered by an index on their due time, which plays
+the part of a heap shared by every worker process.
+"""
+
+from contextlib import closing
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from . import outbox, scheduler, storage
+
+T = TypeVar("T")
+
+
+class ReminderIndex(Generic[T]):
+    """Sets derived by ``build`` from the document at ``path()``.
+
+    ``path`` is called on every access so modules can keep their path in a
+    module-level constant that tests rebind. The returned sets are shared
+    and must be treated as read-only.
+    """
+
+    def __init__(self, path: Callable[[], storage.PathLike], build: Callable[[Any], T], default: Any = None) -> None:
+        self._path = path
+        self._build = build
+        self._default = [] if default is None else default
+        self._lock = threading.Lock()
+        self._version: Optional[Tuple[str, Any]] = None
+        self._data: Optional[T] = None
+
+    def _current(self) -> Tuple[str, Any]:
+        path = self._path()
+        return os.path.abspath(os.fspath(path)), storage.stamp(path)
+
+    def get(self) -> T:
+        """Return the index of the document as it is on disk."""
+
+        version = self._current()
+        with self._lock:
+            if self._data is None or self._version != version:
+                # The stamp is taken before reading, so a write racing with
+                # the read only causes one more rebuild later
+                self._data = self._build(storage.read_json(version[0], self._default))
+                self._version = version
+            return self._data
+
+    def stamp(self) -> Tuple[str, Any]:
+        """Return the document version to pass to :meth:`update` after a write."""
+
+        return self._current()
+
+    def update(self, before: Tuple[str, Any], apply: Optional[Callable[[T], None]] = None) -> None:
+        """Record a write made to the document while it was at version ``before``.
+
+        Call it while holding :func:`app.storage.locked` on the document,
+        after the write. ``apply`` changes the index the same way the write
+        changed the document; without it the index is rebuilt on next use.
+        """
+
+        with self._lock:
+            if self._data is None or self._version != before or apply is None:
+                self._data = self._version = None
+                return
+            apply(self._data)
+            self._version = self._current()
+
+
+def add_to(key: str, entry_id: Any, value: Any) -> Callable[[Dict[Any, Dict[str, Any]]], None]:
+    """Return an update adding ``value`` to the set ``key`` of indexed entry ``entry_id``."""
+
+    def apply(index: Dict[Any, Dict[str, Any]]) -> None:
+        record = index.get(entry_id)
+        if record is not None:
+            record[key].add(value)
+
+    return apply
+
+
+def drop(entry_id: Any) -> Callable[[Dict[Any, Dict[str, Any]]], None]:
+    """Return an update removing entry ``entry_id`` from the index."""
+
+    return lambda index: index.pop(entry_id, None)
+
+
+# --- Pending reminder items ---
+
+RETRY_DELAY = 300.0  # seconds before the items of a failed handler are due again
+
+# Handlers receive the due items of their kind as ``(key, due)`` pairs and
+# the current time; they may :func:`schedule` the next reminder of an item.
+_handlers: Dict[str, Callable[[List[Tuple[str, float]], float], None]] = {}
+
+
+def _connect() -> sqlite3.Connection:
+    conn = outbox.connect()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS reminder ("
+        " kind TEXT NOT NULL,"
+        " key TEXT NOT NULL,"
+        " due REAL NOT NULL,"
+        " PRIMARY KEY (kind, key))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS reminder_due ON reminder (due)")
+    return conn
+
+
+def register(kind: str, handler: Callable[[List[Tuple[str, float]], float], None]) -> None:
+    """Send the reminders of ``kind`` with ``handler`` when they are due."""
+
+    _handlers[kind] = handler
+
+
+def schedule(kind: str, key: str, due: float, replace: bool = True) -> None:
+    """Make the item ``key`` of ``kind`` due at ``due`` (a timestamp).
+
+    With ``replace=False`` an item that is already pending keeps its time.
+    """
+
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    with closing(_connect()) as conn:
+        conn.execute(f"{verb} INTO reminder (kind, key, due) VALUES (?, ?, ?)", (kind, key, due))
+
+
+def resolve(kind: str, key: str, prefix: bool = False) -> int:
+    """Drop the pending item ``key`` (every key starting with it with ``prefix``).
+
+    Returns the number of items dropped.
+    """
+
+    with closing(_connect()) as conn:
+        if prefix:
+            cur = conn.execute(
+                "DELETE FROM reminder WHERE kind = ? AND key >= ? AND key < ?", (kind, key, key + "\uffff")
+            )
+        else:
+            cur = conn.execute("DELETE FROM reminder WHERE kind = ? AND key = ?", (kind, key))
+        return cur.rowcount
+
+
+def pending(kind: str) -> List[Tuple[str, float]]:
+    """Return the pending items of ``kind`` as ``(key, due)``, soonest first."""
+
+    with closing(_connect()) as conn:
+        return [tuple(r) for r in conn.execute("SELECT key, due FROM reminder WHERE kind = ? ORDER BY due, key", (kind,))]
+
+
+def pop_due(now: Optional[float] = None) -> Dict[str, List[Tuple[str, float]]]:
+    """Remove and return the items due at ``now`` by kind."""
+
+    now = time.time() if now is None else now
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT kind, key, due FROM reminder WHERE due <= ? ORDER BY due, kind, key", (now,)
+            ).fetchall()
+            conn.executemany("DELETE FROM reminder WHERE kind = ? AND key = ?", [(r[0], r[1]) for r in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    due: Dict[str, List[Tuple[str, float]]] = {}
+    for kind, key, when in rows:
+        due.setdefault(kind, []).append((key, when))
+    return due
+
+
+def tick(now: Optional[float] = None) -> int:
+    """Hand the due items to their handlers and return how many there were.
+
+    Items of a kind without a handler in this process are put back.
+    """
+
+    now = time.time() if now is None else now
+    count = 0
+    for kind, items in pop_due(now).items():
+        handler = _handlers.get(kind)
+        if handler is None:
+            for key, due in items:
+                schedule(kind, key, due, replace=False)
+            continue
+        count += len(items)
+        try:
+            handler(items, now)
+        except Exception as exc:
+            print(f"Reminder handler {kind} failed: {exc}")
+            for key, _ in items:
+                schedule(kind, key, now + RETRY_DELAY, replace=False)
+    return count
+
+
+# Every minute; a tick without due items only runs one indexed query
+scheduler.register("reminders.tick", lambda: tick(), ledger=False, minute="*")
@@ -4,21 +4,14 @@
 from typing import List, Tuple, Dict
 from datetime import date, timedelta
 
-try:
-    from apscheduler.schedulers.background import BackgroundScheduler  # pragma: no cover - optional
-except Exception:  # pragma: no cover - optional dependency
-    BackgroundScheduler = None  # type: ignore
-
 import config
+from app import scheduler
 from app.utils import send_email
 from app import utils as post_utils
 from app.calendario import utils as calendario_utils
 from . import utils as res_utils
 
 
-scheduler = BackgroundScheduler() if BackgroundScheduler else None  # type: ignore
-
-
 def collect_post_stats() -> Tuple[List[Tuple[str, int]], Dict[str, int]]:
     """Aggregate post statistics.
 
@@ -158,18 +151,9 @@ def remind_missing_reports(target: date = date.today() - timedelta(days=1)) -> L
     return notified
 
 
-def start_scheduler() -> None:
-    """Start APScheduler to run the daily job at 4 AM."""
-
-    if scheduler is None:
-        return
-
-    if not scheduler.get_jobs():
-        scheduler.add_job(lambda: daily_post_job(), "cron", hour=4)
-        scheduler.add_job(lambda: daily_report_job(), "cron", hour=4, minute=5)
-        scheduler.add_job(lambda: evaluate_daily_reports(date.today()), "cron", hour=4, minute=10)
-        scheduler.add_job(lambda: evaluate_monthly_reports(date.today()), "cron", hour=4, minute=15)
-        scheduler.add_job(lambda: remind_missing_reports(), "cron", hour="1-5")
-        scheduler.start()
-
-
+# Jobs run by the central scheduler (see app.scheduler)
+scheduler.register("resoconto.daily_posts", lambda: daily_post_job(), hour=4)
+scheduler.register("resoconto.daily_reports", lambda: daily_report_job(), hour=4, minute=5)
+scheduler.register("resoconto.evaluate_daily", lambda: evaluate_daily_reports(date.today()), hour=4, minute=10)
+scheduler.register("resoconto.evaluate_monthly", lambda: evaluate_monthly_reports(date.today()), hour=4, minute=15)
+scheduler.register("resoconto.missing_reports", lambda: remind_missing_reports(), hour="1-5")
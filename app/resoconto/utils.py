@@ -1,43 +1,39 @@
-import json
 from datetime import datetime, date, timedelta
 from pathlib import Path
 from typing import Optional, List, Tuple, Dict
 import csv
 
 import config
+from app import search, sequence, storage
 
 REPORTS_PATH = Path(getattr(config, "RESOCONTO_FILE", "resoconto.json"))
 CLAUDE_REPORTS_PATH = Path(getattr(config, "CLAUDE_REPORTS_FILE", "claude_reports.json"))
 
+SEARCH_FIELDS = ("body", "work", "issue", "success", "failure", "claude_summary")
+_search = search.SearchIndex.for_file("resoconto", lambda: REPORTS_PATH, SEARCH_FIELDS)
+
 
 def load_reports():
-    if REPORTS_PATH.exists():
-        with open(REPORTS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load_json(REPORTS_PATH, [])
 
 
 def save_reports(reports):
-    with open(REPORTS_PATH, "w", encoding="utf-8") as f:
-        json.dump(reports, f, ensure_ascii=False, indent=2)
+    storage.save_json(REPORTS_PATH, reports)
 
 
 def load_claude_reports() -> List[Dict[str, object]]:
-    if CLAUDE_REPORTS_PATH.exists():
-        with open(CLAUDE_REPORTS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load_json(CLAUDE_REPORTS_PATH, [])
 
 
 def save_claude_reports(entries: List[Dict[str, object]]) -> None:
-    with open(CLAUDE_REPORTS_PATH, "w", encoding="utf-8") as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
+    storage.save_json(CLAUDE_REPORTS_PATH, entries)
 
 
 def add_claude_entry(entry: Dict[str, object]) -> None:
-    data = load_claude_reports()
-    data.append(entry)
-    save_claude_reports(data)
+    with storage.locked(CLAUDE_REPORTS_PATH):
+        data = load_claude_reports()
+        data.append(entry)
+        save_claude_reports(data)
 
 
 def add_report(
@@ -53,43 +49,46 @@ def add_report(
 ) -> int:
     """Add a work report and return its ID."""
 
-    reports = load_reports()
-    next_id = max((r.get("id", 0) for r in reports), default=0) + 1
-    reports.append(
-        {
-            "id": next_id,
-            "author": author,
-            "date": report_date.isoformat(),
-            "body": body,
-            "work": work,
-            "issue": issue,
-            "success": success,
-            "failure": failure,
-            "claude_summary": claude_summary,
-            "timestamp": datetime.now().isoformat(timespec="seconds"),
-        }
-    )
-    save_reports(reports)
-    return next_id
+    with storage.locked(REPORTS_PATH):
+        reports = load_reports()
+        next_id = sequence.next_id(REPORTS_PATH, reports)
+        reports.append(
+            {
+                "id": next_id,
+                "author": author,
+                "date": report_date.isoformat(),
+                "body": body,
+                "work": work,
+                "issue": issue,
+                "success": success,
+                "failure": failure,
+                "claude_summary": claude_summary,
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+            }
+        )
+        save_reports(reports)
+        return next_id
 
 
 def delete_report(report_id: int) -> bool:
-    reports = load_reports()
-    new_reports = [r for r in reports if r.get("id") != report_id]
-    if len(new_reports) == len(reports):
-        return False
-    save_reports(new_reports)
-    return True
+    with storage.locked(REPORTS_PATH):
+        reports = load_reports()
+        new_reports = [r for r in reports if r.get("id") != report_id]
+        if len(new_reports) == len(reports):
+            return False
+        save_reports(new_reports)
+        return True
 
 
 def filter_reports(
     author: str = "",
     start: Optional[date] = None,
     end: Optional[date] = None,
+    keyword: str = "",
 ) -> List[Dict[str, str]]:
-    """Return reports filtered by author and date range."""
+    """Return reports filtered by author, date range and keyword."""
 
-    reports = load_reports()
+    reports = _search.matches(keyword) if keyword else load_reports()
     results: List[Dict[str, str]] = []
     for r in reports:
         if author and r.get("author") != author:
@@ -0,0 +1,12 @@
+"""Blueprint for the search across every board."""
+
+from flask import Blueprint
+
+bp = Blueprint(
+    "ricerca",
+    __name__,
+    url_prefix="/ricerca",
+    template_folder="templates/ricerca",
+)
+
+from . import routes  # noqa: E402
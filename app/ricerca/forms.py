@@ -0,0 +1,12 @@
+"""Forms for Ricerca blueprint."""
+
+from flask_wtf import FlaskForm
+from wtforms import StringField, SubmitField
+from wtforms.validators import Optional
+
+
+class SearchForm(FlaskForm):
+    """Form to search every board."""
+
+    q = StringField("検索語", validators=[Optional()])
+    submit = SubmitField("検索")
@@ -0,0 +1,126 @@
+"""Routes for Ricerca blueprint."""
+
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+from flask import render_template, session, redirect, url_for, request
+
+from . import bp
+from .forms import SearchForm
+from app import search
+
+PAGE_SIZE = 20
+
+# Module labels shown as facets, in display order
+MODULES = {
+    "posts": "投稿",
+    "corso": "Corso",
+    "intrattenimento": "Intrattenimento",
+    "monsignore": "Monsignore",
+    "principessina": "Principessina",
+    "seminario": "Seminario",
+    "resoconto": "Resoconto",
+    "quest_box": "Quest Box",
+}
+
+
+# Page showing the records of each index, with the URL argument taking the record ID
+LINKS = {
+    "posts": ("posts.index", None),
+    "comments": ("posts.index", None),
+    "corso": ("corso.detail", "post_id"),
+    "corso_archive": ("corso.detail", "post_id"),
+    "intrattenimento": ("intrattenimento.detail", "post_id"),
+    "intrattenimento_tasks": ("intrattenimento.tasks", None),
+    "intrattenimento_tasks_archive": ("intrattenimento.task_completed", None),
+    "monsignore": ("monsignore.index", None),
+    "monsignore_kadai": ("monsignore.kadai_list", None),
+    "monsignore_kadai_archive": ("monsignore.archive_list", None),
+    "principessina": ("principessina.passato_top", None),
+    "principessina_archive": ("principessina.passato_top", None),
+    "seminario": ("seminario.index", None),
+    "seminario_archive": ("seminario.completed_list", None),
+    "resoconto": ("resoconto.index", None),
+    "quest_box": ("quest_box.detail", "quest_id"),
+}
+
+
+def _not_expired(record: Dict[str, Any]) -> bool:
+    end_date = record.get("end_date")
+    if not end_date:
+        return True
+    try:
+        return datetime.fromisoformat(end_date) >= datetime.now()
+    except ValueError:
+        return True
+
+
+def _visibility(user: Dict[str, Any]) -> Dict[str, Callable[[Dict[str, Any]], bool]]:
+    """Return the records of each index ``user`` may see, as on the boards themselves."""
+
+    if user.get("role") == "admin":
+        return {}
+    username = user.get("username")
+    return {
+        # Non-admins only see their own reports
+        "resoconto": lambda r: r.get("author") == username,
+        # Expired and archived posts are only listed for admins
+        "corso": _not_expired,
+        "corso_archive": lambda r: False,
+        "intrattenimento": _not_expired,
+    }
+
+
+def _link(index: str, record: Dict[str, Any]) -> str:
+    """Return the page showing ``record`` of ``index``."""
+
+    endpoint, argument = LINKS.get(index, ("index", None))
+    if argument is None:
+        return url_for(endpoint)
+    return url_for(endpoint, **{argument: record.get("id")})
+
+
+@bp.before_request
+def require_login():
+    if "user" not in session:
+        return redirect(url_for("auth.login", next=request.url))
+
+
+@bp.route("/")
+def index():
+    """Search every board, one page at a time."""
+
+    user = session.get("user")
+    form = SearchForm(request.args)
+    query = form.q.data or ""
+    selected = [m for m in request.args.getlist("module") if m in MODULES]
+    page = search.search_all(
+        query,
+        modules=selected or list(MODULES),
+        cursor=request.args.get("cursor"),
+        limit=PAGE_SIZE,
+        visible=_visibility(user),
+    )
+    indexes = search.indexes()
+    results = []
+    for item in page.items:
+        index = indexes[item["index"]]
+        results.append(
+            {
+                "module": MODULES.get(item["module"], item["module"]),
+                "record": item["record"],
+                "snippet": search.snippet(item["record"], index.fields, query),
+                "url": _link(item["index"], item["record"]),
+            }
+        )
+    facets = [(name, label, page.facets.get(name, 0)) for name, label in MODULES.items()]
+    return render_template(
+        "search_results.html",
+        form=form,
+        query=query,
+        selected=selected,
+        results=results,
+        facets=facets,
+        next_cursor=page.next_cursor,
+        user=user,
+    )
@@ -1,8 +1,8 @@
-import json
 from pathlib import Path
 from datetime import datetime
 
 import config
+from app import sequence, storage
 from app.utils import send_email
 
 SCATOLA_PATH = Path(getattr(config, "SCATOLA_FILE", "scatola_capriccio.json"))
@@ -10,54 +10,48 @@ SURVEYS_PATH = Path(getattr(config, "SCATOLA_SURVEY_FILE", "scatola_surveys.json
 
 
 def load_posts():
-    if SCATOLA_PATH.exists():
-        with open(SCATOLA_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load_json(SCATOLA_PATH, [])
 
 
 def save_posts(posts):
-    with open(SCATOLA_PATH, "w", encoding="utf-8") as f:
-        json.dump(posts, f, ensure_ascii=False, indent=2)
+    storage.save_json(SCATOLA_PATH, posts)
 
 
 def add_post(author, body):
-    posts = load_posts()
-    next_id = max((p.get("id", 0) for p in posts), default=0) + 1
-    posts.append({
-        "id": next_id,
-        "author": author,
-        "body": body,
-        "timestamp": datetime.now().isoformat(timespec="seconds"),
-    })
-    save_posts(posts)
+    with storage.locked(SCATOLA_PATH):
+        posts = load_posts()
+        next_id = sequence.next_id(SCATOLA_PATH, posts)
+        posts.append({
+            "id": next_id,
+            "author": author,
+            "body": body,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        })
+        save_posts(posts)
 
 
 def load_surveys():
-    if SURVEYS_PATH.exists():
-        with open(SURVEYS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load_json(SURVEYS_PATH, [])
 
 
 def save_surveys(surveys):
-    with open(SURVEYS_PATH, "w", encoding="utf-8") as f:
-        json.dump(surveys, f, ensure_ascii=False, indent=2)
+    storage.save_json(SURVEYS_PATH, surveys)
 
 
 def add_survey(author: str, question: str, targets: list) -> None:
-    surveys = load_surveys()
-    next_id = max((s.get("id", 0) for s in surveys), default=0) + 1
-    surveys.append(
-        {
-            "id": next_id,
-            "author": author,
-            "question": question,
-            "targets": targets,
-            "timestamp": datetime.now().isoformat(timespec="seconds"),
-        }
-    )
-    save_surveys(surveys)
+    with storage.locked(SURVEYS_PATH):
+        surveys = load_surveys()
+        next_id = sequence.next_id(SURVEYS_PATH, surveys)
+        surveys.append(
+            {
+                "id": next_id,
+                "author": author,
+                "question": question,
+                "targets": targets,
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+            }
+        )
+        save_surveys(surveys)
 
     for t in targets:
         info = config.USERS.get(t)
@@ -0,0 +1,308 @@
+"""Central registry of the periodic jobs and the process running them.
+
+Modules register their jobs with :func:`register`, usually at import
+time of their ``tasks`` module. :func:`start` loads every module listed in
+``TASK_MODULES`` and takes part in an election among the processes
+serving the application (e.g. the gunicorn workers): the process holding
+an exclusive lock on ``config.SCHEDULER_LOCK_FILE`` runs every job on a
+single APScheduler instance, the others retry the lock every
+``ELECTION_INTERVAL`` seconds. The operating system releases the lock
+when the leader exits or dies, so another process takes over and each
+job keeps running exactly once.
+
+Every run is recorded in a ledger (``config.JOB_LEDGER_FILE``) with the
+time of the last success. When a process becomes leader it compares the
+ledger with each job's schedule and runs once, right away, every job that
+missed one or more runs while no scheduler was running (e.g. during a
+deploy). Jobs can also keep small pieces of state in the ledger with
+:func:`set_job_state` so they survive a restart.
+"""
+
+from datetime import datetime, timedelta
+import importlib
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+try:  # pragma: no cover - optional dependency
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+except Exception:  # pragma: no cover - optional dependency
+    BackgroundScheduler = None  # type: ignore
+    CronTrigger = None  # type: ignore
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+    import msvcrt
+
+import config
+
+from . import storage
+
+ELECTION_INTERVAL = 15.0  # seconds between attempts to become the leader
+MISFIRE_GRACE_TIME = 3600  # seconds a late run is still started on schedule
+
+# Modules whose import registers jobs
+TASK_MODULES = (
+    "app.resoconto.tasks",
+    "app.intrattenimento.tasks",
+    "app.Seminario.tasks",
+    "app.principessina.tasks",
+    "app.corso.tasks",
+    "app.punto.tasks",
+    "app.monsignore.tasks",
+    "app.reminders",
+    "app.tiering",
+)
+
+_jobs: Dict[str, Tuple[Callable[[], Any], Dict[str, Any]]] = {}
+_unrecorded: Set[str] = set()
+
+_elector: Optional[threading.Thread] = None
+_stop = threading.Event()
+_scheduler = None
+_lock: Optional["LeaderLock"] = None
+
+
+def register(job_id: str, func: Callable[[], Any], ledger: bool = True, **cron: Any) -> None:
+    """Run ``func`` on the cron schedule ``cron`` (APScheduler fields).
+
+    Registering the same ``job_id`` again replaces the job. Jobs with
+    ``ledger=False`` (frequent ones that have nothing to catch up) are not
+    recorded in the ledger.
+    """
+
+    _jobs[job_id] = (func, cron)
+    if ledger:
+        _unrecorded.discard(job_id)
+    else:
+        _unrecorded.add(job_id)
+
+
+def jobs() -> Dict[str, Dict[str, Any]]:
+    """Return the cron fields of every registered job by ID."""
+
+    return {job_id: dict(cron) for job_id, (_, cron) in _jobs.items()}
+
+
+def ledger_path() -> str:
+    return getattr(config, "JOB_LEDGER_FILE", "job_runs.json")
+
+
+def ledger() -> Dict[str, Dict[str, Any]]:
+    """Return the recorded runs by job ID.
+
+    Each entry has ``since`` (when the job was first scheduled),
+    ``last_run``, ``last_success``, ``last_error`` and ``state``.
+    """
+
+    return storage.read_json(ledger_path(), {})
+
+
+def _update_entry(job_id: str, **values: Any) -> None:
+    path = ledger_path()
+    with storage.locked(path):
+        data = storage.load_json(path, {})
+        entry = dict(data.get(job_id, {}))
+        entry.update(values)
+        data[job_id] = entry
+        storage.save_json(path, data)
+
+
+def job_state(job_id: str) -> Dict[str, Any]:
+    """Return the state ``job_id`` stored with :func:`set_job_state`."""
+
+    return dict(ledger().get(job_id, {}).get("state", {}))
+
+
+def set_job_state(job_id: str, **values: Any) -> None:
+    """Store ``values`` in the state of ``job_id``, kept across restarts."""
+
+    path = ledger_path()
+    with storage.locked(path):
+        state = job_state(job_id)
+        state.update(values)
+        _update_entry(job_id, state=state)
+
+
+def run_job(job_id: str) -> bool:
+    """Run the job ``job_id`` now and record the outcome in the ledger.
+
+    Returns whether it succeeded; errors are recorded, not raised.
+    """
+
+    func = _jobs[job_id][0]
+    if job_id in _unrecorded:
+        func()
+        return True
+    started = datetime.now().isoformat()
+    try:
+        func()
+    except Exception as exc:
+        print(f"Scheduled job {job_id} failed: {exc}")
+        _update_entry(job_id, last_run=started, last_error=repr(exc))
+        return False
+    _update_entry(job_id, last_run=started, last_success=started, last_error=None)
+    return True
+
+
+def _next_fire(cron: Dict[str, Any], after: datetime) -> Optional[datetime]:
+    """Return the first time after ``after`` matching ``cron`` (naive local times)."""
+
+    trigger = CronTrigger(**cron)
+    after = after.astimezone(trigger.timezone) + timedelta(microseconds=1)
+    fire = trigger.get_next_fire_time(None, after)
+    return None if fire is None else fire.astimezone().replace(tzinfo=None)
+
+
+def missed_jobs(now: Optional[datetime] = None) -> List[str]:
+    """Return the IDs of the jobs that were due since their last success.
+
+    A job seen for the first time is recorded as scheduled from ``now``
+    instead of being reported.
+    """
+
+    now = datetime.now() if now is None else now
+    entries = ledger()
+    missed: List[str] = []
+    for job_id, (_, cron) in _jobs.items():
+        if job_id in _unrecorded:
+            continue
+        entry = entries.get(job_id)
+        if entry is None:
+            _update_entry(job_id, since=now.isoformat())
+            continue
+        last = entry.get("last_success") or entry.get("since")
+        if last is None:
+            continue
+        fire = _next_fire(cron, datetime.fromisoformat(last))
+        if fire is not None and fire <= now:
+            missed.append(job_id)
+    return missed
+
+
+class LeaderLock:
+    """Exclusive, non-blocking lock on a file shared by the processes."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fh = None
+
+    @property
+    def held(self) -> bool:
+        return self._fh is not None
+
+    def acquire(self) -> bool:
+        """Take the lock if no other holder has it; return whether it is held."""
+
+        if self._fh is not None:
+            return True
+        fh = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:  # pragma: no cover - Windows
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fh.close()
+            return False
+        # The PID of the leader, for operators
+        fh.seek(0)
+        fh.truncate()
+        fh.write(f"{os.getpid()}\n")
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        fh, self._fh = self._fh, None
+        if fh is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:  # pragma: no cover - Windows
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            fh.close()
+
+
+def load_task_modules() -> None:
+    """Import the modules in ``TASK_MODULES`` so their jobs are registered."""
+
+    for name in TASK_MODULES:
+        importlib.import_module(name)
+
+
+def is_leader() -> bool:
+    """Return True when this process runs the jobs."""
+
+    return _scheduler is not None
+
+
+def _lead() -> None:
+    global _scheduler
+    scheduler = BackgroundScheduler()
+    for job_id, (_, cron) in _jobs.items():
+        scheduler.add_job(
+            run_job, "cron", args=(job_id,), id=job_id, replace_existing=True,
+            coalesce=True, misfire_grace_time=MISFIRE_GRACE_TIME, **cron,
+        )
+    # One catch-up run per job, however many runs were missed
+    for job_id in missed_jobs():
+        scheduler.add_job(run_job, args=(job_id,), id=f"{job_id}.catch_up", replace_existing=True)
+    scheduler.start()
+    _scheduler = scheduler
+
+
+def _elect(interval: float) -> None:
+    while True:
+        try:
+            if _lock.acquire():
+                _lead()
+                return
+        except Exception as exc:  # pragma: no cover - file system errors
+            print(f"Scheduler election error: {exc}")
+        if _stop.wait(interval):
+            return
+
+
+def start(interval: Optional[float] = None) -> bool:
+    """Register the jobs of ``TASK_MODULES`` and run them if elected leader.
+
+    Returns False when APScheduler is not installed. Calling it again while
+    started does nothing.
+    """
+
+    global _elector, _lock
+    if BackgroundScheduler is None:
+        return False
+    if _elector is not None:
+        return True
+    load_task_modules()
+    _stop.clear()
+    _lock = LeaderLock(getattr(config, "SCHEDULER_LOCK_FILE", "scheduler.lock"))
+    interval = getattr(config, "SCHEDULER_ELECTION_INTERVAL", ELECTION_INTERVAL) if interval is None else interval
+    _elector = threading.Thread(target=_elect, args=(interval,), name="scheduler-election", daemon=True)
+    _elector.start()
+    return True
+
+
+def stop() -> None:
+    """Stop running jobs and hand the leadership to another process."""
+
+    global _elector, _scheduler, _lock
+    _stop.set()
+    if _elector is not None:
+        _elector.join(5)
+        _elector = None
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+    if _lock is not None:
+        _lock.release()
+        _lock = None
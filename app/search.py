@@ -0,0 +1,433 @@
+"""N-gram inverted indexes for the keyword searches of the boards.
+
+Keyword filters used to lowercase every record of a store and test the
+keyword as a substring, on every query. A :class:`SearchIndex` instead
+keeps, for the text fields of a store, an inverted index from character
+n-grams (single characters and bigrams) to the records containing them.
+N-grams need no word segmentation, so Japanese text is searched as
+reliably as space separated text.
+
+A query is split on whitespace into terms which must all match. The
+records holding every n-gram of every term are taken from the index and
+only those candidates are checked with a substring test, so results are
+the same as a scan but the cost follows the number of matches rather
+than the size of the store. Text is compared after NFKC normalisation and
+case folding, so full-width and half-width forms match each other.
+
+Every index is registered by name and belongs to a module (its
+``group``); :func:`search_all` answers a query over every registered index
+at once, with the number of matches per module and cursor pagination.
+
+Indexes follow their store: whenever the version of the source changes
+(for JSON files the :func:`app.storage.stamp` of the file) the records
+are read again and diffed by ID against the indexed field values; only
+new, changed or removed records are normalised and their postings
+updated, which keeps writers, including other worker processes, unaware
+of the index. Indexes of a cold archive (:meth:`SearchIndex.for_archive`)
+only read the period files that changed.
+"""
+
+import base64
+import binascii
+import json
+import os
+import threading
+import unicodedata
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from . import storage
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from . import tiering
+
+Record = Dict[str, Any]
+
+_indexes: Dict[str, "SearchIndex"] = {}
+
+
+def normalize(text: Any) -> str:
+    """Return ``text`` in the form it is indexed and searched in."""
+
+    return unicodedata.normalize("NFKC", str(text or "")).casefold()
+
+
+def terms(query: str) -> List[str]:
+    """Return the normalised terms of ``query``."""
+
+    return normalize(query).split()
+
+
+def _grams(text: str) -> Set[str]:
+    """Return the characters and bigrams of ``text`` that contain no whitespace."""
+
+    grams: Set[str] = set()
+    previous = ""
+    for char in text:
+        if char.isspace():
+            previous = ""
+            continue
+        grams.add(char)
+        if previous:
+            grams.add(previous + char)
+        previous = char
+    return grams
+
+
+def _term_grams(term: str) -> Set[str]:
+    # A bigram of the term implies both of its characters
+    if len(term) == 1:
+        return {term}
+    return {term[i:i + 2] for i in range(len(term) - 1)}
+
+
+class SearchPage(NamedTuple):
+    """One page of ranked results and the number of matching records."""
+
+    items: List[Record]
+    total: int
+
+
+class SearchIndex:
+    """Inverted index of ``fields`` over the records returned by ``records()``.
+
+    ``version()`` must change whenever the records may have changed. Both
+    are called on every search so modules can keep their paths in
+    module-level constants that tests rebind. Records are keyed by their
+    ``id``. ``group`` names the module the records belong to in
+    :func:`search_all` (``name`` by default).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        records: Callable[[], Iterable[Record]],
+        version: Callable[[], Any],
+        fields: Iterable[str],
+        group: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.group = group or name
+        self.fields = tuple(fields)
+        self._records_of = records
+        self._version_of = version
+        self._lock = threading.Lock()
+        self._version: Any = None
+        self._loaded = False
+        self._texts: Dict[Any, str] = {}
+        self._raw: Dict[Any, Tuple[Any, ...]] = {}
+        self._records: Dict[Any, Record] = {}
+        self._order: Dict[Any, int] = {}
+        self._postings: Dict[str, Set[Any]] = {}
+        _indexes[name] = self
+
+    @classmethod
+    def for_file(
+        cls, name: str, path: Callable[[], storage.PathLike], fields: Iterable[str], group: Optional[str] = None
+    ) -> "SearchIndex":
+        """Return an index of the JSON list stored at ``path()``."""
+
+        return cls(name, lambda: _read_list(path()), lambda: file_version(path()), fields, group)
+
+    @classmethod
+    def for_archive(
+        cls, name: str, archive: "tiering.ColdArchive", fields: Iterable[str], group: Optional[str] = None
+    ) -> "SearchIndex":
+        """Return an index of the records of a cold archive."""
+
+        return _ArchiveIndex(name, archive, fields, group)
+
+    def _text(self, record: Record) -> str:
+        return "\n".join(normalize(record.get(field)) for field in self.fields)
+
+    def _add(self, key: Any, text: str) -> None:
+        for gram in _grams(text):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, key: Any, text: str) -> None:
+        for gram in _grams(text):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _index(self, key: Any, record: Record) -> None:
+        """Index ``record`` under ``key`` unless its indexed fields are unchanged."""
+
+        raw = tuple(record.get(field) for field in self.fields)
+        if key in self._raw and self._raw[key] == raw:
+            return
+        text = self._text(record)
+        old = self._texts.get(key)
+        if old is not None:
+            self._remove(key, old)
+        self._add(key, text)
+        self._texts[key], self._raw[key] = text, raw
+
+    def _discard(self, key: Any) -> None:
+        text = self._texts.pop(key, None)
+        if text is not None:
+            self._remove(key, text)
+        self._raw.pop(key, None)
+
+    def refresh(self) -> None:
+        """Bring the index up to date with the records."""
+
+        version = self._version_of()
+        with self._lock:
+            if self._loaded and version == self._version:
+                return
+            records: Dict[Any, Record] = {}
+            order: Dict[Any, int] = {}
+            for position, record in enumerate(self._records_of()):
+                key = record.get("id", ("position", position))
+                records[key] = record
+                order[key] = position
+            for key in [k for k in self._texts if k not in records]:
+                self._discard(key)
+            for key, record in records.items():
+                self._index(key, record)
+            self._records, self._order = records, order
+            self._version, self._loaded = version, True
+
+    def _matching(self, query: str) -> List[Tuple[Any, int]]:
+        """Return ``(key, score)`` of the records matching ``query``, unordered."""
+
+        self.refresh()
+        query_terms = terms(query)
+        with self._lock:
+            if not query_terms:
+                return [(key, 0) for key in self._records]
+            candidates: Optional[Set[Any]] = None
+            for gram in set().union(*(_term_grams(t) for t in query_terms)):
+                keys = self._postings.get(gram, set())
+                candidates = set(keys) if candidates is None else candidates & keys
+                if not candidates:
+                    return []
+            results = []
+            for key in candidates or ():
+                text = self._texts[key]
+                if all(t in text for t in query_terms):
+                    results.append((key, sum(text.count(t) for t in query_terms)))
+            return results
+
+    def matching_ids(self, query: str) -> Set[Any]:
+        """Return the IDs of the records matching ``query``."""
+
+        return {key for key, _ in self._matching(query)}
+
+    def matches(self, query: str) -> List[Record]:
+        """Return copies of the records matching ``query`` in store order."""
+
+        matched = self._matching(query)
+        with self._lock:
+            # Records dropped by a refresh since the match are skipped
+            keys = sorted((key for key, _ in matched if key in self._records), key=self._order.__getitem__)
+            return [dict(self._records[key]) for key in keys]
+
+    def search(
+        self,
+        query: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        where: Optional[Callable[[Record], bool]] = None,
+    ) -> SearchPage:
+        """Return the records matching ``query``, best first.
+
+        Records where the terms occur more often rank higher, then later
+        records of the store. ``where`` filters the records before paging.
+        """
+
+        matched = self._matching(query)
+        with self._lock:
+            matched = [
+                (key, score) for key, score in matched
+                if key in self._records and (where is None or where(self._records[key]))
+            ]
+            matched.sort(key=lambda item: (-item[1], -self._order[item[0]]))
+            page = matched[offset:] if limit is None else matched[offset:offset + limit]
+            return SearchPage([dict(self._records[key]) for key, _ in page], len(matched))
+
+
+    def hits(self, query: str) -> List[Tuple[int, int, Record]]:
+        """Return ``(rank, score, record)`` for the records matching ``query``.
+
+        ``rank`` is the record's ID when it is an integer, else its
+        position. The records are shared and must be treated as read-only.
+        """
+
+        matched = self._matching(query)
+        with self._lock:
+            return [
+                (key if isinstance(key, int) else self._order[key], score, self._records[key])
+                for key, score in matched if key in self._records
+            ]
+
+
+class _ArchiveIndex(SearchIndex):
+    """Index of a cold archive refreshed one period file at a time.
+
+    Moving records to the archive rewrites only a few period files, so
+    only those are read again; records keep their ID as their rank.
+    """
+
+    def __init__(
+        self, name: str, archive: "tiering.ColdArchive", fields: Iterable[str], group: Optional[str] = None
+    ) -> None:
+        super().__init__(
+            name, archive.iter_records, lambda: (archive.directory(), archive.version()), fields, group
+        )
+        self._archive = archive
+        # Keys of the records read from each period file, by file version
+        self._files: Dict[str, Tuple[Any, List[Any]]] = {}
+
+    def refresh(self) -> None:
+        version = self._version_of()
+        with self._lock:
+            if self._loaded and version == self._version:
+                return
+            files: Dict[str, Tuple[Any, List[Any]]] = {}
+            stale: Set[Any] = set()
+            fresh: Set[Any] = set()
+            for period in self._archive.periods():
+                path, stamp = self._archive.period_version(period)
+                cached = self._files.get(path)
+                if cached is not None and cached[0] == stamp:
+                    files[path] = cached
+                    continue
+                if cached is not None:
+                    stale.update(cached[1])
+                keys = []
+                for position, record in enumerate(self._archive.records(period)):
+                    key = record.get("id", (period, position))
+                    keys.append(key)
+                    self._records[key] = record
+                    self._order[key] = key if isinstance(key, int) else position
+                    self._index(key, record)
+                fresh.update(keys)
+                files[path] = (stamp, keys)
+            for path, (_, keys) in self._files.items():
+                if path not in files:
+                    stale.update(keys)
+            # A record moved to another period was read again with it
+            for key in stale - fresh:
+                self._discard(key)
+                self._records.pop(key, None)
+                self._order.pop(key, None)
+            self._files = files
+            self._version, self._loaded = version, True
+
+
+def snippet(record: Record, fields: Iterable[str], query: str, width: int = 80) -> str:
+    """Return the part of ``record``'s first matching field around the first term."""
+
+    query_terms = terms(query)
+    for field in fields:
+        text = str(record.get(field) or "")
+        if not text:
+            continue
+        folded = normalize(text)
+        found = [folded.find(t) for t in query_terms if t in folded]
+        if not query_terms or found:
+            # Normalisation rarely changes lengths; the position is a good guess
+            start = max(0, min(found, default=0) - width // 4)
+            excerpt = text[start:start + width]
+            return ("…" if start else "") + excerpt + ("…" if start + width < len(text) else "")
+    return ""
+
+
+def file_version(path: storage.PathLike) -> Tuple[str, Any]:
+    """Return the version of the JSON file at ``path`` for an index ``version``."""
+
+    return os.path.abspath(os.fspath(path)), storage.stamp(path)
+
+
+def _read_list(path: storage.PathLike) -> List[Record]:
+    try:
+        return storage.read_json(path, [])
+    except json.JSONDecodeError:
+        return []
+
+
+def indexes() -> Dict[str, SearchIndex]:
+    """Return the registered indexes by name."""
+
+    return dict(_indexes)
+
+
+class GlobalPage(NamedTuple):
+    """A page of :func:`search_all` results.
+
+    ``items`` are dicts with the ``module`` and ``index`` a record comes
+    from, its ``score`` and a copy of the ``record``. ``facets`` counts the
+    matches of every module, whichever modules were selected.
+    ``next_cursor`` is ``None`` on the last page.
+    """
+
+    items: List[Dict[str, Any]]
+    facets: Dict[str, int]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(position: Tuple[int, str, int]) -> str:
+    raw = json.dumps(list(position), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[int, str, int]]:
+    """Return the position encoded in ``cursor``, ``None`` if it is invalid."""
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, name, rank = json.loads(raw.decode("utf-8"))
+        return int(score), str(name), int(rank)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+
+def search_all(
+    query: str,
+    modules: Optional[Iterable[str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    visible: Optional[Dict[str, Callable[[Record], bool]]] = None,
+) -> GlobalPage:
+    """Search every registered index for ``query``.
+
+    Results are ordered by score, then index, then newest record first.
+    ``visible`` maps index names to a predicate selecting the records the
+    reader may see; other records are left out of the items and facets.
+    ``modules`` restricts the items (not the facets) to those modules.
+    ``cursor`` is the ``next_cursor`` of the previous page; the position
+    it encodes does not move when records are added, so pages neither
+    repeat nor skip results.
+    """
+
+    if not terms(query):
+        return GlobalPage([], {}, None)
+    selected = set(modules or ())
+    after = decode_cursor(cursor) if cursor else None
+    facets: Dict[str, int] = {}
+    hits: List[Tuple[Tuple[int, str, int], SearchIndex, int, Record]] = []
+    for index in list(_indexes.values()):
+        found = index.hits(query)
+        allowed = (visible or {}).get(index.name)
+        if allowed is not None:
+            found = [hit for hit in found if allowed(hit[2])]
+        if not found:
+            continue
+        facets[index.group] = facets.get(index.group, 0) + len(found)
+        if selected and index.group not in selected:
+            continue
+        for rank, score, record in found:
+            position = (-score, index.name, -rank)
+            if after is None or position > after:
+                hits.append((position, index, score, record))
+    hits.sort(key=lambda hit: hit[0])
+    page = hits[:limit]
+    items = [
+        {"module": index.group, "index": index.name, "score": score, "record": dict(record)}
+        for _, index, score, record in page
+    ]
+    next_cursor = encode_cursor(page[-1][0]) if len(hits) > limit else None
+    return GlobalPage(items, facets, next_cursor)
@@ -0,0 +1,75 @@
+"""Monotonic ID sequences of the JSON stores.
+
+New records used to get ``max(id) + 1`` computed over every record of
+their store. :func:`next_id` instead keeps the last ID handed out for a
+store in a small counter file next to the data (``<file>.seq``, e.g.
+``posts.json.seq``), so allocating an ID reads and writes one tiny
+document whatever the size of the store.
+
+The counter is changed while holding :func:`app.storage.locked` on the
+counter file and is replaced atomically, so workers in different
+processes never receive the same ID. IDs only grow: deleting the newest
+record does not give its ID to the next one.
+
+A store without a counter file (new, or written before sequences
+existed) starts after the highest ID of the records the caller passes,
+which it has usually loaded already to append the new record.
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from . import storage
+
+
+def counter_path(path: storage.PathLike) -> str:
+    """Return the counter file of the store at ``path``."""
+
+    return os.fspath(path) + ".seq"
+
+
+def highest(records: Iterable[Dict[str, Any]]) -> int:
+    """Return the highest integer ``id`` of ``records`` (0 when empty)."""
+
+    return max((int(r.get("id", 0)) for r in records), default=0)
+
+
+def next_id(
+    path: storage.PathLike,
+    records: Iterable[Dict[str, Any]] = (),
+    count: int = 1,
+    floor: Optional[Callable[[], int]] = None,
+) -> int:
+    """Allocate ``count`` consecutive IDs for the store at ``path``.
+
+    Parameters
+    ----------
+    path : PathLike
+        Data file of the store.
+    records : iterable, optional
+        Records of the store, only read when the counter does not exist yet.
+    count : int, optional
+        Number of IDs to allocate.
+    floor : callable, optional
+        Returns IDs used outside ``records`` (e.g. by archived records);
+        only called when the counter does not exist yet.
+
+    Returns
+    -------
+    int
+        The first allocated ID.
+    """
+
+    seq = counter_path(path)
+    with storage.locked(seq):
+        try:
+            counter = storage.read_json(seq)
+        except json.JSONDecodeError:
+            counter = None
+        if counter is None:
+            last = max(highest(records), floor() if floor is not None else 0)
+        else:
+            last = int(counter["last"])
+        storage.save_json(seq, {"last": last + count})
+    return last + 1
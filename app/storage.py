@@ -0,0 +1,259 @@
+"""Cached JSON document store shared by the utility modules.
+
+Every JSON backed module reads and writes its file through this module.
+Parsed documents are kept in memory and validated against the file's
+``stat`` information so a file is only parsed again after it changed on
+disk, either by this process or by another worker.
+
+Writes go to a temporary file which is fsynced and renamed over the
+target, so readers never see a partially written document. A
+read-modify-write cycle is wrapped in :func:`locked`, which holds an
+advisory ``fcntl`` lock shared by every worker process.
+"""
+
+from contextlib import contextmanager
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except Exception:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+# (st_mtime_ns, st_size, st_ino) of the file the document was parsed from
+_Stamp = Tuple[int, int, int]
+
+_cache: Dict[str, Tuple[_Stamp, Any]] = {}
+_cache_lock = threading.Lock()
+
+
+def _key(path: PathLike) -> str:
+    return os.path.abspath(os.fspath(path))
+
+
+def _stamp(path: PathLike) -> Optional[_Stamp]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def stamp(path: PathLike) -> Optional[_Stamp]:
+    """Return a value that changes whenever ``path`` is written, ``None`` if missing."""
+
+    return _stamp(_key(path))
+
+
+def read_json(path: PathLike, default: Any = None) -> Any:
+    """Return the parsed document stored at ``path``.
+
+    The returned object is shared with every other caller and must be
+    treated as read-only. Use :func:`load_json` when the document is
+    going to be modified.
+
+    Parameters
+    ----------
+    path : PathLike
+        JSON file to read.
+    default : Any, optional
+        Value returned when the file does not exist.
+
+    Raises
+    ------
+    json.JSONDecodeError
+        If the file exists but does not contain valid JSON.
+    """
+
+    key = _key(path)
+    stamp = _stamp(key)
+    if stamp is None:
+        with _cache_lock:
+            _cache.pop(key, None)
+        return default
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(key, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # Only cache when the file did not change while it was being parsed
+    if _stamp(key) == stamp:
+        with _cache_lock:
+            _cache[key] = (stamp, data)
+    return data
+
+
+def newest(
+    path: PathLike,
+    limit: int,
+    before: Optional[int] = None,
+    where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Return the newest records of the JSON list at ``path``, one page at a time.
+
+    Records are appended as they are created, so the list is read from its
+    end and the scan stops as soon as the page is full. Only the returned
+    records are copied.
+
+    Parameters
+    ----------
+    path : PathLike
+        JSON file holding a list of records with an integer ``id``.
+    limit : int
+        Maximum number of records to return.
+    before : int, optional
+        Only return records whose ``id`` is lower (the cursor of the page).
+    where : callable, optional
+        Only return records for which it returns true.
+
+    Returns
+    -------
+    tuple
+        The records, newest first, and the cursor of the next page
+        (``None`` on the last page).
+    """
+
+    items: List[Dict[str, Any]] = []
+    for record in reversed(read_json(path, [])):
+        if before is not None and record.get("id", 0) >= before:
+            continue
+        if where is not None and not where(record):
+            continue
+        if len(items) == limit:
+            return items, items[-1].get("id")
+        items.append(dict(record))
+    return items, None
+
+
+def _working_copy(data: Any) -> Any:
+    """Copy the container and its records so callers can modify them."""
+
+    if isinstance(data, list):
+        return [dict(r) if isinstance(r, dict) else r for r in data]
+    if isinstance(data, dict):
+        return {k: dict(v) if isinstance(v, dict) else v for k, v in data.items()}
+    return data
+
+
+def load_json(path: PathLike, default: Any = None) -> Any:
+    """Return a modifiable copy of the document stored at ``path``.
+
+    The top-level container and each record in it are copied. Nested
+    values are still shared with the cache, so they must only be changed
+    in place when the document is written back with :func:`save_json`.
+    """
+
+    data = read_json(path, None)
+    if data is None:
+        return default
+    return _working_copy(data)
+
+
+def save_json(path: PathLike, data: Any) -> None:
+    """Atomically write ``data`` to ``path`` and drop the cached copy."""
+
+    key = _key(path)
+    invalidate(key)
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    write_atomic(key, text)
+
+
+def write_atomic(path: PathLike, text: Union[str, bytes]) -> None:
+    """Replace ``path`` with ``text`` (or raw bytes) using a fsynced temporary file."""
+
+    key = _key(path)
+    directory, name = os.path.split(key)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        binary = isinstance(text, bytes)
+        with os.fdopen(fd, "wb" if binary else "w", encoding=None if binary else "utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, key)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory: str) -> None:
+    """Persist the rename of a file inside ``directory``."""
+
+    if not hasattr(os, "O_DIRECTORY"):  # pragma: no cover - Windows
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:  # pragma: no cover - unusual filesystems
+        return
+    try:
+        os.fsync(fd)
+    except OSError:  # pragma: no cover - unusual filesystems
+        pass
+    finally:
+        os.close(fd)
+
+
+class _PathLock:
+    """In-process state of the lock guarding one file."""
+
+    def __init__(self) -> None:
+        self.rlock = threading.RLock()
+        self.depth = 0
+        self.handle = None
+
+
+_locks: Dict[str, _PathLock] = {}
+
+
+@contextmanager
+def locked(path: PathLike) -> Iterator[None]:
+    """Hold an exclusive lock on ``path`` for a read-modify-write cycle.
+
+    The lock is re-entrant within a thread. Between processes it is an
+    advisory ``fcntl.flock`` on ``<path>.lock``; where ``fcntl`` is not
+    available only threads of the current process are serialised.
+    """
+
+    key = _key(path)
+    with _cache_lock:
+        state = _locks.setdefault(key, _PathLock())
+    with state.rlock:
+        if state.depth == 0 and fcntl is not None:
+            os.makedirs(os.path.dirname(key), exist_ok=True)
+            handle = open(key + ".lock", "a")
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                handle.close()
+                raise
+            state.handle = handle
+        state.depth += 1
+        try:
+            yield
+        finally:
+            state.depth -= 1
+            if state.depth == 0 and state.handle is not None:
+                handle, state.handle = state.handle, None
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                handle.close()
+
+
+def invalidate(path: Optional[PathLike] = None) -> None:
+    """Forget the cached document for ``path`` or for every file."""
+
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(_key(path), None)
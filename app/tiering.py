@@ -0,0 +1,297 @@
+"""Cold archives for records that no longer belong to the live data.
+
+Archived reports, finished tasks and similar records used to stay in the
+JSON file of their module, so every page listing the live records parsed
+them too. A :class:`ColdArchive` moves the records its ``is_cold``
+predicate selects out of the hot file into gzip compressed JSON Lines
+files, one per period (the month a record was created, ``YYYY-MM``),
+kept in a ``<hot file>_archive`` directory next to the hot file::
+
+    principessina_archive/
+        index.json          {"ids": {"12": "2025-03", ...}, "max_id": 57}
+        2025-03.jsonl.gz
+        2025-04.jsonl.gz
+
+``index.json`` maps every archived ID to its period, so a lookup by ID
+only decompresses one month, and remembers the highest ID ever archived
+so the ID sequence of the store (see :mod:`app.sequence`) starts after
+it. Archive pages read the periods lazily, newest first, with
+:meth:`ColdArchive.iter_records`.
+
+Every change to an archive is made while holding :func:`app.storage.locked`
+on the hot file, and files are replaced atomically. The cold copy is
+written before the hot file, so a crash in between leaves a record in
+both places; readers skip the cold copy and the next move replaces it.
+
+:func:`move_all`, run nightly by the scheduler, moves the cold records of
+every archive.
+"""
+
+from collections import OrderedDict
+import gzip
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import scheduler, sequence, storage
+
+UNDATED = "undated"  # period of records without a usable date
+CACHE_PERIODS = 8  # parsed period files kept in memory
+
+_archives: Dict[str, "ColdArchive"] = {}
+
+_cache: "OrderedDict[str, Tuple[Any, List[Dict[str, Any]]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def month_of(field: str) -> Callable[[Dict[str, Any]], str]:
+    """Return a period function giving the month of the ISO date in ``field``."""
+
+    def period(record: Dict[str, Any]) -> str:
+        try:
+            return datetime.fromisoformat(record.get(field) or "").strftime("%Y-%m")
+        except (TypeError, ValueError):
+            return UNDATED
+
+    return period
+
+
+def _parse(path: str) -> List[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ColdArchive:
+    """Cold storage for the records of the JSON list at ``path()``.
+
+    ``path`` is called on every access so modules can keep their path in a
+    module-level constant that tests rebind. Records need an ``id``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Callable[[], storage.PathLike],
+        is_cold: Callable[[Dict[str, Any]], bool],
+        period: Callable[[Dict[str, Any]], str],
+    ) -> None:
+        self.name = name
+        self._path = path
+        self._is_cold = is_cold
+        self._period = period
+        _archives[name] = self
+
+    def hot_path(self) -> str:
+        return os.path.abspath(os.fspath(self._path()))
+
+    def directory(self) -> str:
+        return os.path.splitext(self.hot_path())[0] + "_archive"
+
+    def _file(self, period: str) -> str:
+        return os.path.join(self.directory(), f"{period}.jsonl.gz")
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory(), "index.json")
+
+    def index(self) -> Dict[str, Any]:
+        """Return ``{"ids": {str(id): period}, "max_id": n}`` (read-only)."""
+
+        return storage.read_json(self._index_path(), {"ids": {}, "max_id": 0})
+
+    def version(self) -> Any:
+        """Return a value that changes whenever records are moved in or deleted."""
+
+        return storage.stamp(self._index_path())
+
+    def periods(self) -> List[str]:
+        """Return the periods holding records, newest first."""
+
+        periods = set(self.index()["ids"].values())
+        dated = sorted((p for p in periods if p != UNDATED), reverse=True)
+        return dated + [UNDATED] if UNDATED in periods else dated
+
+    def max_id(self) -> int:
+        return int(self.index().get("max_id", 0))
+
+    def next_id(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Return the ID for a new record of the hot ``records``, never reusing an archived one."""
+
+        return sequence.next_id(self.hot_path(), records, floor=self.max_id)
+
+    def _load(self, period: str) -> List[Dict[str, Any]]:
+        """Return the records of ``period`` as stored (shared, read-only)."""
+
+        path = self._file(period)
+        stamp = storage.stamp(path)
+        if stamp is None:
+            return []
+        with _cache_lock:
+            cached = _cache.get(path)
+            if cached is not None and cached[0] == stamp:
+                _cache.move_to_end(path)
+                return cached[1]
+        records = _parse(path)
+        if storage.stamp(path) == stamp:
+            with _cache_lock:
+                _cache[path] = (stamp, records)
+                _cache.move_to_end(path)
+                while len(_cache) > CACHE_PERIODS:
+                    _cache.popitem(last=False)
+        return records
+
+    def _write(self, period: str, records: List[Dict[str, Any]]) -> None:
+        path = self._file(period)
+        with _cache_lock:
+            _cache.pop(path, None)
+        if not records:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            return
+        text = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        storage.write_atomic(path, gzip.compress(text.encode("utf-8")))
+
+    def period_version(self, period: str) -> Tuple[str, Any]:
+        """Return a value that changes whenever the file of ``period`` changes."""
+
+        path = self._file(period)
+        return path, storage.stamp(path)
+
+    def records(self, period: str) -> List[Dict[str, Any]]:
+        """Return the records archived in ``period`` (shared, read-only)."""
+
+        return self._load(period)
+
+    def read(self, period: str) -> List[Dict[str, Any]]:
+        """Return copies of the records archived in ``period``."""
+
+        return [dict(r) for r in self._load(period)]
+
+    def iter_records(
+        self, since: Optional[str] = None, until: Optional[str] = None, exclude: Iterable[Any] = ()
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield archived records period by period, newest first.
+
+        A period file is only read when the iteration reaches it.
+        ``since``/``until`` (``YYYY-MM``) skip dated periods outside that
+        range; records whose ID is in ``exclude`` (e.g. the IDs still in
+        the hot file) are skipped.
+        """
+
+        exclude = set(exclude)
+        for period in self.periods():
+            if period != UNDATED and ((since and period < since) or (until and period > until)):
+                continue
+            for record in self._load(period):
+                if record.get("id") not in exclude:
+                    yield dict(record)
+
+    def with_hot(self, hot: List[Dict[str, Any]], **kwargs: Any) -> List[Dict[str, Any]]:
+        """Return ``hot`` followed by the archived records not in it."""
+
+        return hot + list(self.iter_records(exclude={r.get("id") for r in hot}, **kwargs))
+
+    def get(self, record_id: Any) -> Optional[Dict[str, Any]]:
+        """Return a copy of the archived record ``record_id`` or ``None``."""
+
+        period = self.index()["ids"].get(str(record_id))
+        if period is None:
+            return None
+        for record in self._load(period):
+            if record.get("id") == record_id:
+                return dict(record)
+        return None
+
+    def update(self, record_id: Any, change: Callable[[Dict[str, Any]], Any]) -> Any:
+        """Apply ``change`` to the archived record ``record_id`` and return its result.
+
+        The period file is rewritten when the result is true. Returns
+        ``None`` when the record is not archived.
+        """
+
+        with storage.locked(self.hot_path()):
+            period = self.index()["ids"].get(str(record_id))
+            if period is None:
+                return None
+            records = self.read(period)
+            for record in records:
+                if record.get("id") == record_id:
+                    result = change(record)
+                    if result:
+                        self._write(period, records)
+                    return result
+            return None
+
+    def delete(self, record_id: Any) -> bool:
+        """Remove the archived record ``record_id``; return whether it existed."""
+
+        with storage.locked(self.hot_path()):
+            index = self.index()
+            period = index["ids"].get(str(record_id))
+            if period is None:
+                return False
+            self._write(period, [r for r in self._load(period) if r.get("id") != record_id])
+            ids = dict(index["ids"])
+            del ids[str(record_id)]
+            storage.save_json(self._index_path(), {"ids": ids, "max_id": index.get("max_id", 0)})
+            return True
+
+    def move(self) -> List[Any]:
+        """Move the cold records of the hot file to the archive.
+
+        Returns the IDs of the moved records.
+        """
+
+        hot = self.hot_path()
+        with storage.locked(hot):
+            try:
+                records = storage.load_json(hot, [])
+            except json.JSONDecodeError:
+                return []
+            cold = [r for r in records if r.get("id") is not None and self._is_cold(r)]
+            if not cold:
+                return []
+            index = self.index()
+            ids = dict(index["ids"])
+            added: Dict[str, List[Dict[str, Any]]] = {}
+            removed: Dict[str, set] = {}
+            for record in cold:
+                period = self._period(record)
+                added.setdefault(period, []).append(record)
+                previous = ids.get(str(record["id"]))
+                # Left by an interrupted move or archived under another period
+                if previous is not None:
+                    removed.setdefault(previous, set()).add(record["id"])
+                ids[str(record["id"])] = period
+            for period in sorted(set(added) | set(removed)):
+                gone = removed.get(period, set())
+                kept = [r for r in self._load(period) if r.get("id") not in gone]
+                self._write(period, kept + added.get(period, []))
+            max_id = max([int(index.get("max_id", 0))] + [int(r["id"]) for r in cold])
+            storage.save_json(self._index_path(), {"ids": ids, "max_id": max_id})
+            moved = {id(r) for r in cold}
+            storage.save_json(hot, [r for r in records if id(r) not in moved])
+            return [r["id"] for r in cold]
+
+
+def archives() -> Dict[str, ColdArchive]:
+    """Return the registered archives by name."""
+
+    return dict(_archives)
+
+
+def move_all() -> Dict[str, List[Any]]:
+    """Move the cold records of every archive; return the moved IDs by archive."""
+
+    moved: Dict[str, List[Any]] = {}
+    for name, archive in _archives.items():
+        ids = archive.move()
+        if ids:
+            moved[name] = ids
+    return moved
+
+
+scheduler.register("tiering.move_cold_records", lambda: move_all(), hour=2, minute=30)
@@ -1,5 +1,6 @@
 from flask import render_template, session, redirect, url_for, flash, request
 
+from app import pagination
 from . import bp
 import config
 from .forms import PollForm, VoteForm
@@ -21,15 +22,15 @@ def index():
 @bp.route('/open')
 def open_list():
     user = session.get('user')
-    polls = [p for p in utils.load_polls() if p.get('status') == 'open']
-    return render_template('vote_open_list.html', polls=polls, user=user)
+    page = pagination.newest(utils.VOTE_BOX_PATH, where=lambda p: p.get('status') == 'open')
+    return render_template('vote_open_list.html', polls=page.items, page=page, user=user)
 
 
 @bp.route('/closed')
 def closed_list():
     user = session.get('user')
-    polls = [p for p in utils.load_polls() if p.get('status') == 'closed']
-    return render_template('vote_closed_list.html', polls=polls, user=user)
+    page = pagination.newest(utils.VOTE_BOX_PATH, where=lambda p: p.get('status') == 'closed')
+    return render_template('vote_closed_list.html', polls=page.items, page=page, user=user)
 
 
 @bp.route('/create', methods=['GET', 'POST'])
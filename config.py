@@ -48,3 +48,14 @@ MAIL_SENDER = "famigliapp@example.com"
 LINE_NOTIFY_TOKEN = ""
 PUSHBULLET_TOKEN = ""
 MAIL_ENABLED = False
+# Notifications queued while the web app runs, delivered by OUTBOX_WORKERS threads
+OUTBOX_FILE = "outbox.sqlite3"
+OUTBOX_WORKERS = 4
+# Seconds calendar notifications are collected into one digest per user
+NOTIFY_DIGEST_WINDOW = 300
+# The process holding this lock runs the scheduled jobs; the others retry
+# every SCHEDULER_ELECTION_INTERVAL seconds and take over if it exits
+SCHEDULER_LOCK_FILE = "scheduler.lock"
+SCHEDULER_ELECTION_INTERVAL = 15
+# Last successful run of every scheduled job, used to catch up missed runs
+JOB_LEDGER_FILE = "job_runs.json"
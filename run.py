@@ -10,11 +10,7 @@ from app.intrattenimento import utils as intrattenimento_utils
 from app.corso import utils as corso_utils
 from app.resoconto import utils as resoconto_utils
 from app.resoconto import tasks as resoconto_tasks
-from app.resoconto.tasks import start_scheduler
-from app.intrattenimento.tasks import start_scheduler as start_intrattenimento_scheduler
-from app.Seminario.tasks import start_scheduler as start_seminario_scheduler
-from app.principessina.tasks import start_scheduler as start_principessina_scheduler
-from app.corso.tasks import start_scheduler as start_corso_scheduler
+from app import scheduler
 from app.principessina import utils as principessina_utils
 from app.quest_box import utils as quest_utils
 from app.Seminario import utils as seminario_utils
@@ -22,6 +18,7 @@ from app.bravissimo import utils as bravissimo_utils
 from app.scatola_capriccio import utils as scatola_capriccio_utils
 from app.monsignore import utils as monsignore_utils
 from app.calendario import utils as calendario_utils
+from app.calendario import solver as calendario_solver
 from app.invites import utils as invite_utils
 
 from app import create_app
@@ -97,6 +94,7 @@ def display_menu(user: Dict[str, str]):
             print("52. Resoconto AI分析を見る")
             print("53. 招待コード作成")
             print("54. 招待コード一覧")
+            print("55. シフトを自動作成する")
         print("0. 終了")
         choice = input("選択してください: ")
         if choice == "1":
@@ -267,6 +265,11 @@ def display_menu(user: Dict[str, str]):
                 list_invites_cli()
             else:
                 print("権限がありません")
+        elif choice == "55":
+            if user["role"] == "admin":
+                generate_calendario_shift()
+            else:
+                print("権限がありません")
         elif choice == "0":
             break
         else:
@@ -287,21 +290,13 @@ def show_points(user: Dict[str, str]):
 
 def edit_points():
     username = input("編集するユーザー名: ")
-    points = utils.load_points()
-    if username not in points:
-        points[username] = {"A": 0, "O": 0}
     try:
         a = int(input("Aポイント: "))
         o = int(input("Oポイント: "))
     except ValueError:
         print("数値を入力してください")
         return
-    old_a = points[username].get("A", 0)
-    old_o = points[username].get("O", 0)
-    points[username]["A"] = a
-    points[username]["O"] = o
-    utils.save_points(points)
-    utils.log_points_change(username, a - old_a, o - old_o)
+    utils.set_user_points(username, a, o)
     print("保存しました")
 
 
@@ -1005,6 +1000,32 @@ def move_calendario_event() -> None:
         print("該当IDがありません")
 
 
+def generate_calendario_shift() -> None:
+    """ルールを満たすシフトを自動作成して保存する。"""
+
+    month_s = input("対象月 YYYY-MM: ").strip()
+    try:
+        month_start = datetime.strptime(month_s, "%Y-%m").date()
+    except ValueError:
+        print("月の形式が正しくありません")
+        return
+    budget_s = input(
+        f"探索時間(秒)[{calendario_solver.DEFAULT_TIME_BUDGET:g}]: "
+    ).strip()
+    try:
+        time_budget = float(budget_s) if budget_s else None
+    except ValueError:
+        print("数値を入力してください")
+        return
+
+    result = calendario_solver.generate_and_save(month_start, time_budget=time_budget)
+    for day, employees in result["assignments"].items():
+        print(f"{day}: {', '.join(employees)}")
+    for violation in result["violations"]:
+        print(f"警告: {violation['description']}")
+    print(f"保存しました ({result['elapsed']:.1f}秒)")
+
+
 def assign_calendario_employee() -> None:
     try:
         event_id = int(input("担当を設定するID: "))
@@ -1161,11 +1182,8 @@ def edit_calendario_rules() -> None:
     print("保存しました")
 
 def main():
-    start_scheduler()
-    start_intrattenimento_scheduler()
-    start_seminario_scheduler()
-    start_principessina_scheduler()
-    start_corso_scheduler()
+    utils.migrate_comments()
+    scheduler.start()
     username = input("ユーザー名: ")
     password = getpass.getpass("パスワード: ")
     user = utils.login(username, password)
@@ -1,5 +1,11 @@
 document.addEventListener('DOMContentLoaded', () => {
   let selectedEmployees = [];
+  // Server-side violation session: after a full check only changes are sent
+  let violationSession = null;
+  let violationVersion = 0;
+  const currentViolations = new Map();
+  let currentConsecutiveInfo = {};
+  let violationCheckQueue = Promise.resolve();
   const employeeBoxes = Array.from(document.querySelectorAll('.employee-box'));
 
   function getInitialFromName(name) {
@@ -83,8 +89,9 @@ document.addEventListener('DOMContentLoaded', () => {
           emps.splice(idx, 1);
           input.value = emps.join(',');
           span.remove();
+          const changes = [{ date: cell.dataset.date, employee: empName, op: 'remove' }];
           updateShiftCounts().then(() => {
-            triggerShiftViolationCheck();
+            triggerShiftViolationCheck(changes);
           }).catch(error => console.error("Error updating counts/violations after click removal:", error));
         }
       });
@@ -105,10 +112,12 @@ document.addEventListener('DOMContentLoaded', () => {
       const droppedEmployeeNames = empNamesFromDropString.split(',');
       const originDate = e.dataTransfer.getData('text/from-cell');
       let empsInCell = input.value ? input.value.split(',') : [];
+      const changes = [];
 
       droppedEmployeeNames.forEach(empName => {
         if (!empsInCell.includes(empName)) {
           empsInCell.push(empName);
+          changes.push({ date: cell.dataset.date, employee: empName, op: 'add' });
           const newSpan = document.createElement('span');
           newSpan.className = 'assigned event-shift-item'; // Added event-shift-item for consistency
           newSpan.dataset.emp = empName;
@@ -129,6 +138,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (idx >= 0) {
               originEmps.splice(idx, 1);
               originInput.value = originEmps.join(',');
+              changes.push({ date: originDate, employee: empName, op: 'remove' });
               originList.querySelectorAll('.assigned').forEach(s => {
                 if (s.dataset.emp === empName) s.remove();
               });
@@ -147,7 +157,7 @@ document.addEventListener('DOMContentLoaded', () => {
       // A more robust solution might involve a global list of all draggable items.
 
       updateShiftCounts().then(() => {
-        triggerShiftViolationCheck();
+        triggerShiftViolationCheck(changes);
       }).catch(error => console.error("Error updating counts/violations after drop:", error));
     }
 
@@ -195,7 +205,43 @@ document.addEventListener('DOMContentLoaded', () => {
     })
   }
 
-  async function triggerShiftViolationCheck() {
+  // Checks run one at a time so change sets reach the server in order
+  function triggerShiftViolationCheck(changes) {
+    violationCheckQueue = violationCheckQueue
+      .then(() => runShiftViolationCheck(changes))
+      .catch(error => console.error('Error during shift violation check:', error));
+    return violationCheckQueue;
+  }
+
+  async function applyViolationChanges(changes) {
+    const response = await fetch('/calendario/api/check_shift_violations', {
+      method: 'POST', headers: { 'Content-Type': 'application/json', },
+      body: JSON.stringify({ session: violationSession, version: violationVersion, changes: changes })
+    });
+    // 409 means the server lost or invalidated the session: fall back to a full check
+    if (!response.ok) return false;
+    const data = await response.json();
+    if (!data.success) return false;
+    violationVersion = data.version;
+    (data.removed || []).forEach(id => currentViolations.delete(id));
+    (data.added || []).forEach(v => currentViolations.set(v.id, v));
+    for (const [emp, days] of Object.entries(data.consecutive_work_info || {})) {
+      const empDays = currentConsecutiveInfo[emp] || (currentConsecutiveInfo[emp] = {});
+      for (const [day, count] of Object.entries(days)) {
+        if (count === null) delete empDays[day]; else empDays[day] = count;
+      }
+    }
+    updateViolationsDisplay(Array.from(currentViolations.values()));
+    updateConsecutiveWorkDisplay(currentConsecutiveInfo);
+    return true;
+  }
+
+  async function runShiftViolationCheck(changes) {
+    if (changes !== undefined && violationSession) {
+      if (changes.length === 0) return;
+      if (await applyViolationChanges(changes)) return;
+      violationSession = null;
+    }
     const statsSummaryCardBody = document.querySelector('.employee-stats-summary .card-body');
     const currentMonthStr = statsSummaryCardBody ? statsSummaryCardBody.dataset.currentMonth : null;
     if (!currentMonthStr) { console.error("Cannot check violations: current month not found."); return; }
@@ -216,6 +262,11 @@ document.addEventListener('DOMContentLoaded', () => {
       }
       const data = await response.json();
       if (data.success) {
+        violationSession = data.session || null;
+        violationVersion = data.version || 0;
+        currentViolations.clear();
+        (data.violations || []).forEach(v => currentViolations.set(v.id, v));
+        currentConsecutiveInfo = data.consecutive_work_info || {};
         updateViolationsDisplay(data.violations);
         if (data.consecutive_work_info) {
             updateConsecutiveWorkDisplay(data.consecutive_work_info);
@@ -25,3 +25,9 @@ def ensure_default_users():
     yield
     for u in added:
         config.USERS.pop(u, None)
+
+
+@pytest.fixture(autouse=True)
+def isolated_outbox(tmp_path, monkeypatch):
+    # Outbox jobs and pending reminders of each test go to its own database
+    monkeypatch.setattr(config, "OUTBOX_FILE", str(tmp_path / "outbox.sqlite3"), raising=False)
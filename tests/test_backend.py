@@ -0,0 +1,50 @@
+import pytest
+
+flask = pytest.importorskip("flask")
+
+import app as app_pkg
+from app import backend, utils
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    calls = []
+    results = []
+    monkeypatch.setattr(app_pkg, "db", object())
+    monkeypatch.setattr(backend, "_probe", lambda: calls.append(1) or (results.pop(0) if results else None))
+    backend.invalidate()
+    yield calls, results
+    backend.invalidate()
+
+
+def test_probe_result_is_cached_until_ttl(probes, monkeypatch):
+    calls, _ = probes
+    application = flask.Flask(__name__)
+    with application.app_context():
+        assert backend.current() == backend.DATABASE
+        assert utils._use_db() and utils._use_db()
+        assert len(calls) == 1
+        assert backend.status()["backend"] == backend.DATABASE
+
+        monkeypatch.setattr(backend, "TTL", 0.0)
+        backend.current()
+        assert len(calls) == 2
+
+
+def test_failure_is_rechecked_after_invalidate(probes):
+    calls, results = probes
+    results.append("OperationalError()")
+    application = flask.Flask(__name__)
+    with application.app_context():
+        assert backend.current() == backend.JSON
+        assert backend.status()["error"] == "OperationalError()"
+        backend.invalidate()
+        assert backend.current() == backend.DATABASE
+        assert len(calls) == 2
+
+
+def test_json_without_app_context(probes):
+    calls, _ = probes
+    assert backend.current() == backend.JSON
+    assert backend.status() == {"backend": backend.JSON, "checked_ago": None, "error": None}
+    assert calls == []
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import config
+from app.calendario import utils
+
+_tmpdir = None
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    config.CALENDAR_FILE = os.path.join(_tmpdir.name, "events.json")
+    utils.EVENTS_PATH = Path(config.CALENDAR_FILE)
+    utils.save_events(
+        [
+            {"id": 1, "date": "2025-03-10", "title": "b", "category": "other", "employee": ""},
+            {"id": 2, "date": "2025-01-05", "title": "a", "category": "shift", "employee": "taro"},
+            {"id": 3, "date": "2025-03-10", "title": "c", "category": "shift", "employee": "hanako"},
+            {"id": 4, "date": "not-a-date", "title": "x", "category": "shift", "employee": "taro"},
+            {"id": 5, "date": "2025-03-31", "title": "d", "category": "shift", "employee": "taro"},
+        ]
+    )
+
+
+def teardown_function():
+    _tmpdir.cleanup()
+
+
+def test_events_between_is_inclusive_and_ordered():
+    events = utils.events_between(date(2025, 1, 5), date(2025, 3, 10))
+    assert [e["id"] for e in events] == [2, 1, 3]
+    assert [e["id"] for e in utils.events_on(date(2025, 3, 10))] == [1, 3]
+    assert utils.events_between(date(2025, 4, 1), date(2025, 4, 30)) == []
+
+
+def test_events_between_returns_copies():
+    utils.events_on(date(2025, 3, 10))[0]["title"] = "changed"
+    assert utils.events_on(date(2025, 3, 10))[0]["title"] == "b"
+
+
+def test_shifts_between_groups_employees_by_date():
+    assert utils.shifts_between(date(2025, 3, 1), date(2025, 3, 31)) == {
+        "2025-03-10": ["hanako"],
+        "2025-03-31": ["taro"],
+    }
+    assert utils.get_users_on_shift(date(2025, 1, 5)) == ["taro"]
+
+
+def test_index_follows_changes_to_events_file():
+    assert utils.first_event_date() == date(2025, 1, 5)
+    utils.move_event(2, date(2024, 12, 31))
+    assert utils.first_event_date() == date(2024, 12, 31)
+    assert utils.events_on(date(2025, 1, 5)) == []
+
+
+def test_compute_employee_stats_uses_date_range():
+    stats = utils.compute_employee_stats(date(2025, 3, 1), date(2025, 3, 31))
+    assert stats == {
+        "hanako": {"work_days": 1, "off_days": 30},
+        "taro": {"work_days": 1, "off_days": 30},
+    }
+    stats["taro"]["work_days"] = 99
+    assert utils.compute_employee_stats(date(2025, 3, 1), date(2025, 3, 31))["taro"]["work_days"] == 1
+
+
+def test_event_display_fields():
+    fields = utils.event_display_fields({"title": "9:30 会議", "category": "other"})
+    assert fields["display_time"] == "9:30"
+    assert fields["cleaned_title"] == "会議"
+    assert (fields["sort_priority"], fields["sort_time"]) == (5, "9:30")
+    assert utils.event_display_fields({"title": "x", "category": "マミー系"})["css_category_class"] == "mummy"
+    assert utils.event_display_fields({"title": "x"})["css_category_class"] == "other"
+
+
+def test_display_events_are_ordered_within_a_day():
+    utils.add_event(date(2025, 3, 10), "08:00 朝会", "", "", category="other")
+    utils.add_event(date(2025, 3, 10), "出張", "", "", category="shucchou")
+    events = utils.display_events_between(date(2025, 3, 10), date(2025, 3, 10))
+    assert [e["title"] for e in events] == ["出張", "b", "c", "08:00 朝会"]
+    assert events[-1]["cleaned_title"] == "朝会"
+    assert "display_time" not in utils.load_events()[-1]
+
+
+def _save_shifts(days_by_employee):
+    events = []
+    for employee, days in days_by_employee.items():
+        for day in days:
+            events.append({"id": len(events) + 1, "date": day, "title": employee, "category": "shift", "employee": employee})
+    utils.save_events(events)
+
+
+def test_consecutive_days_continue_runs_from_earlier_months():
+    # taro works every day from 2025-01-20 to 2025-02-03
+    run = [date.fromordinal(date(2025, 1, 20).toordinal() + i).isoformat() for i in range(15)]
+    _save_shifts({"taro": run, "hanako": ["2025-02-02", "2025-02-03"]})
+    assert utils.streaks_as_of(date(2025, 1, 31)) == {"taro": 12}
+    assert utils.streaks_as_of(date(2025, 2, 4)) == {}
+    assert utils.consecutive_work_days_between(date(2025, 2, 1), date(2025, 2, 28)) == {
+        "taro": {"2025-02-01": 13, "2025-02-02": 14, "2025-02-03": 15},
+        "hanako": {"2025-02-02": 1, "2025-02-03": 2},
+    }
+    assert utils.calculate_consecutive_work_days_for_all(
+        {"2025-02-01": ["taro"], "2025-02-02": ["taro"]}, date(2025, 2, 1), {"taro": 12}
+    ) == {"taro": {"2025-02-01": 13, "2025-02-02": 14}}
+
+
+def test_streak_checkpoints_are_persisted_per_events_version():
+    _save_shifts({"taro": ["2025-01-30", "2025-01-31"]})
+    assert utils.streaks_as_of(date(2025, 2, 1)) == {}
+    persisted = json.loads(utils._streaks_path().read_text(encoding="utf-8"))
+    assert persisted["months"] == {"2025-01": {"taro": 2}}
+
+    _save_shifts({"taro": ["2025-01-31", "2025-02-01"]})
+    assert utils.streaks_as_of(date(2025, 2, 1)) == {"taro": 2}
+    persisted = json.loads(utils._streaks_path().read_text(encoding="utf-8"))
+    assert persisted["months"] == {"2025-01": {"taro": 1}}
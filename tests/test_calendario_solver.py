@@ -0,0 +1,99 @@
+import os
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import config
+import pytest
+
+from app.calendario import solver, utils
+
+_tmpdir = None
+
+EMPLOYEES = ["taro", "jiro", "hanako", "yuki", "ken"]
+
+RULES = {
+    "max_consecutive_days": 4,
+    "min_staff_per_day": 2,
+    "forbidden_pairs": [["taro", "jiro"]],
+    "required_pairs": [["hanako", "yuki"]],
+    "employee_attributes": {"taro": ["Dog"], "ken": ["Dog"], "hanako": ["Lady"], "yuki": ["Lady"]},
+    "required_attributes": {"Dog": 1},
+    "specialized_requirements": {"mummy": ["jiro"]},
+}
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    config.CALENDAR_FILE = os.path.join(_tmpdir.name, "events.json")
+    config.CALENDAR_RULES_FILE = os.path.join(_tmpdir.name, "rules.json")
+    utils.EVENTS_PATH = Path(config.CALENDAR_FILE)
+    utils.RULES_PATH = Path(config.CALENDAR_RULES_FILE)
+    utils.save_events(
+        [
+            {"id": 1, "date": "2025-03-04", "title": "m", "category": "mummy"},
+            {"id": 2, "date": "2025-03-10", "title": "trip", "category": "shucchou", "employee": "taro"},
+            # ken already works the last four days of February
+            {"id": 3, "date": "2025-02-25", "title": "ken", "category": "shift", "employee": "ken"},
+            {"id": 4, "date": "2025-02-26", "title": "ken", "category": "shift", "employee": "ken"},
+            {"id": 5, "date": "2025-02-27", "title": "ken", "category": "shift", "employee": "ken"},
+            {"id": 6, "date": "2025-02-28", "title": "ken", "category": "shift", "employee": "ken"},
+        ]
+    )
+
+
+def teardown_function():
+    _tmpdir.cleanup()
+
+
+def test_generated_roster_satisfies_rules():
+    result = solver.generate_shift_schedule(date(2025, 3, 1), time_budget=10, employees=EMPLOYEES, rules=RULES, seed=1)
+    roster = result["assignments"]
+    assert sorted(roster) == [f"2025-03-{d:02d}" for d in range(1, 32)]
+    assert result["violations"] == []
+    assert utils.get_shift_violations(roster, RULES, {}) == []
+    assert "jiro" in roster["2025-03-04"]
+    assert "taro" not in roster["2025-03-10"]
+    # The run ken started in February may not continue past the limit
+    assert "ken" not in roster["2025-03-01"]
+
+
+def test_search_stops_at_time_budget():
+    impossible = dict(RULES, min_staff_per_day=5, max_consecutive_days=1)
+    result = solver.generate_shift_schedule(date(2025, 3, 1), time_budget=0.2, employees=EMPLOYEES, rules=impossible, seed=1)
+    assert result["violations"]
+    assert result["elapsed"] < 1
+
+
+def test_generate_and_save_replaces_month_shifts(monkeypatch):
+    monkeypatch.setattr(solver, "shift_employees", lambda: EMPLOYEES)
+    utils.save_rules(dict(RULES), utils.DEFAULT_DEFINED_ATTRIBUTES[:], RULES["specialized_requirements"])
+    result = solver.generate_and_save(date(2025, 3, 1), time_budget=10, seed=2)
+    saved = utils.shifts_between(date(2025, 3, 1), date(2025, 3, 31))
+    assert saved == {d: emps for d, emps in result["assignments"].items() if emps}
+    assert utils.shifts_between(date(2025, 2, 25), date(2025, 2, 28)) == {
+        "2025-02-25": ["ken"], "2025-02-26": ["ken"], "2025-02-27": ["ken"], "2025-02-28": ["ken"],
+    }
+    assert [e["category"] for e in utils.events_on(date(2025, 3, 4)) if e["category"] != "shift"] == ["mummy"]
+
+
+def test_generate_shift_api_requires_admin(monkeypatch):
+    pytest.importorskip("flask")
+    from app import create_app
+
+    monkeypatch.setattr(solver, "shift_employees", lambda: EMPLOYEES)
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["user"] = {"username": "taro", "role": "user", "email": "t@example.com"}
+        res = client.post("/calendario/api/generate_shift", json={"month": "2025-03"})
+        assert res.status_code == 403
+
+        with client.session_transaction() as sess:
+            sess["user"] = {"username": "admin", "role": "admin", "email": "a@example.com"}
+        res = client.post("/calendario/api/generate_shift", json={"month": "2025-03", "time_budget": 2, "save": False})
+        data = res.get_json()
+        assert data["success"] and len(data["assignments"]) == 31
+        assert utils.shifts_between(date(2025, 3, 1), date(2025, 3, 31)) == {}
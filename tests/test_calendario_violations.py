@@ -0,0 +1,156 @@
+import os
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+import config
+import pytest
+
+from app.calendario import utils, violations
+
+_tmpdir = None
+
+RULES = {
+    "max_consecutive_days": 2,
+    "min_staff_per_day": 1,
+    "forbidden_pairs": [["taro", "jiro"]],
+    "required_pairs": [["hanako", "yuki"]],
+    "employee_attributes": {"taro": ["Dog"], "hanako": ["Lady"]},
+    "required_attributes": {"Dog": 1},
+    "specialized_requirements": {"mummy": ["hanako"]},
+}
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    config.CALENDAR_FILE = os.path.join(_tmpdir.name, "events.json")
+    config.CALENDAR_RULES_FILE = os.path.join(_tmpdir.name, "rules.json")
+    utils.EVENTS_PATH = Path(config.CALENDAR_FILE)
+    utils.RULES_PATH = Path(config.CALENDAR_RULES_FILE)
+    utils.save_events([{"id": 1, "date": "2025-03-04", "title": "m", "category": "mummy"}])
+    utils.save_rules(dict(RULES), utils.DEFAULT_DEFINED_ATTRIBUTES[:], RULES["specialized_requirements"])
+
+
+def teardown_function():
+    _tmpdir.cleanup()
+
+
+def _month_assignments():
+    days = [(date(2025, 3, 1) + timedelta(days=i)).isoformat() for i in range(7)]
+    assignments = {d: [] for d in days}
+    for d in days[:4]:
+        assignments[d].append("taro")
+    assignments[days[2]].append("jiro")
+    assignments[days[5]].append("hanako")
+    return assignments
+
+
+def _keys(violation_list):
+    return sorted((v["rule_type"], v["date"], v["description"]) for v in violation_list)
+
+
+def test_engine_matches_full_check():
+    assignments = _month_assignments()
+    rules, _ = utils.load_rules()
+    engine = violations.ShiftViolationEngine(assignments, rules, date(2025, 3, 1))
+    assert _keys(engine.all_violations()) == _keys(utils.get_shift_violations(assignments, rules, {}))
+    assert engine.consecutive == utils.calculate_consecutive_work_days_for_all(assignments, date(2025, 3, 1))
+
+
+def test_engine_returns_only_changed_violations():
+    assignments = _month_assignments()
+    rules, _ = utils.load_rules()
+    engine = violations.ShiftViolationEngine(assignments, rules, date(2025, 3, 1))
+
+    result = engine.apply([{"date": "2025-03-03", "employee": "jiro", "op": "remove"}])
+    assert result["removed"] == ["forbidden_pair|2025-03-03|0"]
+    assert result["added"] == []
+
+    result = engine.apply([{"date": "2025-03-02", "employee": "taro", "op": "remove"}])
+    assert "max_consecutive_days|2025-03-04|taro" in result["removed"]
+    assert {v["rule_type"] for v in result["added"]} == {"min_staff_per_day", "required_attribute_count"}
+    assert result["consecutive_work_info"]["taro"] == {
+        "2025-03-01": 1,
+        "2025-03-02": None,
+        "2025-03-03": 1,
+        "2025-03-04": 2,
+    }
+
+    assignments["2025-03-03"].remove("jiro")
+    assignments["2025-03-02"].remove("taro")
+    assert _keys(engine.all_violations()) == _keys(utils.get_shift_violations(assignments, rules, {}))
+
+
+def test_engine_rejects_invalid_change():
+    rules, _ = utils.load_rules()
+    engine = violations.ShiftViolationEngine({}, rules, date(2025, 3, 1))
+    with pytest.raises(ValueError):
+        engine.apply([{"date": "2025-03-01", "employee": "taro", "op": "swap"}])
+
+
+def test_check_shift_violations_api_session():
+    pytest.importorskip("flask")
+    from app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["user"] = {"username": "admin", "role": "admin", "email": "a@example.com"}
+        res = client.post(
+            "/calendario/api/check_shift_violations",
+            json={"assignments": _month_assignments(), "month": "2025-03"},
+        )
+        data = res.get_json()
+        assert data["success"] and data["session"]
+        assert any(v["rule_type"] == "forbidden_pair" for v in data["violations"])
+
+        change = {"date": "2025-03-03", "employee": "jiro", "op": "remove"}
+        res = client.post(
+            "/calendario/api/check_shift_violations",
+            json={"session": data["session"], "version": data["version"], "changes": [change]},
+        )
+        delta = res.get_json()
+        assert delta["removed"] == ["forbidden_pair|2025-03-03|0"]
+        assert delta["version"] == data["version"] + 1
+
+        # A stale version or an unknown session asks for a full check
+        res = client.post(
+            "/calendario/api/check_shift_violations",
+            json={"session": data["session"], "version": data["version"], "changes": [change]},
+        )
+        assert res.status_code == 409 and res.get_json()["resync"]
+        res = client.post(
+            "/calendario/api/check_shift_violations",
+            json={"session": "unknown", "version": 0, "changes": [change]},
+        )
+        assert res.status_code == 409
+
+
+
+def test_compiled_rules_report_violations_in_rule_order():
+    rules, _ = utils.load_rules()
+    rules = dict(rules, required_attributes={"Dog": 2})
+    assignments = {
+        "2025-03-03": ["taro", "jiro"],
+        "2025-03-04": ["taro"],
+        "2025-03-05": ["taro", "yuki"],
+        "2025-03-06": [],
+    }
+    compiled = violations.CompiledShiftRules(rules)
+    result = compiled.evaluate(assignments)
+    assert [(v["rule_type"], v["date"]) for v in result] == [
+        ("max_consecutive_days", "2025-03-05"),
+        ("min_staff_per_day", "2025-03-06"),
+        ("forbidden_pair", "2025-03-03"),
+        ("required_pair", "2025-03-05"),
+        ("required_attribute_count", "2025-03-03"),
+        ("required_attribute_count", "2025-03-04"),
+        ("required_attribute_count", "2025-03-05"),
+        ("required_attribute_count", "2025-03-06"),
+        ("specialized_requirement_missing", "2025-03-04"),
+    ]
+    assert result[0]["details"]["current_consecutive"] == 3
+    assert compiled.count(assignments) == len(result)
+    assert utils.get_shift_violations(assignments, rules, {}) == result
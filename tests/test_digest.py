@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+
+import config
+
+from app import digest, outbox
+
+_tmpdir = None
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    config.OUTBOX_FILE = os.path.join(_tmpdir.name, "outbox.sqlite3")
+    config.LINE_NOTIFY_TOKEN = ""
+    config.PUSHBULLET_TOKEN = ""
+
+
+def teardown_function():
+    _tmpdir.cleanup()
+
+
+def test_burst_becomes_one_email_per_recipient():
+    now = time.time()
+    for n in range(12):
+        digest.add("カレンダー更新", f"change {n}", ["a@example.com", "b@example.com"], now + n)
+    # The window has not elapsed yet
+    assert digest.flush(now + 10) == 0
+    assert outbox.pending() == []
+
+    assert digest.flush(now + digest.window()) == 2
+    jobs = outbox.pending()
+    assert sorted(job["payload"]["to"] for job in jobs) == ["a@example.com", "b@example.com"]
+    payload = jobs[0]["payload"]
+    assert payload["subject"] == "カレンダー更新 (12件)"
+    assert "- change 0" in payload["body"] and "- change 11" in payload["body"]
+    # Nothing left to merge
+    assert digest.flush(now + 2 * digest.window()) == 0
+
+
+def test_single_notification_is_sent_unchanged():
+    digest.add("カレンダー更新", "only change", ["a@example.com"])
+    assert digest.flush(force=True) == 1
+    [job] = outbox.pending()
+    assert job["payload"] == {"subject": "カレンダー更新", "body": "only change", "to": "a@example.com"}
+
+
+def test_push_channels_get_one_digest(monkeypatch):
+    monkeypatch.setattr(config, "LINE_NOTIFY_TOKEN", "token")
+    now = time.time()
+    digest.add("カレンダー更新", "first", ["a@example.com", "b@example.com", "c@example.com"], now)
+    digest.add("カレンダー更新", "second", ["a@example.com", "b@example.com", "c@example.com"], now)
+    digest.flush(force=True)
+    kinds = [job["kind"] for job in outbox.pending()]
+    assert kinds.count("line_notify") == 1 and kinds.count("email") == 3
+
+
+def test_notify_sends_immediately_without_timer(monkeypatch):
+    sent = []
+    monkeypatch.setattr(digest, "send_email", lambda subject, body, to: sent.append(to))
+    assert not digest.running()
+    digest.notify("カレンダー更新", "body", ["a@example.com", "b@example.com"])
+    assert sent == ["a@example.com", "b@example.com"]
+    assert outbox.pending() == []
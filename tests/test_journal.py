@@ -0,0 +1,66 @@
+import gzip
+import json
+
+from app import journal
+
+
+def test_append_and_iter_records(tmp_path):
+    path = tmp_path / "log.jsonl"
+    journal.append(path, {"id": 1})
+    journal.append(path, {"id": 2, "text": "こんにちは"})
+    assert list(journal.iter_records(path)) == [{"id": 1}, {"id": 2, "text": "こんにちは"}]
+    assert path.read_text(encoding="utf-8").count("\n") == 2
+
+
+def test_iter_missing_journal_is_empty(tmp_path):
+    assert list(journal.iter_records(tmp_path / "missing.jsonl")) == []
+
+
+def test_torn_record_is_skipped(tmp_path):
+    path = tmp_path / "log.jsonl"
+    journal.append(path, {"id": 1})
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": ')
+    journal.append(path, {"id": 2})
+    assert list(journal.iter_records(path)) == [{"id": 1}, {"id": 2}]
+
+
+def test_compact_moves_old_records_to_archive(tmp_path):
+    path = tmp_path / "log.jsonl"
+    for month in ["2024-01", "2024-01", "2024-02", "2024-03"]:
+        journal.append(path, {"month": month})
+
+    def segment_of(r):
+        return r["month"]
+
+    assert journal.compact(path, segment_of, "2024-03") == 3
+    assert list(journal.iter_segment(path)) == [{"month": "2024-03"}]
+    names = [p.name for p in journal.segments(path)]
+    assert names == ["2024-01.jsonl.gz", "2024-02.jsonl.gz"]
+    with gzip.open(journal.archive_dir(path) / "2024-01.jsonl.gz", "rt", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [{"month": "2024-01"}] * 2
+
+    # A second compaction appends to the existing segment
+    journal.append(path, {"month": "2024-01"})
+    assert journal.compact(path, segment_of, "2024-03") == 1
+    assert [r["month"] for r in journal.iter_records(path)] == [
+        "2024-01",
+        "2024-01",
+        "2024-01",
+        "2024-02",
+        "2024-03",
+    ]
+    assert journal.compact(path, segment_of, "2024-03") == 0
+
+
+def test_read_from_returns_complete_records_after_offset(tmp_path):
+    path = tmp_path / "log.jsonl"
+    journal.append(path, {"n": 1})
+    records, offset = journal.read_from(path, 0)
+    assert records == [{"n": 1}]
+    journal.append(path, {"n": 2})
+    with open(path, "ab") as f:
+        f.write(b'{"n": 3')
+    records, end = journal.read_from(path, offset)
+    assert records == [{"n": 2}] and end < path.stat().st_size
+    assert journal.read_from(tmp_path / "missing.jsonl", 0) == ([], 0)
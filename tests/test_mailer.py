@@ -0,0 +1,61 @@
+from email.message import EmailMessage
+
+import config
+import pytest
+
+from app import mailer, utils
+
+
+def _message(n):
+    msg = EmailMessage()
+    msg["Subject"] = f"reminder {n}"
+    msg["From"] = "famigliapp@example.com"
+    msg["To"] = f"user{n}@example.com"
+    msg.set_content(f"body {n}")
+    return msg
+
+
+@pytest.fixture
+def sink():
+    with mailer.SMTPSink() as smtp_sink:
+        yield smtp_sink
+
+
+def test_messages_share_one_session(sink):
+    pool = mailer.SMTPPool(sink.host, sink.port)
+    for n in range(5):
+        pool.send(_message(n))
+    pool.close()
+    assert sink.connections == 1
+    assert [m["Subject"] for _, _, m in sink.messages] == [f"reminder {n}" for n in range(5)]
+    assert sink.messages[0][1] == ["user0@example.com"]
+
+
+def test_dropped_session_is_replaced(sink):
+    pool = mailer.SMTPPool(sink.host, sink.port)
+    pool.send(_message(1))
+    # The server side went away while the session was idle
+    pool._idle[0].smtp.close()
+    pool.send(_message(2))
+    pool.close()
+    assert pool.connections == 2
+    assert [m["Subject"] for _, _, m in sink.messages] == ["reminder 1", "reminder 2"]
+
+
+def test_idle_sessions_expire(sink, monkeypatch):
+    monkeypatch.setattr(mailer, "IDLE_TIMEOUT", -1)
+    pool = mailer.SMTPPool(sink.host, sink.port)
+    pool.send(_message(1))
+    pool.send(_message(2))
+    pool.close()
+    assert pool.connections == 2 and len(sink.messages) == 2
+
+
+def test_send_email_uses_configured_server(sink, monkeypatch):
+    monkeypatch.setattr(config, "MAIL_SERVER", sink.host)
+    monkeypatch.setattr(config, "MAIL_PORT", sink.port)
+    for n in range(3):
+        utils.send_email("Points updated", f"body {n}", f"user{n}@example.com")
+    mailer.close_all()
+    assert [r for _, r, _ in sink.messages] == [["user0@example.com"], ["user1@example.com"], ["user2@example.com"]]
+    assert sink.connections == 1
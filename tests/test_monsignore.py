@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta
 import os
 import tempfile
 from pathlib import Path
@@ -7,7 +8,7 @@ import pytest
 
 flask = pytest.importorskip("flask")
 
-from app import create_app
+from app import create_app, storage
 from app.monsignore import utils
 
 
@@ -85,3 +86,17 @@ def test_add_sends_notifications(monkeypatch, tmp_path):
 
     expected = {u["email"] for u in config.USERS.values()}
     assert set(sent) == expected
+
+
+def test_archive_kadai_older_than(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "KADAI_PATH", tmp_path / "kadai.json")
+    now = datetime.now()
+    storage.save_json(utils.KADAI_PATH, [
+        {"id": 1, "status": "active", "timestamp": (now - timedelta(hours=49)).isoformat()},
+        {"id": 2, "status": "active", "timestamp": (now - timedelta(hours=1)).isoformat()},
+        {"id": 3, "status": "active", "timestamp": "not a date"},
+        {"id": 4, "status": "active", "timestamp": (now - timedelta(days=9)).isoformat()},
+    ])
+    assert utils.archive_kadai_older_than(now - timedelta(hours=48)) == [1, 4]
+    assert [e["id"] for e in utils.get_active_kadai_entries()] == [2, 3]
+    assert [e["id"] for e in utils.get_archived_kadai_entries()] == [1, 4]
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+
+import config
+import pytest
+
+from app import outbox, utils
+
+_tmpdir = None
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    config.OUTBOX_FILE = os.path.join(_tmpdir.name, "outbox.sqlite3")
+
+
+def teardown_function():
+    outbox.stop()
+    _tmpdir.cleanup()
+
+
+def test_jobs_are_delivered_and_removed():
+    delivered = []
+    outbox.register("test", delivered.append)
+    outbox.enqueue("test", {"n": 1})
+    outbox.enqueue("test", {"n": 2})
+    assert [job["payload"] for job in outbox.pending()] == [{"n": 1}, {"n": 2}]
+    assert outbox.drain() == 2
+    assert delivered == [{"n": 1}, {"n": 2}]
+    assert outbox.pending() == []
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        outbox.enqueue("no-such-kind", {})
+
+
+def test_failed_jobs_are_retried_with_backoff(monkeypatch):
+    calls = []
+
+    def flaky(job):
+        calls.append(job)
+        if len(calls) < 3:
+            raise ConnectionError("mail server down")
+
+    outbox.register("flaky", flaky)
+    outbox.enqueue("flaky", {})
+    now = time.time()
+    assert outbox.drain(now) == 1
+    [job] = outbox.pending()
+    assert job["attempts"] == 1 and "mail server down" in job["last_error"]
+    assert job["next_attempt"] >= now + outbox.BACKOFF_BASE * 0.8
+
+    # Not due yet
+    assert outbox.drain(now) == 0
+    assert outbox.drain(now + 10 * outbox.BACKOFF_MAX) == 1
+    assert outbox.drain(now + 20 * outbox.BACKOFF_MAX) == 1
+    assert len(calls) == 3 and outbox.pending() == []
+
+
+def test_job_fails_permanently_after_max_attempts():
+    def broken(job):
+        raise RuntimeError("boom")
+
+    outbox.register("broken", broken)
+    outbox.enqueue("broken", {"to": "x"})
+    later = time.time()
+    for _ in range(outbox.MAX_ATTEMPTS):
+        later += 10 * outbox.BACKOFF_MAX
+        outbox.drain(later)
+    assert outbox.pending() == []
+    [job] = outbox.pending("failed")
+    assert job["attempts"] == outbox.MAX_ATTEMPTS and job["payload"] == {"to": "x"}
+
+
+def test_send_email_only_queues_while_workers_run(monkeypatch):
+    sent = []
+    monkeypatch.setattr(utils, "deliver_email", lambda subject, body, to: sent.append((subject, to)))
+    monkeypatch.setattr(outbox, "running", lambda: True)
+    monkeypatch.setattr(config, "LINE_NOTIFY_TOKEN", "", raising=False)
+    monkeypatch.setattr(config, "PUSHBULLET_TOKEN", "", raising=False)
+    utils.send_email("hello", "body", "a@example.com")
+    assert sent == []
+    assert [job["kind"] for job in outbox.pending()] == ["email"]
+    outbox.drain()
+    assert sent == [("hello", "a@example.com")]
+
+
+def test_worker_threads_drain_the_outbox():
+    delivered = []
+    outbox.register("test", delivered.append)
+    outbox.start(workers=2)
+    assert outbox.running()
+    for n in range(5):
+        outbox.enqueue("test", {"n": n})
+    deadline = time.time() + 5
+    while len(delivered) < 5 and time.time() < deadline:
+        time.sleep(0.01)
+    outbox.stop()
+    assert sorted(job["n"] for job in delivered) == list(range(5))
+    assert not outbox.running()
@@ -111,3 +111,20 @@ def test_edit_comment_route():
         assert res.status_code == 200
         assert "コメントを更新しました".encode("utf-8") in res.data
         assert utils.get_comments(post_id)[0]["text"] == "after"
+
+
+def test_unfiltered_list_reads_only_the_newest_page(monkeypatch):
+    monkeypatch.setattr(utils, "POSTS_PATH", Path(_tmpdir.name) / "paged_posts.json")
+    for n in range(1, 26):
+        utils.add_post("user2" if n % 5 == 0 else "user1", "diary", f"entry-{n:02d}")
+    monkeypatch.setattr(utils, "filter_posts", lambda **kw: pytest.fail("unfiltered view scanned the store"))
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["user"] = {"username": "user1", "role": "user", "email": "u1@example.com"}
+        text = client.get("/posts/").get_data(as_text=True)
+        assert "entry-25" in text and "entry-06" in text and "entry-05" not in text
+        assert "cursor=6" in text
+        text = client.get("/posts/?author=user2").get_data(as_text=True)
+        assert "entry-25" in text and "entry-05" in text and "entry-24" not in text
@@ -1,6 +1,6 @@
 import os
 import tempfile
-from datetime import date
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
 import pytest
@@ -8,6 +8,7 @@ import pytest
 flask = pytest.importorskip("flask")
 
 import config
+from app import storage
 from app.principessina import utils, tasks
 
 
@@ -38,3 +39,21 @@ def test_notify_missing_posts(monkeypatch):
     assert any(to == config.USERS["user2"]["email"] for _, _, to in sent)
     # admin should also be notified if not posted (since config lists admin)
     assert "admin" in notified
+
+
+def test_archive_old_reports_saves_once(monkeypatch):
+    old = (datetime.now() - timedelta(days=4)).isoformat(timespec="seconds")
+    storage.save_json(utils.PRINCIPESSINA_PATH, [
+        {"id": 1, "author": "user1", "report_type": "yura", "timestamp": old, "status": "active"},
+        {"id": 2, "author": "user1", "report_type": "mangiato", "timestamp": old, "status": "archived"},
+        {"id": 3, "author": "user2", "report_type": "yura", "timestamp": old, "status": "active"},
+    ])
+    new_id = utils.add_report("user2", "mangiato", "fresh")
+    saves = []
+    save_posts = utils.save_posts
+    monkeypatch.setattr(utils, "save_posts", lambda posts: (saves.append(len(posts)), save_posts(posts)))
+
+    assert tasks.archive_old_reports() == [1, 3]
+    assert saves == [4]
+    assert [r["id"] for r in utils.get_active_reports()] == [new_id]
+    assert utils.archive_reports_older_than(datetime.now() - timedelta(days=3)) == []
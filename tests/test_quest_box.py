@@ -123,3 +123,22 @@ def test_edit_route():
         assert q["due_date"] == "2030-05-01"
         assert q["assigned_to"] == ["u2"]
 
+
+
+def test_quest_list_is_paginated(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "QUESTS_PATH", tmp_path / "quests.json")
+    for n in range(1, 26):
+        utils.add_quest("user1", f"quest-{n:02d}", "b")
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["user"] = {"username": "user1", "role": "user", "email": "u1@example.com"}
+        res = client.get("/quest_box/")
+        assert b"quest-25" in res.data and b"quest-06" in res.data
+        assert b"quest-05" not in res.data
+        assert b"/quest_box/?cursor=6" in res.data
+        res = client.get("/quest_box/?cursor=6")
+        assert b"quest-05" in res.data and b"quest-01" in res.data
+        assert b"quest-06" not in res.data
+        assert b"cursor=" not in res.data
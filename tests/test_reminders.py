@@ -0,0 +1,210 @@
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import config
+
+from app import reminders, storage
+from app.corso import tasks as corso_tasks, utils as corso_utils
+from app.principessina import tasks as principessina_tasks, utils as principessina_utils
+
+_tmpdir = None
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    principessina_utils.PRINCIPESSINA_PATH = Path(_tmpdir.name) / "principessina.json"
+    corso_utils.CORSO_PATH = Path(_tmpdir.name) / "corso.json"
+    config.JOB_LEDGER_FILE = os.path.join(_tmpdir.name, "job_runs.json")
+
+
+def teardown_function():
+    _tmpdir.cleanup()
+
+
+def _counting_index(path):
+    builds = []
+
+    def build(entries):
+        builds.append(len(entries))
+        return {e["id"]: {"submitted": set(e["users"])} for e in entries}
+
+    return reminders.ReminderIndex(lambda: path, build), builds
+
+
+def test_index_follows_writes_without_rebuilding():
+    path = Path(_tmpdir.name) / "entries.json"
+    storage.save_json(path, [{"id": 1, "users": ["a"]}])
+    index, builds = _counting_index(path)
+    assert index.get()[1]["submitted"] == {"a"}
+
+    with storage.locked(path):
+        before = index.stamp()
+        storage.save_json(path, [{"id": 1, "users": ["a", "b"]}])
+        index.update(before, reminders.add_to("submitted", 1, "b"))
+    assert index.get()[1]["submitted"] == {"a", "b"}
+    assert builds == [1]
+
+
+def test_index_is_rebuilt_after_other_writes():
+    path = Path(_tmpdir.name) / "entries.json"
+    storage.save_json(path, [{"id": 1, "users": []}])
+    index, builds = _counting_index(path)
+    index.get()
+    # Written by another process: the index does not know the change
+    storage.save_json(path, [{"id": 1, "users": []}, {"id": 2, "users": ["c"]}])
+    assert index.get()[2]["submitted"] == {"c"}
+
+    # The index missed a write, so a later update is not applied on top of it
+    storage.save_json(path, [{"id": 2, "users": ["c"]}, {"id": 3, "users": []}])
+    before = index.stamp()
+    storage.save_json(path, [{"id": 3, "users": []}])
+    index.update(before, reminders.drop(2))
+    assert list(index.get()) == [3]
+    assert builds == [1, 2, 1]
+
+
+def test_submitted_report_types_by_author_and_day():
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    storage.save_json(principessina_utils.PRINCIPESSINA_PATH, [
+        {"id": 1, "author": "user1", "report_type": "yura", "timestamp": f"{yesterday}T12:00:00"},
+        {"id": 2, "author": "user1", "report_type": "mangiato", "timestamp": "broken"},
+    ])
+    principessina_utils.add_report("user1", "mangiato", "pasta")
+    principessina_utils.add_report("user2", "yura", "sleeping")
+    today = date.today()
+    assert principessina_utils.submitted_report_types("user1", today - timedelta(days=1)) == {"yura"}
+    assert principessina_utils.submitted_report_types("user1", today) == {"mangiato"}
+    assert principessina_tasks._missing_report_types("user2", today) == ["mangiato"]
+    assert principessina_tasks._missing_report_types("user3", today) == ["yura", "mangiato"]
+
+
+def test_corso_reminders_skip_users_with_feedback(monkeypatch):
+    ended = date.today() - timedelta(days=1)
+    corso_utils.add_post("admin", "guitar", "body", end_date=ended)
+    [post] = corso_utils.load_posts()
+    for user in list(config.USERS)[1:]:
+        corso_utils.add_feedback(post["id"], user, "great")
+    notified = []
+    monkeypatch.setattr(corso_tasks, "_notify", lambda users, subject, body: notified.append(users))
+
+    corso_tasks.daily_reminder(date.today())
+    assert notified == [list(config.USERS)[:1]]
+
+    notified.clear()
+    corso_utils.add_feedback(post["id"], list(config.USERS)[0], "late")
+    corso_tasks.daily_reminder(date.today())
+    assert notified == []
+
+    corso_utils.finish_post(post["id"])
+    assert corso_utils.open_feedback() == []
+
+
+def test_queue_pops_only_due_items():
+    handled = []
+    reminders.register("test.kind", lambda items, now: handled.extend(items))
+    now = time.time()
+    reminders.schedule("test.kind", "a", now - 10)
+    reminders.schedule("test.kind", "b", now + 3600)
+    reminders.schedule("test.kind", "c", now - 5)
+    # An item already pending keeps its time
+    reminders.schedule("test.kind", "a", now + 60, replace=False)
+    assert reminders.resolve("test.kind", "c") == 1
+
+    assert reminders.tick(now) == 1
+    assert handled == [("a", now - 10)]
+    assert reminders.tick(now) == 0
+    assert reminders.pending("test.kind") == [("b", now + 3600)]
+
+
+def test_failed_handler_items_are_retried():
+    def broken(items, now):
+        raise RuntimeError("smtp down")
+
+    reminders.register("test.broken", broken)
+    now = time.time()
+    reminders.schedule("test.broken", "x", now)
+    assert reminders.tick(now) == 1
+    assert reminders.pending("test.broken") == [("x", now + reminders.RETRY_DELAY)]
+
+
+def test_decima_reminders_stop_once_reported(monkeypatch):
+    day = date.today()
+    sent = []
+    monkeypatch.setattr(principessina_tasks.calendario_utils, "get_users_on_shift", lambda d: ["user1", "user2"])
+    monkeypatch.setattr(principessina_tasks, "send_email", lambda subject, body, to: sent.append((to, body)))
+    principessina_utils.add_report("user2", "yura", "sleeping")
+    assert principessina_tasks.schedule_decima_reminders(day) == 3
+
+    first, last = principessina_tasks._reminder_window(day)
+    principessina_tasks.send_decima_report_reminders(reminders.pop_due(first)[principessina_utils.DECIMA_REMINDER], first)
+    assert [to for to, _ in sent] == ["u1@example.com", "u2@example.com"]
+    assert "「今日のユラちゃん」と「食べたもの」" in sent[0][1]
+    # Next reminders an hour later
+    assert {due for _, due in reminders.pending(principessina_utils.DECIMA_REMINDER)} == {first + 3600}
+
+    # Reporting resolves the pending item right away
+    principessina_utils.add_report("user2", "mangiato", "pasta")
+    keys = [key for key, _ in reminders.pending(principessina_utils.DECIMA_REMINDER)]
+    assert keys == [f"{day.isoformat()}|user1|mangiato", f"{day.isoformat()}|user1|yura"]
+
+
+def test_decima_reminders_follow_shift_changes(monkeypatch):
+    day = date.today()
+    on_shift = ["user1"]
+    sent = []
+    monkeypatch.setattr(principessina_tasks.calendario_utils, "get_users_on_shift", lambda d: list(on_shift))
+    monkeypatch.setattr(principessina_tasks, "send_email", lambda subject, body, to: sent.append(to))
+    assert principessina_tasks.schedule_decima_reminders(day) == 2
+    first, _ = principessina_tasks._reminder_window(day)
+
+    # user2 joins and user1 leaves the shift after the reminders were queued
+    on_shift[:] = ["user2"]
+    principessina_tasks.sync_decima_reminders(day, now=first + 60)
+    users = {key.split("|")[1] for key, _ in reminders.pending(principessina_utils.DECIMA_REMINDER)}
+    assert users == {"user2"}
+
+    # Removed from the shift between two reminders: no mail and no next reminder
+    on_shift[:] = []
+    principessina_tasks.send_decima_report_reminders(reminders.pop_due(first)[principessina_utils.DECIMA_REMINDER], first)
+    assert sent == [] and reminders.pending(principessina_utils.DECIMA_REMINDER) == []
+
+
+def test_shift_changes_are_reported_with_their_dates(monkeypatch):
+    from app.calendario import utils as calendario_utils
+
+    monkeypatch.setattr(calendario_utils, "EVENTS_PATH", Path(_tmpdir.name) / "events.json")
+    monkeypatch.setattr(calendario_utils, "check_rules_and_notify", lambda **kw: None)
+    monkeypatch.setattr(calendario_utils, "_notify_event", lambda *args: None)
+    changed = []
+    monkeypatch.setattr(calendario_utils, "_shift_listeners", [changed.append])
+
+    calendario_utils.set_shift_schedule(date(2030, 1, 1), {"2030-01-10": ["user1"]})
+    assert changed == [[date(2030, 1, 10)]]
+    [event] = calendario_utils.load_events()
+    calendario_utils.move_event(event["id"], date(2030, 1, 12))
+    calendario_utils.assign_employee(event["id"], "user2")
+    assert changed[1:] == [[date(2030, 1, 10), date(2030, 1, 12)], [date(2030, 1, 12)]]
+
+
+def test_corso_overdue_reminders_repeat_until_feedback(monkeypatch):
+    due_passed = date.today() - timedelta(days=5)
+    corso_utils.add_post("admin", "guitar", "body", end_date=due_passed)
+    [post] = corso_utils.load_posts()
+    notified = []
+    monkeypatch.setattr(corso_tasks, "_notify", lambda users, subject, body: notified.append(users))
+    monkeypatch.setattr(corso_tasks, "get_admin_email", lambda: None)
+
+    assert corso_tasks.schedule_overdue_reminders() == 1
+    now = time.time()
+    assert reminders.tick(now + 1) == 1
+    assert notified == [list(config.USERS)]
+    [(key, due)] = reminders.pending(corso_utils.OVERDUE_REMINDER)
+    assert key == str(post["id"]) and due > now
+
+    for user in config.USERS:
+        corso_utils.add_feedback(post["id"], user, "done")
+    assert reminders.pending(corso_utils.OVERDUE_REMINDER) == []
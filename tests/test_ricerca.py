@@ -0,0 +1,72 @@
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from app import create_app, utils
+from app.corso import utils as corso_utils
+from app.quest_box import utils as quest_utils
+from app.resoconto import utils as resoconto_utils
+
+flask = pytest.importorskip("flask")
+
+
+def setup_module(module):
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    utils.POSTS_PATH = Path(_tmpdir.name) / "posts.json"
+    utils.COMMENTS_PATH = Path(_tmpdir.name) / "comments.json"
+    corso_utils.CORSO_PATH = Path(_tmpdir.name) / "corso.json"
+    quest_utils.QUESTS_PATH = Path(_tmpdir.name) / "quests.json"
+    resoconto_utils.REPORTS_PATH = Path(_tmpdir.name) / "resoconto.json"
+
+
+def teardown_module(module):
+    _tmpdir.cleanup()
+
+
+def _client(username="user1", role="user"):
+    app = create_app()
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user"] = {"username": username, "role": role, "email": f"{username}@example.com"}
+    return client
+
+
+def test_search_page_lists_every_board_with_facets():
+    utils.add_post("user1", "diary", "運動会の写真")
+    corso_utils.add_post("admin", "運動会の準備", "体操服")
+    quest_utils.add_quest("user1", "運動会の弁当", "おにぎり")
+    client = _client()
+
+    res = client.get("/ricerca/?q=運動会")
+    text = res.get_data(as_text=True)
+    assert res.status_code == 200
+    assert "運動会の写真" in text and "運動会の準備" in text and "運動会の弁当" in text
+    assert "Corso (1)" in text and "/corso/detail/1" in text
+
+    res = client.get("/ricerca/?q=運動会&module=quest_box")
+    text = res.get_data(as_text=True)
+    assert "運動会の弁当" in text and "運動会の写真" not in text
+
+
+def test_search_page_requires_login():
+    app = create_app()
+    res = app.test_client().get("/ricerca/?q=x")
+    assert res.status_code == 302
+
+
+def test_search_hides_reports_of_other_users():
+    resoconto_utils.add_report("user2", date(2025, 3, 1), work="秘密の棚卸し", issue="倉庫の鍵")
+    resoconto_utils.add_report("user1", date(2025, 3, 2), work="自分の棚卸し")
+
+    text = _client().get("/ricerca/?q=棚卸し").get_data(as_text=True)
+    assert "自分の棚卸し" in text and "秘密の棚卸し" not in text
+    assert "Resoconto (1)" in text
+    assert "倉庫の鍵" not in _client().get("/ricerca/?q=倉庫").get_data(as_text=True)
+
+    text = _client("admin", "admin").get("/ricerca/?q=棚卸し").get_data(as_text=True)
+    assert "秘密の棚卸し" in text and "Resoconto (2)" in text
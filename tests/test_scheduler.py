@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+import os
+import tempfile
+import time
+
+import config
+
+from app import scheduler, storage
+
+_tmpdir = None
+
+
+class FakeScheduler:
+    instances = []
+
+    def __init__(self):
+        self.jobs = {}
+        self.running = False
+        FakeScheduler.instances.append(self)
+
+    def add_job(self, func, trigger=None, args=(), id=None, replace_existing=False, coalesce=False,
+                misfire_grace_time=None, **cron):
+        self.jobs[id] = (func, trigger, cron, args)
+
+    def start(self):
+        self.running = True
+
+    def shutdown(self, wait=True):
+        self.running = False
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    config.SCHEDULER_LOCK_FILE = os.path.join(_tmpdir.name, "scheduler.lock")
+    config.JOB_LEDGER_FILE = os.path.join(_tmpdir.name, "job_runs.json")
+    FakeScheduler.instances = []
+
+
+def teardown_function():
+    scheduler.stop()
+    _tmpdir.cleanup()
+
+
+def _wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_task_modules_register_their_jobs():
+    scheduler.load_task_modules()
+    jobs = scheduler.jobs()
+    assert jobs["resoconto.daily_posts"] == {"hour": 4}
+    assert jobs["principessina.archive_decima_reports"] == {"hour": 1, "minute": 15}
+    assert jobs["monsignore.notify_kadai_reminders"] == {"hour": 10}
+    assert {job_id.split(".")[0] for job_id in jobs} >= {
+        "resoconto", "intrattenimento", "seminario", "principessina", "corso", "punto", "monsignore"
+    }
+
+
+def test_leader_lock_is_exclusive():
+    path = config.SCHEDULER_LOCK_FILE
+    first, second = scheduler.LeaderLock(path), scheduler.LeaderLock(path)
+    assert first.acquire()
+    assert not second.acquire()
+    with open(path) as fh:
+        assert fh.read().strip() == str(os.getpid())
+    # The leader went away
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_elected_process_runs_every_job_on_one_scheduler(monkeypatch):
+    monkeypatch.setattr(scheduler, "BackgroundScheduler", FakeScheduler)
+    assert scheduler.start(interval=0.01)
+    assert _wait_for(scheduler.is_leader)
+    [fake] = FakeScheduler.instances
+    assert fake.running and set(fake.jobs) == set(scheduler.jobs())
+    assert fake.jobs["corso.daily_reminder"][1:] == ("cron", {"hour": 9}, ("corso.daily_reminder",))
+    # Starting again does not add a second scheduler
+    scheduler.start(interval=0.01)
+    assert len(FakeScheduler.instances) == 1
+
+
+def test_follower_takes_over_when_leader_exits(monkeypatch):
+    monkeypatch.setattr(scheduler, "BackgroundScheduler", FakeScheduler)
+    leader = scheduler.LeaderLock(config.SCHEDULER_LOCK_FILE)
+    assert leader.acquire()
+    scheduler.start(interval=0.01)
+    time.sleep(0.1)
+    assert not scheduler.is_leader() and FakeScheduler.instances == []
+    leader.release()
+    assert _wait_for(scheduler.is_leader)
+    scheduler.stop()
+    assert not FakeScheduler.instances[0].running
+
+
+def _daily_next_fire(cron, after):
+    # Stand-in for CronTrigger handling {"hour": h}
+    fire = after.replace(hour=cron["hour"], minute=0, second=0, microsecond=0)
+    return fire if fire > after else fire + timedelta(days=1)
+
+
+def test_missed_runs_are_caught_up_once(monkeypatch):
+    monkeypatch.setattr(scheduler, "_jobs", {})
+    monkeypatch.setattr(scheduler, "_next_fire", _daily_next_fire)
+    runs = []
+    scheduler.register("test.archive", lambda: runs.append("archive"), hour=1)
+    scheduler.register("test.report", lambda: runs.append("report"), hour=4)
+
+    # First seen: nothing to catch up
+    now = datetime(2025, 3, 10, 2, 0)
+    assert scheduler.missed_jobs(now) == []
+    assert scheduler.ledger()["test.archive"]["since"] == now.isoformat()
+
+    # Down from 02:00 until three days later at 03:00
+    later = datetime(2025, 3, 13, 3, 0)
+    assert scheduler.missed_jobs(later) == ["test.archive", "test.report"]
+    assert scheduler.run_job("test.archive")
+    assert scheduler.ledger()["test.archive"]["last_success"] is not None
+    assert scheduler.missed_jobs(datetime.now() + timedelta(hours=1)) == ["test.report"]
+
+
+def test_failed_run_is_recorded_and_caught_up(monkeypatch):
+    monkeypatch.setattr(scheduler, "_jobs", {})
+    monkeypatch.setattr(scheduler, "_next_fire", _daily_next_fire)
+
+    def broken():
+        raise RuntimeError("disk full")
+
+    scheduler.register("test.broken", broken, hour=1)
+    scheduler.missed_jobs(datetime(2025, 3, 10, 2, 0))
+    assert not scheduler.run_job("test.broken")
+    entry = scheduler.ledger()["test.broken"]
+    assert "disk full" in entry["last_error"] and "last_success" not in entry
+    assert scheduler.missed_jobs(datetime(2025, 3, 11, 2, 0)) == ["test.broken"]
+
+
+def test_leader_schedules_one_catch_up_per_missed_job(monkeypatch):
+    monkeypatch.setattr(scheduler, "BackgroundScheduler", FakeScheduler)
+    monkeypatch.setattr(scheduler, "missed_jobs", lambda: ["punto.compact_history"])
+    scheduler.start(interval=0.01)
+    assert _wait_for(scheduler.is_leader)
+    [fake] = FakeScheduler.instances
+    func, trigger, _, args = fake.jobs["punto.compact_history.catch_up"]
+    assert func is scheduler.run_job and trigger is None and args == ("punto.compact_history",)
+
+
+def test_job_state_survives_restart():
+    scheduler.set_job_state("test.alerts", sent="2025-03-10")
+    scheduler.set_job_state("test.alerts", count=2)
+    storage.invalidate()
+    assert scheduler.job_state("test.alerts") == {"sent": "2025-03-10", "count": 2}
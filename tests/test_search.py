@@ -0,0 +1,165 @@
+import tempfile
+from datetime import date
+from pathlib import Path
+
+from app import search, storage, tiering
+from app import utils
+from app.corso import utils as corso_utils
+from app.monsignore import utils as monsignore_utils
+from app.resoconto import utils as resoconto_utils
+
+_tmpdir = None
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    utils.POSTS_PATH = Path(_tmpdir.name) / "posts.json"
+    utils.COMMENTS_PATH = Path(_tmpdir.name) / "comments.json"
+    corso_utils.CORSO_PATH = Path(_tmpdir.name) / "corso.json"
+    monsignore_utils.MONSIGNORE_PATH = Path(_tmpdir.name) / "monsignore.json"
+    resoconto_utils.REPORTS_PATH = Path(_tmpdir.name) / "resoconto.json"
+
+
+def teardown_function():
+    _tmpdir.cleanup()
+
+
+def _index(records):
+    path = Path(_tmpdir.name) / "records.json"
+    storage.save_json(path, records)
+    tokenised = []
+    index = search.SearchIndex.for_file("test", lambda: path, ("text",))
+    real_add = index._add
+    index._add = lambda key, text: tokenised.append(key) or real_add(key, text)
+    return index, path, tokenised
+
+
+def test_japanese_text_is_found_without_word_boundaries():
+    index, _, _ = _index([
+        {"id": 1, "text": "今日は公園でピクニックをしました"},
+        {"id": 2, "text": "明日は公民館で会議"},
+        {"id": 3, "text": "ＡＢＣ　Ｔｅｓｔ"},
+    ])
+    assert index.matching_ids("公園") == {1}
+    assert index.matching_ids("公") == {1, 2}
+    assert index.matching_ids("ピクニック") == {1}
+    assert index.matching_ids("公園 会議") == set()
+    # Full-width and upper case text match a plain query
+    assert index.matching_ids("abc test") == {3}
+
+
+def test_only_changed_records_are_tokenised():
+    index, path, tokenised = _index([{"id": 1, "text": "りんご"}, {"id": 2, "text": "みかん"}])
+    assert index.matching_ids("りんご") == {1}
+    assert sorted(tokenised) == [1, 2]
+
+    storage.save_json(path, [{"id": 1, "text": "りんご"}, {"id": 2, "text": "ぶどう"}, {"id": 3, "text": "りんごジャム"}])
+    assert index.matching_ids("りんご") == {1, 3}
+    assert index.matching_ids("みかん") == set()
+    assert sorted(tokenised) == [1, 2, 2, 3]
+
+
+def test_unchanged_records_are_not_normalised_again(monkeypatch):
+    index, path, _ = _index([{"id": n, "text": f"記録{n}"} for n in range(1, 51)])
+    assert index.matching_ids("記録7") == {7}
+    normalised = []
+    real_text = index._text
+    monkeypatch.setattr(index, "_text", lambda record: normalised.append(record["id"]) or real_text(record))
+
+    records = storage.load_json(path, [])
+    records[9]["text"] = "変更"
+    records[0]["other"] = "not indexed"
+    storage.save_json(path, records[:-1])
+    assert index.matching_ids("変更") == {10}
+    assert index.matching_ids("記録50") == set()
+    assert normalised == [10]
+
+
+def test_archive_index_reads_only_changed_periods(monkeypatch):
+    hot = Path(_tmpdir.name) / "tasks.json"
+    archive = tiering.ColdArchive("search_test", lambda: hot, lambda r: r["done"], tiering.month_of("ts"))
+    try:
+        index = search.SearchIndex.for_archive("search_test_archive", archive, ("text",))
+        storage.save_json(hot, [
+            {"id": 1, "text": "古い花", "ts": "2025-01-05", "done": True},
+            {"id": 2, "text": "二月の花", "ts": "2025-02-05", "done": True},
+        ])
+        archive.move()
+        assert index.matching_ids("花") == {1, 2}
+
+        read = []
+        real_records = archive.records
+        monkeypatch.setattr(archive, "records", lambda period: read.append(period) or real_records(period))
+        storage.save_json(hot, [{"id": 3, "text": "三月の花", "ts": "2025-03-05", "done": True}])
+        archive.move()
+        assert index.matching_ids("花") == {1, 2, 3}
+        assert read == ["2025-03"]
+
+        archive.delete(2)
+        assert index.matching_ids("花") == {1, 3}
+        assert read == ["2025-03"]
+    finally:
+        tiering._archives.pop("search_test", None)
+        search._indexes.pop("search_test_archive", None)
+
+
+def test_search_ranks_and_pages_results():
+    index, _, _ = _index([
+        {"id": 1, "text": "猫"},
+        {"id": 2, "text": "猫と猫と猫"},
+        {"id": 3, "text": "犬"},
+        {"id": 4, "text": "猫が好き"},
+    ])
+    page = index.search("猫", limit=2)
+    assert [r["id"] for r in page.items] == [2, 4] and page.total == 3
+    assert [r["id"] for r in index.search("猫", offset=2, limit=2).items] == [1]
+    assert index.search("猫", where=lambda r: r["id"] != 2).total == 2
+
+
+def test_board_filters_use_the_index():
+    utils.add_post("user1", "diary", "家族で旅行に行きました")
+    utils.add_post("user2", "diary", "旅行の写真")
+    utils.add_post("user1", "news", "晩ごはん")
+    assert [p["id"] for p in utils.filter_posts(keyword="旅行")] == [1, 2]
+    assert [p["id"] for p in utils.filter_posts(keyword="旅行", author="user2")] == [2]
+
+    monsignore_utils.add_post("user1", "ピアノの練習")
+    assert [p["body"] for p in monsignore_utils.filter_posts(keyword="ピアノ")] == ["ピアノの練習"]
+
+    corso_utils.add_post("admin", "ギター講座", "コードの押さえ方")
+    corso_utils.add_post("admin", "料理", "カレー")
+    corso_utils.finish_post(1)
+    assert [p["id"] for p in corso_utils.filter_posts(keyword="ギター", include_expired=True)] == [1]
+
+
+def test_comments_and_reports_are_searchable():
+    utils.add_comment(1, "user1", "かわいい写真ですね")
+    utils.add_comment(1, "user2", "写真ありがとう")
+    page = utils.search_comments("写真", limit=1)
+    assert page.total == 2 and len(page.items) == 1
+
+    resoconto_utils.add_report("user1", date(2025, 3, 1), work="在庫の整理", issue="棚が足りない")
+    resoconto_utils.add_report("user2", date(2025, 3, 2), work="接客")
+    assert [r["author"] for r in resoconto_utils.filter_reports(keyword="棚")] == ["user1"]
+
+
+def test_search_all_counts_modules_and_pages_with_a_cursor():
+    for n in range(3):
+        utils.add_post("user1", "diary", f"花火大会 {n}")
+    corso_utils.add_post("admin", "花火の撮り方", "三脚を使う")
+    page = search.search_all("花火", modules=["posts", "corso"], limit=2)
+    assert page.facets["posts"] == 3 and page.facets["corso"] == 1
+    assert len(page.items) == 2 and page.next_cursor
+
+    # A post added between pages is not repeated on the next one
+    utils.add_post("user2", "diary", "花火")
+    rest = search.search_all("花火", modules=["posts", "corso"], cursor=page.next_cursor, limit=10)
+    seen = [(i["index"], i["record"]["id"]) for i in page.items + rest.items]
+    assert len(seen) == len(set(seen)) == 4
+    assert rest.next_cursor is None
+
+    only_corso = search.search_all("花火", modules=["corso"])
+    assert [i["module"] for i in only_corso.items] == ["corso"] and only_corso.facets["posts"] == 4
+    assert search.search_all("  ").items == []
+    assert search.decode_cursor("not a cursor") is None
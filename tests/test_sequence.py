@@ -0,0 +1,38 @@
+import threading
+
+from app import sequence, storage
+
+
+def test_sequence_starts_after_existing_records(tmp_path):
+    path = tmp_path / "data.json"
+    records = [{"id": 3}, {"id": 7}]
+    assert sequence.next_id(path, records) == 8
+    # The records are only read to seed the counter
+    assert sequence.next_id(path, [{"id": 100}]) == 9
+    assert sequence.next_id(path, count=3) == 10
+    assert sequence.next_id(path) == 13
+    assert storage.read_json(sequence.counter_path(path)) == {"last": 13}
+
+
+def test_sequence_respects_floor_and_recovers_from_a_bad_counter(tmp_path):
+    path = tmp_path / "data.json"
+    assert sequence.next_id(path, [{"id": 2}], floor=lambda: 40) == 41
+    with open(sequence.counter_path(path), "w") as f:
+        f.write("{")
+    assert sequence.next_id(path, [{"id": 5}]) == 6
+
+
+def test_sequence_hands_out_unique_ids_across_threads(tmp_path):
+    path = tmp_path / "data.json"
+    ids = []
+
+    def allocate():
+        for _ in range(25):
+            ids.append(sequence.next_id(path))
+
+    threads = [threading.Thread(target=allocate) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(ids) == list(range(1, 101))
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from app import storage
+
+
+def test_read_missing_file_returns_default(tmp_path):
+    assert storage.read_json(tmp_path / "missing.json", []) == []
+    assert storage.load_json(tmp_path / "missing.json", {}) == {}
+
+
+def test_read_is_cached_until_file_changes(tmp_path):
+    path = tmp_path / "data.json"
+    storage.save_json(path, [{"id": 1}])
+    first = storage.read_json(path, [])
+    assert storage.read_json(path, []) is first
+
+    # Written by another process: size and mtime change
+    path.write_text(json.dumps([{"id": 1}, {"id": 2}]), encoding="utf-8")
+    second = storage.read_json(path, [])
+    assert second is not first
+    assert [r["id"] for r in second] == [1, 2]
+
+
+def test_load_returns_modifiable_copy(tmp_path):
+    path = tmp_path / "data.json"
+    storage.save_json(path, [{"id": 1, "title": "a"}])
+    working = storage.load_json(path, [])
+    working[0]["title"] = "changed"
+    working.append({"id": 2})
+    assert storage.read_json(path, []) == [{"id": 1, "title": "a"}]
+
+
+def test_save_replaces_cached_document(tmp_path):
+    path = tmp_path / "data.json"
+    storage.save_json(path, {"user1": {"A": 1}})
+    assert storage.read_json(path, {}) == {"user1": {"A": 1}}
+    storage.save_json(path, {"user1": {"A": 2}})
+    assert storage.read_json(path, {}) == {"user1": {"A": 2}}
+
+
+def test_invalid_json_raises(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text("[{", encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        storage.read_json(path, [])
+
+
+def test_save_is_atomic_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "data.json"
+    storage.save_json(path, [{"id": 1}])
+    storage.save_json(path, [{"id": 2}])
+    assert json.loads(path.read_text(encoding="utf-8")) == [{"id": 2}]
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+
+def _increment(path, times):
+    for _ in range(times):
+        with storage.locked(path):
+            data = storage.load_json(path, {"count": 0})
+            data["count"] += 1
+            storage.save_json(path, data)
+
+
+def test_locked_prevents_lost_updates_between_threads(tmp_path):
+    import threading
+
+    path = tmp_path / "counter.json"
+    threads = [threading.Thread(target=_increment, args=(path, 20)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert storage.read_json(path)["count"] == 80
+
+
+@pytest.mark.skipif(storage.fcntl is None, reason="fcntl not available")
+def test_locked_prevents_lost_updates_between_processes(tmp_path):
+    import multiprocessing
+
+    path = tmp_path / "counter.json"
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_increment, args=(str(path), 20)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert storage.read_json(path)["count"] == 60
+
+
+def test_locked_is_reentrant(tmp_path):
+    path = tmp_path / "data.json"
+    with storage.locked(path):
+        with storage.locked(path):
+            storage.save_json(path, [])
+    assert storage.read_json(path) == []
+
+
+def test_newest_pages_from_the_end_of_the_list(tmp_path):
+    path = tmp_path / "data.json"
+    storage.save_json(path, [{"id": i, "even": i % 2 == 0} for i in range(1, 8)])
+    items, cursor = storage.newest(path, 3)
+    assert [r["id"] for r in items] == [7, 6, 5] and cursor == 5
+    items, cursor = storage.newest(path, 3, before=cursor)
+    assert [r["id"] for r in items] == [4, 3, 2] and cursor == 2
+    items, cursor = storage.newest(path, 3, before=cursor)
+    assert [r["id"] for r in items] == [1] and cursor is None
+
+    items, cursor = storage.newest(path, 2, where=lambda r: r["even"])
+    assert [r["id"] for r in items] == [6, 4] and cursor == 4
+    assert storage.newest(path, 2, before=cursor, where=lambda r: r["even"]) == ([{"id": 2, "even": True}], None)
+    # Pages are copies
+    items[0]["id"] = 99
+    assert storage.read_json(path)[5]["id"] == 6
@@ -0,0 +1,156 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from pathlib import Path
+
+import config
+
+from app import scheduler, storage, tiering
+from app.corso import utils as corso_utils
+from app.monsignore import utils as monsignore_utils
+from app.principessina import utils as principessina_utils
+
+_tmpdir = None
+
+
+def setup_function():
+    global _tmpdir
+    _tmpdir = tempfile.TemporaryDirectory()
+    principessina_utils.PRINCIPESSINA_PATH = Path(_tmpdir.name) / "principessina.json"
+    corso_utils.CORSO_PATH = Path(_tmpdir.name) / "corso.json"
+    monsignore_utils.KADAI_PATH = Path(_tmpdir.name) / "monsignore_kadai.json"
+    config.JOB_LEDGER_FILE = os.path.join(_tmpdir.name, "job_runs.json")
+
+
+def teardown_function():
+    _tmpdir.cleanup()
+
+
+def _report(report_id, timestamp, status="archived", **extra):
+    report = {
+        "id": report_id, "author": "user1", "report_type": "yura", "text_content": f"report {report_id}",
+        "timestamp": timestamp, "status": status, "archived_timestamp": timestamp if status == "archived" else None,
+        "custom_folder_name": None, "referenced_in_custom_folders": [],
+    }
+    report.update(extra)
+    return report
+
+
+def _archive():
+    return tiering.archives()["principessina"]
+
+
+def test_cold_records_move_to_monthly_gzip_files():
+    storage.save_json(principessina_utils.PRINCIPESSINA_PATH, [
+        _report(1, "2025-03-02T10:00:00"),
+        _report(2, "2025-04-05T10:00:00"),
+        _report(3, "2025-04-06T10:00:00", status="active"),
+        _report(4, "2025-03-20T10:00:00"),
+    ])
+    assert _archive().move() == [1, 2, 4]
+
+    assert [r["id"] for r in principessina_utils.load_posts()] == [3]
+    directory = Path(_tmpdir.name) / "principessina_archive"
+    with gzip.open(directory / "2025-03.jsonl.gz", "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["id"] for line in f] == [1, 4]
+    assert _archive().periods() == ["2025-04", "2025-03"]
+    assert _archive().get(4)["text_content"] == "report 4"
+    # Nothing left to move
+    assert _archive().move() == []
+
+
+def test_archive_pages_read_hot_and_cold_records():
+    storage.save_json(principessina_utils.PRINCIPESSINA_PATH, [
+        _report(1, "2025-03-02T10:00:00"),
+        _report(2, "2025-04-05T10:00:00"),
+    ])
+    tiering.move_all()
+    principessina_utils.add_report("user1", "yura", "today")
+    principessina_utils.archive_report(3)
+
+    reports = principessina_utils.get_archived_reports()
+    assert sorted(r["id"] for r in reports) == [1, 2, 3]
+    # Only the months of the searched range are read
+    april = principessina_utils.get_archived_reports(search_date_from=date(2025, 4, 1), search_date_to=date(2025, 4, 30))
+    assert [r["id"] for r in april] == [2]
+
+
+def test_iteration_reads_periods_lazily(monkeypatch):
+    storage.save_json(principessina_utils.PRINCIPESSINA_PATH, [
+        _report(1, "2025-03-02T10:00:00"),
+        _report(2, "2025-04-05T10:00:00"),
+    ])
+    _archive().move()
+    parsed = []
+    real_parse = tiering._parse
+    monkeypatch.setattr(tiering, "_parse", lambda path: parsed.append(os.path.basename(path)) or real_parse(path))
+    monkeypatch.setattr(tiering, "_cache", tiering.OrderedDict())
+
+    records = _archive().iter_records()
+    assert next(records)["id"] == 2
+    assert parsed == ["2025-04.jsonl.gz"]
+
+
+def test_new_records_never_reuse_archived_ids():
+    storage.save_json(principessina_utils.PRINCIPESSINA_PATH, [_report(7, "2025-03-02T10:00:00")])
+    _archive().move()
+    assert principessina_utils.load_posts() == []
+    assert principessina_utils.add_report("user1", "yura", "new") == 8
+
+
+def test_cold_records_can_be_changed_and_deleted():
+    storage.save_json(principessina_utils.PRINCIPESSINA_PATH, [_report(1, "2025-03-02T10:00:00")])
+    _archive().move()
+
+    assert principessina_utils.add_report_reference_to_custom_folder(1, "family")
+    assert _archive().get(1)["referenced_in_custom_folders"] == ["family"]
+    assert [r["id"] for r in principessina_utils.get_archived_reports("family")] == [1]
+    assert principessina_utils.remove_report_reference_from_custom_folder(1, "family")
+    assert _archive().get(1)["referenced_in_custom_folders"] == []
+
+    assert principessina_utils.delete_post(1)
+    assert _archive().get(1) is None and _archive().periods() == []
+    assert not principessina_utils.delete_post(1)
+
+
+def test_interrupted_move_leaves_no_duplicates():
+    storage.save_json(principessina_utils.PRINCIPESSINA_PATH, [_report(1, "2025-03-02T10:00:00")])
+    hot = principessina_utils.load_posts()
+    _archive().move()
+    # The hot file was not rewritten before a crash
+    storage.save_json(principessina_utils.PRINCIPESSINA_PATH, hot)
+    assert [r["id"] for r in principessina_utils.get_archived_reports()] == [1]
+    assert _archive().move() == [1]
+    assert [r["id"] for r in _archive().read("2025-03")] == [1]
+
+
+def test_corso_and_kadai_lookups_fall_back_to_the_archive():
+    corso_utils.add_post("admin", "guitar", "body", filename="score.pdf")
+    corso_utils.finish_post(1)
+    kadai_id = monsignore_utils.add_kadai_entry("admin", "scales", "text", None, None, None)
+    monsignore_utils.archive_kadai_entry(kadai_id)
+    moved = tiering.move_all()
+    assert moved["corso"] == [1] and moved["monsignore_kadai"] == [kadai_id]
+
+    assert corso_utils.load_posts() == []
+    assert corso_utils.get_post(1)["title"] == "guitar"
+    assert [p["id"] for p in corso_utils.archived_posts()] == [1]
+    assert [p["id"] for p in corso_utils.filter_posts(include_expired=True)] == [1]
+    assert corso_utils.filter_posts() == []
+    assert monsignore_utils.get_kadai_entry_by_id(kadai_id)["title"] == "scales"
+    assert [e["id"] for e in monsignore_utils.get_archived_kadai_entries()] == [kadai_id]
+    assert monsignore_utils.delete_kadai_entry(kadai_id)
+    assert monsignore_utils.get_kadai_entry_by_id(kadai_id) is None
+
+
+def test_month_of_handles_missing_dates():
+    period = tiering.month_of("timestamp")
+    assert period({"timestamp": datetime(2025, 3, 2).isoformat()}) == "2025-03"
+    assert period({"timestamp": None}) == tiering.UNDATED
+    assert period({}) == tiering.UNDATED
+
+
+def test_move_job_is_scheduled():
+    assert scheduler.jobs()["tiering.move_cold_records"] == {"hour": 2, "minute": 30}
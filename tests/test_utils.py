@@ -311,3 +311,117 @@ def test_save_local_file(tmp_path):
     dest_dir = tmp_path / "dest"
     fname = utils.save_local_file(str(src), str(dest_dir))
     assert (dest_dir / fname).read_bytes() == b"hello"
+
+
+def test_points_history_is_appended_to_journal():
+    ts = datetime(2021, 8, 1, 9, 0, 0)
+    utils.log_points_change("u1", 1, 0, ts)
+    utils.log_points_change("u1", 2, 0, ts)
+    journal_path = utils.POINTS_HISTORY_PATH.with_suffix(".jsonl")
+    with open(journal_path, "r", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert not utils.POINTS_HISTORY_PATH.exists()
+
+
+def test_legacy_points_history_is_migrated():
+    import json
+
+    ts = datetime(2021, 8, 2, 9, 0, 0).isoformat(timespec="seconds")
+    with open(utils.POINTS_HISTORY_PATH, "w", encoding="utf-8") as f:
+        json.dump([{"username": "u1", "A": 5, "O": 0, "timestamp": ts}], f)
+
+    utils.log_points_change("u2", 1, 0, datetime(2021, 8, 3, 9, 0, 0))
+    history = utils.load_points_history()
+    assert [h["username"] for h in history] == ["u1", "u2"]
+    assert not utils.POINTS_HISTORY_PATH.exists()
+
+
+def test_compact_points_history_keeps_entries_readable():
+    utils.log_points_change("u1", 1, 0, datetime(2021, 9, 5, 9, 0, 0))
+    utils.log_points_change("u1", 2, 0, datetime(2021, 10, 5, 9, 0, 0))
+    utils.log_points_change("u1", 4, 0, datetime(2021, 11, 5, 9, 0, 0))
+
+    assert utils.compact_points_history(datetime(2021, 11, 20)) == 2
+    assert [h["A"] for h in utils.load_points_history()] == [1, 2, 4]
+    results = utils.filter_points_history(start=datetime(2021, 10, 1), end=datetime(2021, 10, 31))
+    assert [h["A"] for h in results] == [2]
+
+
+def test_points_rollup_matches_history_for_partial_days():
+    utils.log_points_change("u1", 1, 0, datetime(2021, 12, 1, 8, 0, 0))
+    utils.log_points_change("u1", 2, 1, datetime(2021, 12, 1, 20, 0, 0))
+    utils.log_points_change("u2", 4, 0, datetime(2021, 12, 2, 9, 0, 0))
+    utils.log_points_change("u1", 8, 0, datetime(2021, 12, 3, 7, 0, 0))
+    utils.log_points_change("u1", 16, 0, datetime(2021, 12, 3, 18, 0, 0))
+
+    start = datetime(2021, 12, 1, 12, 0, 0)
+    end = datetime(2021, 12, 3, 12, 0, 0)
+    assert utils.get_ranking("A", start=start, end=end) == [("u1", 10), ("u2", 4)]
+    assert utils.get_ranking("U", start=start, end=end) == [("u1", 9), ("u2", 4)]
+
+    summary = utils.get_points_history_summary(start=start, end=end)
+    assert summary["labels"] == ["2021-12-01", "2021-12-02", "2021-12-03"]
+    assert summary["A"] == [2, 4, 8]
+
+
+def test_points_rollup_is_rebuilt_when_missing():
+    utils.log_points_change("u1", 3, 0, datetime(2022, 1, 5, 9, 0, 0))
+    assert utils.get_ranking("A", start=datetime(2022, 1, 1)) == [("u1", 3)]
+    rollup_path = utils._points_rollup_path()
+    assert rollup_path.exists()
+    rollup_path.unlink()
+    utils.log_points_change("u1", 2, 0, datetime(2022, 1, 6, 9, 0, 0))
+    assert utils.get_ranking("A", start=datetime(2022, 1, 1)) == [("u1", 5)]
+
+    rollup_path.unlink()
+    assert utils.get_ranking("A", start=datetime(2022, 1, 6)) == [("u1", 2)]
+
+
+def test_points_rollup_is_not_rewritten_on_each_change():
+    utils.log_points_change("u1", 1, 0, datetime(2022, 2, 1, 9, 0, 0))
+    assert utils.get_ranking("A", start=datetime(2022, 2, 1)) == [("u1", 1)]
+    rollup_path = utils._points_rollup_path()
+    stamp = utils.storage.stamp(rollup_path)
+
+    utils.log_points_change("u2", 5, 0, datetime(2022, 2, 2, 9, 0, 0))
+    utils.log_points_change("u1", 2, 0, datetime(2022, 2, 3, 9, 0, 0))
+    assert utils.storage.stamp(rollup_path) == stamp
+    # The journal tail is folded in on read
+    assert utils.get_ranking("A", start=datetime(2022, 2, 1)) == [("u2", 5), ("u1", 3)]
+    assert utils.storage.stamp(rollup_path) == stamp
+
+
+def test_comments_are_indexed_and_counted(monkeypatch):
+    monkeypatch.setattr(utils, "COMMENTS_PATH", Path(_temp_dir.name) / "comments.json")
+    utils.add_post("user1", "diary", "a")
+    utils.add_post("user1", "diary", "b")
+    utils.add_comment(1, "user2", "first")
+    utils.add_comment(1, "user3", "second")
+    utils.add_comment(2, "user2", "other")
+    assert [c["text"] for c in utils.get_comments(1)] == ["first", "second"]
+    assert utils.get_comment(3)["text"] == "other"
+    assert utils.get_comment(99) is None
+    assert [utils.comment_count(p) for p in utils.load_posts()] == [2, 1]
+
+
+def test_legacy_comments_are_migrated_by_the_explicit_step(monkeypatch):
+    comments_path = Path(_temp_dir.name) / "legacy_comments.json"
+    monkeypatch.setattr(utils, "COMMENTS_PATH", comments_path)
+    utils.add_post("user1", "diary", "a")
+    utils.storage.save_json(
+        comments_path,
+        [{"post_id": 1, "author": "u", "text": "x"}, {"id": 5, "post_id": 1, "author": "u", "text": "y"}],
+    )
+    # Reads never rewrite the files
+    comments_stamp = utils.storage.stamp(comments_path)
+    posts_stamp = utils.storage.stamp(utils.POSTS_PATH)
+    assert len(utils.get_comments(1)) == 2 and len(utils.load_comments()) == 2
+    assert utils.storage.stamp(comments_path) == comments_stamp
+    assert utils.storage.stamp(utils.POSTS_PATH) == posts_stamp
+
+    utils.migrate_comments()
+    assert [c["id"] for c in utils.get_comments(1)] == [6, 5]
+    assert utils.load_posts()[0]["comment_count"] == 2
+    comments_stamp = utils.storage.stamp(comments_path)
+    utils.migrate_comments()
+    assert utils.storage.stamp(comments_path) == comments_stamp